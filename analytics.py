@@ -0,0 +1,156 @@
+import atexit
+import threading
+from collections import Counter, namedtuple
+from datetime import datetime
+from functools import wraps
+
+import click
+from flask import request
+from flask.cli import AppGroup
+
+from models import db, Posts, PostViews, upsert_add
+from signals import post_deleted
+
+PopularPost = namedtuple('PopularPost', 'slug title views')
+
+
+def upsert_views(rows):
+    '''Add {post_sno, views, updated_at} deltas to post_views in one executemany.'''
+    upsert_add(PostViews.__table__, 'post_sno', rows, {'views'})
+
+
+class Analytics:
+    '''Per-post view counts without a write per page view.
+
+    Each worker counts views by slug in memory. A background thread flushes
+    the deltas every ANALYTICS_FLUSH_INTERVAL seconds as one batched upsert
+    into post_views and then reloads the top ANALYTICS_TOP_N posts, which
+    templates read through `popular_posts()` without a query. A crash loses
+    at most one interval of this worker's counts.
+    '''
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._top = []
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ANALYTICS_ENABLED', True)
+        app.config.setdefault('ANALYTICS_FLUSH_INTERVAL', 10)
+        app.config.setdefault('ANALYTICS_TOP_N', 5)
+        self.app = app
+        app.extensions['analytics'] = self
+        app.jinja_env.globals['popular_posts'] = self.popular_posts
+        app.cli.add_command(analytics_cli)
+        if app.config['ANALYTICS_ENABLED']:
+            # Started by the first request, so pre-fork masters and CLI commands never run it
+            app.before_request(self._ensure_worker)
+            post_deleted.connect(self._on_deleted, app)
+
+    def record(self, slug):
+        if self.app is not None and self.app.config['ANALYTICS_ENABLED']:
+            with self._lock:
+                self._pending[slug] += 1
+
+    def counted(self, view):
+        '''Count a GET of a post view by its `post_slug`, page-cache hits included.'''
+        @wraps(view)
+        def wrapper(post_slug, **kwargs):
+            if request.method == 'GET':
+                self.record(post_slug)
+            return view(post_slug=post_slug, **kwargs)
+        return wrapper
+
+    def popular_posts(self):
+        return self._top
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            self.tick()
+            if self._stop.wait(self.app.config['ANALYTICS_FLUSH_INTERVAL']):
+                return
+
+    def stop(self):
+        self._stop.set()
+        self.tick()
+
+    def tick(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+                self.refresh_top()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Analytics flush failed: {str(e)}")
+
+    def flush(self):
+        '''Write this worker's pending deltas. Returns the number of posts updated.'''
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+        try:
+            snos = dict(db.session.execute(
+                db.select(Posts.slug, Posts.sno).where(Posts.slug.in_(list(pending)))).all())
+            now = datetime.now()
+            # Slugs that no longer exist (or never did) are dropped
+            rows = [{'post_sno': snos[slug], 'views': views, 'updated_at': now}
+                    for slug, views in pending.items() if slug in snos]
+            if rows:
+                upsert_views(rows)
+            db.session.commit()
+        except Exception:
+            # Keep the counts for the next attempt
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return len(rows)
+
+    def refresh_top(self):
+        rows = db.session.execute(
+            db.select(Posts.slug, Posts.title, PostViews.views)
+            .join(PostViews, PostViews.post_sno == Posts.sno)
+            .order_by(PostViews.views.desc(), Posts.sno.desc())
+            .limit(self.app.config['ANALYTICS_TOP_N'])).all()
+        self._top = [PopularPost(*row) for row in rows]
+        db.session.commit()
+        return self._top
+
+    def _on_deleted(self, app, sno, slug, **extra):
+        # The FK cascades where it is enforced (MySQL); SQLite leaves the row behind
+        try:
+            db.session.execute(db.delete(PostViews).where(PostViews.post_sno == sno))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Analytics cleanup failed for post {sno}: {str(e)}")
+        self._top = [post for post in self._top if post.slug != slug]
+
+
+analytics_cli = AppGroup('analytics', help='View count commands.')
+
+
+@analytics_cli.command('top')
+@click.option('-n', '--limit', default=10, show_default=True)
+def top_command(limit):
+    '''Print the most viewed posts.'''
+    rows = db.session.execute(
+        db.select(Posts.slug, PostViews.views, PostViews.updated_at)
+        .join(PostViews, PostViews.post_sno == Posts.sno)
+        .order_by(PostViews.views.desc(), Posts.sno.desc())
+        .limit(limit)).all()
+    for slug, views, updated_at in rows:
+        click.echo(f"{views:>10}  {slug}  (last flushed {updated_at:%Y-%m-%d %H:%M})")
@@ -0,0 +1,6 @@
+'''ASGI entry point: `uvicorn asgi:app`. Public read routes run on the asyncio
+engine (see async_routes.py); every other route is the WSGI app, unchanged.'''
+from async_routes import AsyncReadApp
+from main import create_app
+
+app = AsyncReadApp(create_app())
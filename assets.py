@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: only .gz siblings are built without it
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+SOURCE_DIRS = ('css', 'js', 'assets')
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ico', '.json', '.txt', '.map'}
+# Uploads and their variants are already content-addressed
+HASHED_RE = re.compile(r'(^|/)[0-9a-f]{20}[.-]')
+ONE_YEAR = 365 * 24 * 3600
+
+
+def fingerprint(relpath, data):
+    stem, ext = os.path.splitext(relpath)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def build(static_folder):
+    '''Copy static sources into static/dist under fingerprinted names, write
+    .gz/.br siblings for text assets, and return the manifest.'''
+    dist = os.path.join(static_folder, DIST)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    manifest = {}
+    for source in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, source)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                relpath = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                if HASHED_RE.search(relpath):
+                    continue
+                with open(path, 'rb') as f:
+                    data = f.read()
+                target = fingerprint(relpath, data)
+                out = os.path.join(dist, target)
+                os.makedirs(os.path.dirname(out), exist_ok=True)
+                with open(out, 'wb') as f:
+                    f.write(data)
+                if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                    with open(out + '.gz', 'wb') as f:
+                        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                    if brotli is not None:
+                        with open(out + '.br', 'wb') as f:
+                            f.write(brotli.compress(data, quality=11))
+                manifest[relpath] = f"{DIST}/{target}"
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class HashedAssets:
+    '''Rewrites url_for('static', filename=...) to the fingerprinted copy from
+    the build manifest and serves those copies with immutable caching and
+    precompressed bodies when the client accepts them.'''
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['hashed_assets'] = self
+        self.load(app.static_folder)
+        app.url_defaults(self._rewrite_static)
+        app.view_functions['static'] = self.serve
+        app.cli.add_command(assets_cli)
+
+    def load(self, static_folder):
+        try:
+            with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def _rewrite_static(self, endpoint, values):
+        if endpoint == 'static' and self.manifest:
+            hashed = self.manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+    def serve(self, filename):
+        if not filename.startswith(DIST + '/'):
+            return current_app.send_static_file(filename)
+
+        folder = current_app.static_folder
+        encoding = None
+        accepted = request.accept_encodings
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[candidate] and os.path.isfile(os.path.join(folder, filename + suffix)):
+                encoding = candidate
+                break
+
+        if encoding:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            resp = send_from_directory(folder, filename + ('.br' if encoding == 'br' else '.gz'),
+                                       mimetype=mimetype, max_age=ONE_YEAR)
+            resp.content_encoding = encoding
+        else:
+            resp = send_from_directory(folder, filename, max_age=ONE_YEAR)
+        resp.vary.add('Accept-Encoding')
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
+
+assets_cli = AppGroup('assets', help='Static asset commands.')
+
+
+@assets_cli.command('build')
+def build_command():
+    '''Fingerprint and precompress static assets into static/dist.'''
+    manifest = build(current_app.static_folder)
+    current_app.extensions['hashed_assets'].manifest = manifest
+    click.echo(f"Built {len(manifest)} asset(s) into static/{DIST}.")
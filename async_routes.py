@@ -0,0 +1,248 @@
+import asyncio
+import io
+import random
+import sys
+import time
+from functools import partial
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import flash, redirect, render_template, request, session, url_for
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import defer
+
+from cache import MemoryBackend
+from main import analytics, feeds, page_cache, params, post_search
+from models import db, Posts, post_list_options
+from pagination import InvalidCursor, cursor_urls, keyset_page, keyset_query
+from related import related_statement
+from replicas import REPLICA_PREFIX, engine_options
+from search import in_rank_order, page_from_rows
+
+# Dialect -> asyncio DBAPI driver for the same database
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'mysql': 'aiomysql',
+    'mariadb': 'aiomysql',
+    'postgresql': 'asyncpg',
+}
+
+# Session keys that make a request render differently from the anonymous page
+PERSONAL_KEYS = {'user_id', 'user', '_flashes'}
+
+
+def async_url(url):
+    '''The same database URL with the dialect's asyncio driver.'''
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend!r} databases")
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+async def cached(store, fn, *args):
+    '''Call a page_cache or feeds method. The filesystem and redis backends
+    block, so those calls run in a thread (which sees the request context);
+    the in-process memory backend is called on the loop.'''
+    if store.backend is None or isinstance(store.backend, MemoryBackend):
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+def wsgi_environ(scope):
+    '''A body-less WSGI environ for an ASGI http scope, as asgiref builds it.'''
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'] = server[0]
+    environ['SERVER_PORT'] = str(server[1] or 80)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name, value = name.decode('latin1'), value.decode('latin1')
+        key = name.upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class AsyncReadApp:
+    '''ASGI app serving the public read routes on SQLAlchemy's asyncio engine.
+
+    Anonymous GETs to home, post_route, search and the feeds run their
+    queries on an async engine for the same database (and replicas), so a
+    worker keeps serving other requests while one waits on the database.
+    Models, templates, the page cache and the feed cache are shared with
+    the WSGI app; cache backends that block run in a thread, while
+    rendering itself still runs on the event loop.
+
+    Everything else, including any request from a logged-in user, any
+    write and the numbered pager, goes to the Flask app unchanged through
+    asgiref's WsgiToAsgi, which runs it in a thread.
+    '''
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        options = engine_options(flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        with flask_app.app_context():
+            # db.engines has the URLs as Flask-SQLAlchemy resolved them (relative SQLite paths)
+            urls = {key: engine.url for key, engine in db.engines.items()}
+        primary = flask_app.config.get('ASYNC_DATABASE_URI') or async_url(urls[None])
+        self.primary = create_async_engine(primary, **options)
+        self.replicas = [create_async_engine(async_url(url), **options)
+                         for key, url in urls.items() if isinstance(key, str) and key.startswith(REPLICA_PREFIX)]
+        # Lazy loads cannot run on an async session, so list pages always load authors up front
+        strategy = flask_app.config['POST_AUTHOR_LOADING']
+        self.list_options = post_list_options('joined' if strategy == 'lazy' else strategy)
+        self.views = {
+            'blog.home': self.home,
+            'blog.post_route': self.post_route,
+            'blog.search': self.search,
+            'atom_feed': partial(self.feed, 'atom'),
+            'rss_feed': partial(self.feed, 'rss'),
+        }
+        # Requests these views leave to the sync app, decided before any
+        # before_request handler runs so that none of them runs twice
+        self.sync_only = {
+            'blog.home': lambda: 'page' in request.args,  # the numbered pager counts rows through the sync session
+            'blog.search': self.search_needs_sync,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            environ = wsgi_environ(scope)
+            with self.flask_app.request_context(environ):
+                view = self.views.get(request.endpoint)
+                sync_only = self.sync_only.get(request.endpoint)
+                if view is not None and not PERSONAL_KEYS & session.keys() and not (sync_only and sync_only()):
+                    return await self._send(await self._dispatch(view), environ, send)
+        await self.wsgi(scope, receive, send)
+
+    async def _dispatch(self, view):
+        '''Flask's full_dispatch_request for an async view.'''
+        app = self.flask_app
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**request.view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            return app.finalize_request(rv)
+        except Exception as e:
+            return app.handle_exception(e)
+
+    async def _send(self, response, environ, send):
+        app_iter, status, headers = response.get_wsgi_response(environ)
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': b''.join(app_iter)})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in [self.primary, *self.replicas]:
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session(self, primary=False):
+        '''An AsyncSession on a replica, or on the primary if asked for or if this client wrote recently.'''
+        engine = self.primary
+        if not primary and self.replicas and session.get('primary_until', 0) < time.time():
+            engine = random.choice(self.replicas)
+        return AsyncSession(engine, expire_on_commit=False)
+
+    def list_select(self):
+        return select(Posts).options(*self.list_options)
+
+    async def home(self):
+        key, hit = await cached(page_cache, page_cache.lookup, ['posts'])
+        if hit is not None:
+            return hit
+        per_page = int(params.get('no_of_posts', 2))
+        after, before = request.args.get('after'), request.args.get('before')
+        try:
+            stmt = keyset_query(self.list_select(), Posts.published_at, Posts.sno, per_page, after, before)
+        except InvalidCursor:
+            after = before = None
+            stmt = keyset_query(self.list_select(), Posts.published_at, Posts.sno, per_page)
+        async with self.session() as s:
+            rows = (await s.execute(stmt)).scalars().all()
+        page = keyset_page(rows, Posts.published_at, per_page, after, before)
+        prev_url, next_url = cursor_urls(page, 'blog.home')
+        return await cached(page_cache, page_cache.store, key, render_template(
+            'index.html', params=params, posts=page.items, prev=prev_url, next=next_url, pagination=None))
+
+    async def post_route(self, post_slug):
+        analytics.record(post_slug)
+        key, hit = await cached(page_cache, page_cache.lookup, [f'post:{post_slug}'])
+        if hit is not None:
+            return hit
+        async with self.session() as s:
+            post = (await s.execute(
+                select(Posts).options(defer(Posts.content)).filter_by(slug=post_slug).limit(1))).scalar()
+            if post is None:
+                flash("Post not found!", "danger")
+                return redirect(url_for("blog.home"))
+            if post.content_html is None:
+                # Not rendered yet: the template falls back to content, which cannot lazy load here
+                await s.refresh(post, ['content'])
+            related = (await s.execute(related_statement(post.sno))).all()
+        return await cached(page_cache, page_cache.store, key,
+                            render_template('post_slug.html', params=params, post=post, related=related))
+
+    @staticmethod
+    def search_page():
+        return request.args.get('q', ''), max(1, request.args.get('page', 1, type=int)), 10
+
+    def search_needs_sync(self):
+        # The in-process index, or an FTS table this worker has not checked yet, needs the sync path
+        query, page, per_page = self.search_page()
+        return bool(query.strip()) and post_search.statement(query, page=page, per_page=per_page) is None
+
+    async def search(self):
+        query, page, per_page = self.search_page()
+        if not query.strip():
+            return render_template('dashboard.html', params=params, posts=[], query=query)
+        statement = post_search.statement(query, page=page, per_page=per_page)
+        async with self.session() as s:
+            result = page_from_rows((await s.execute(*statement)).scalars().all(), page, per_page)
+            posts = []
+            if result.snos:
+                posts = (await s.execute(self.list_select().where(Posts.sno.in_(result.snos)))).scalars().all()
+        results = in_rank_order(posts, result.snos)
+        prev_url = url_for("blog.search", q=query, page=page - 1) if result.has_prev else None
+        next_url = url_for("blog.search", q=query, page=page + 1) if result.has_next else None
+        return render_template('dashboard.html', results=results, query=query, params=params, posts=results,
+                               prev=prev_url, next=next_url)
+
+    async def feed(self, kind):
+        entry = await cached(feeds, feeds.lookup, kind)
+        if entry is None:
+            async with self.session(primary=True) as s:  # cached until the next write, see Feeds
+                rows = (await s.execute(feeds.statement())).all()
+            entry = await cached(feeds, feeds.build, kind, rows)
+            await cached(feeds, feeds.store, kind, entry)
+        return feeds.response(kind, entry)
@@ -0,0 +1,133 @@
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from threading import Lock
+
+from flask import flash, g, redirect, request, session, url_for
+from sqlalchemy import event
+
+from models import db, User
+from signals import post_saved, post_deleted
+
+# What routes and templates need to know about the logged-in user. A plain
+# tuple (not an ORM instance) so it can outlive the request's DB session.
+CurrentUser = namedtuple('CurrentUser', 'id name email post_count')
+
+
+class IdentityCache:
+    '''Small TTL + LRU cache of CurrentUser keyed by user id.'''
+
+    def __init__(self, ttl=60, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is None:
+                return None
+            expires, user = item
+            if expires < time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return user
+
+    def set(self, user):
+        with self._lock:
+            self._data[user.id] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(user.id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+
+identity_cache = IdentityCache()
+
+
+def _fetch(user_id):
+    row = db.session.execute(
+        db.select(User.id, User.name, User.email, User.post_count).where(User.id == user_id)).first()
+    return CurrentUser(*row) if row else None
+
+
+# Public files that never depend on the visitor. Reading the session for them
+# would add "Vary: Cookie" and keep shared caches from storing them.
+ANONYMOUS_ENDPOINTS = {'static', 'atom_feed', 'rss_feed', 'sitemap_index', 'sitemap_shard'}
+
+
+def load_identity():
+    '''before_request: resolve session['user_id'] to g.user once per request.'''
+    g.user = None
+    if request.endpoint in ANONYMOUS_ENDPOINTS:
+        return
+    user_id = session.get('user_id')
+    if user_id is None and 'user' in session:
+        # Sessions issued before ids were stored only carry the email
+        user_id = db.session.execute(
+            db.select(User.id).where(User.email == session['user'])).scalar()
+        session.pop('user', None)
+        if user_id is not None:
+            session['user_id'] = user_id
+    if user_id is None:
+        return
+
+    user = identity_cache.get(user_id)
+    if user is None:
+        user = _fetch(user_id)
+        if user is None:
+            session.pop('user_id', None)
+            return
+        identity_cache.set(user)
+    g.user = user
+
+
+def login_user(user):
+    session['user_id'] = user.id
+    identity_cache.set(CurrentUser(user.id, user.name, user.email, user.post_count))
+
+
+def logout_user():
+    user_id = session.get('user_id')
+    if user_id is not None:
+        identity_cache.invalidate(user_id)
+    session.clear()
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.user is None:
+            flash("Please log in first!", "warning")
+            return redirect(url_for("blog.login"))
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    identity_cache.invalidate(target.id)
+
+
+def _post_created(app, post, created, **extra):
+    # post_count changed with a Core UPDATE, which skips the ORM events above
+    if created:
+        identity_cache.invalidate(post.user_id)
+
+
+def _post_deleted(app, user_id, **extra):
+    identity_cache.invalidate(user_id)
+
+
+def init_identity(app):
+    app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+    identity_cache.ttl = app.config['IDENTITY_CACHE_TTL']
+    app.before_request(load_identity)
+    post_saved.connect(_post_created, app)
+    post_deleted.connect(_post_deleted, app)
@@ -0,0 +1,347 @@
+"""Load-test the blog's main routes and compare against a stored baseline.
+
+    python -m benchmarks.seed --db sqlite:///bench.db --posts 100000
+    python -m benchmarks.run --db sqlite:///bench.db --requests 500 --save-baseline
+    ... make changes ...
+    python -m benchmarks.run --db sqlite:///bench.db --requests 500   # exits 1 on regression
+
+Each scenario reports p50/p95/p99 latency, requests per second and SQL
+queries per request. --driver client drives Flask's test client in-process;
+--driver wsgi starts a local wsgiref server and goes over real HTTP;
+--driver asgi serves the same app through asgi.py under uvicorn (public read
+routes on the asyncio engine: aiosqlite for a SQLite --db), over the same
+HTTP client, so wsgi and asgi runs compare directly.
+Run from the repository root (config.json is read from the working directory).
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.seed import BENCH_PASSWORD, WORDS
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+class QueryCounter:
+    '''Counts SQL statements on every engine in the process.'''
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+
+class ClientDriver:
+    '''One Flask test client per worker thread.'''
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def get(self, path):
+        resp = self._client().get(path)
+        resp.close()
+        return resp.status_code
+
+    def post(self, path, data, fresh=False):
+        client = self.app.test_client(use_cookies=False) if fresh else self._client()
+        resp = client.post(path, data=data)
+        resp.close()
+        return resp.status_code
+
+    def close(self):
+        pass
+
+
+class WSGIDriver:
+    '''A local wsgiref server plus one cookie-aware opener per worker thread.'''
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, app):
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+
+        self.server = make_server('127.0.0.1', 0, app, server_class=ThreadingWSGIServer,
+                                  handler_class=QuietHandler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self._local = threading.local()
+
+    def _opener(self):
+        opener = getattr(self._local, 'opener', None)
+        if opener is None:
+            opener = self._local.opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self._NoRedirect())
+        return opener
+
+    def _open(self, request, fresh=False):
+        opener = urllib.request.build_opener(self._NoRedirect()) if fresh else self._opener()
+        try:
+            with opener.open(request) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base + path))
+
+    def post(self, path, data, fresh=False):
+        body = urllib.parse.urlencode(data).encode('ascii')
+        return self._open(urllib.request.Request(self.base + path, data=body), fresh=fresh)
+
+    def close(self):
+        self.server.shutdown()
+
+
+class ASGIDriver(WSGIDriver):
+    '''uvicorn running AsyncReadApp in a background thread, driven like WSGIDriver.'''
+
+    def __init__(self, app):
+        import socket
+        import uvicorn
+        from async_routes import AsyncReadApp
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.base = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        self.server = uvicorn.Server(uvicorn.Config(AsyncReadApp(app), log_level='warning', access_log=False))
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        self._local = threading.local()
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+DRIVERS = {'client': ClientDriver, 'wsgi': WSGIDriver, 'asgi': ASGIDriver}
+
+
+def build_scenarios(posts, users):
+    '''name -> (prepare, request): `prepare(driver)` runs once per worker thread
+    before timing starts, `request(driver, rng)` performs one timed request.'''
+    def home(driver, rng):
+        return driver.get('/')
+
+    def post_route(driver, rng):
+        return driver.get(f'/post/bench-post-{rng.randrange(posts)}')
+
+    def dashboard(driver, rng):
+        return driver.get('/dashboard')
+
+    def search(driver, rng):
+        return driver.get('/search?' + urllib.parse.urlencode({'q': rng.choice(WORDS)}))
+
+    def login(driver, rng):
+        # A cookie-less client each time, so every request really checks the password
+        return driver.post('/login', {'email': f'bench{rng.randrange(users)}@example.com',
+                                      'password': BENCH_PASSWORD}, fresh=True)
+
+    def log_in(driver):
+        driver.post('/login', {'email': 'bench0@example.com', 'password': BENCH_PASSWORD})
+
+    return {'home': (None, home), 'post_route': (None, post_route), 'dashboard': (log_in, dashboard),
+            'search': (None, search), 'login': (None, login)}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_scenario(driver, scenario, requests, concurrency, counter, seed_value, warmup=10):
+    prepare, fn = scenario
+    latencies = []
+    errors = shed = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors, shed
+        rng = random.Random(seed_value + i)
+        started = time.perf_counter()
+        status = fn(driver, rng)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if status == 503:  # load shedding, e.g. the password hasher is saturated
+                shed += 1
+            elif status >= 500:
+                errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if prepare is not None:
+            # The barrier makes each pool thread run prepare exactly once
+            barrier = threading.Barrier(concurrency)
+            def prepare_thread(_):
+                prepare(driver)
+                barrier.wait()
+            list(pool.map(prepare_thread, range(concurrency)))
+        list(pool.map(lambda i: fn(driver, random.Random(i)), range(warmup)))
+        counter.take()
+        latencies.clear()
+
+        started = time.perf_counter()
+        list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - started
+    queries = counter.take()
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'shed': shed,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'rps': round(requests / wall, 1) if wall else 0.0,
+        'queries_per_request': round(queries / requests, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''Return a list of human-readable regressions against `baseline`.'''
+    problems = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms (+{tolerance:.0%})")
+        if current['queries_per_request'] > base['queries_per_request']:
+            problems.append(f"{name}: {current['queries_per_request']} queries/request > "
+                            f"baseline {base['queries_per_request']}")
+        if current['errors'] > base.get('errors', 0):
+            problems.append(f"{name}: {current['errors']} server errors")
+    return problems
+
+
+def print_report(results):
+    header = (f"{'route':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'q/req':>7} "
+              f"{'5xx':>5} {'shed':>5}")
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f"{name:<12} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['rps']:>9.1f} {r['queries_per_request']:>7.2f} {r['errors']:>5} {r['shed']:>5}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:///bench.db', help='SQLAlchemy URL of a seeded database')
+    parser.add_argument('--seed-users', type=int, default=0, help='seed this many users first')
+    parser.add_argument('--seed-posts', type=int, default=0, help='seed this many posts first')
+    parser.add_argument('--requests', type=int, default=300, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--driver', choices=tuple(DRIVERS), default='client')
+    parser.add_argument('--routes', default='home,post_route,dashboard,search,login')
+    parser.add_argument('--no-page-cache', action='store_true', help='measure without the rendered-page cache')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown, 0.25 = 25%%')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    os.environ['LOCAL_SERVER'] = 'True'
+    os.environ['LOCAL_URL'] = args.db
+    if args.no_page_cache:
+        os.environ['PAGE_CACHE_BACKEND'] = 'null'
+    from main import create_app
+    from models import db, Posts, User
+    app = create_app()
+
+    if args.seed_users or args.seed_posts:
+        from benchmarks.seed import seed
+        seed(app, max(args.seed_users, 1), args.seed_posts)
+
+    with app.app_context():
+        posts = db.session.execute(db.select(db.func.count()).select_from(Posts)).scalar()
+        users = db.session.execute(
+            db.select(db.func.count()).select_from(User).where(User.email.like('bench%@example.com'))).scalar()
+    if not posts or not users:
+        print("Database has no benchmark data; run benchmarks.seed first or pass --seed-posts.", file=sys.stderr)
+        return 2
+
+    counter = QueryCounter()
+    counter.install()
+    driver = DRIVERS[args.driver](app)
+    scenarios = build_scenarios(posts, users)
+    results = {}
+    try:
+        for name in args.routes.split(','):
+            results[name] = run_scenario(driver, scenarios[name], args.requests, args.concurrency,
+                                         counter, args.seed)
+    finally:
+        driver.close()
+
+    print(f"{posts} posts, {users} users, driver={args.driver}, concurrency={args.concurrency}")
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nRegressions against baseline:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Seed a database with synthetic users and posts for benchmarking.
+
+    python -m benchmarks.seed --db sqlite:///bench.db --users 1000 --posts 100000
+
+Rows are generated deterministically from --seed and inserted with batched
+executemany statements, so 1M posts needs flat memory.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+
+BENCH_PASSWORD = 'Bench1234'
+WORDS = ('python flask database index cache query latency worker template render '
+         'search cursor page author post blog image thumbnail replica pool metric '
+         'server request response commit migration schema column table batch stream '
+         'mountain river forest ocean desert valley island harbor meadow canyon').split()
+
+
+def make_content(rng, words=80):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(app, users, posts, batch=5000, seed_value=42, rounds=None):
+    '''Insert `users` users and `posts` posts. Returns the seeding time in seconds.'''
+    from models import db, Posts, User, make_excerpt
+    from rendering import render_post
+
+    rng = random.Random(seed_value)
+    rounds = rounds or app.config.get('BCRYPT_LOG_ROUNDS', 12)
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        password = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+        user_rows = [{'name': f'Bench User {i}', 'email': f'bench{i}@example.com', 'password': password}
+                     for i in range(users)]
+        for start in range(0, len(user_rows), batch):
+            db.session.execute(db.insert(User), user_rows[start:start + batch])
+        db.session.commit()
+        user_ids = db.session.execute(
+            db.select(User.id).where(User.email.like('bench%@example.com'))).scalars().all()
+
+        base = datetime(2020, 1, 1)
+        rows = []
+        for i in range(posts):
+            published = base + timedelta(minutes=i * 7 + rng.randint(0, 6))
+            content = make_content(rng)
+            rendered = render_post(content)
+            rows.append({
+                'user_id': rng.choice(user_ids),
+                'title': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}",
+                'slug': f'bench-post-{i}',
+                'content': content,
+                'content_html': rendered.content_html,
+                'toc_html': rendered.toc_html,
+                'reading_time': rendered.reading_time,
+                'excerpt': make_excerpt(rendered.content_html),
+                'date': published.strftime("%d-%m-%Y %I:%M %p"),
+                'published_at': published,
+                'img_file': 'post-sample-image.jpg',
+            })
+            if len(rows) >= batch:
+                db.session.execute(db.insert(Posts), rows)
+                db.session.commit()
+                rows = []
+        if rows:
+            db.session.execute(db.insert(Posts), rows)
+            db.session.commit()
+        actual = (db.select(db.func.count(Posts.sno)).where(Posts.user_id == User.id)
+                  .correlate(User).scalar_subquery())
+        db.session.execute(db.update(User).values(post_count=actual).execution_options(synchronize_session=False))
+        db.session.commit()
+
+        search = app.extensions.get('post_search')
+        if search is not None:
+            search.backend.rebuild()
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:///bench.db', help='SQLAlchemy URL of the database to seed')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.environ['LOCAL_SERVER'] = 'True'
+    os.environ['LOCAL_URL'] = args.db
+    from main import create_app
+    app = create_app()
+
+    elapsed = seed(app, args.users, args.posts, batch=args.batch, seed_value=args.seed)
+    print(f"Seeded {args.users} users and {args.posts} posts in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Measure cold-start time: what each pre-fork worker pays before its first response.
+
+    python -m benchmarks.startup --runs 20 --save-baseline
+    ... make changes ...
+    python -m benchmarks.startup --runs 20        # exits 1 on regression
+
+Every run is a fresh interpreter that times three phases: importing main,
+calling create_app(), and serving a first request (/about, which needs no
+database). --path '/' adds the first database round trip. Run from the
+repository root (config.json is read from the working directory).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run import percentile
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'startup_baseline.json')
+PHASES = ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms')
+
+PROBE = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from main import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+status = app.test_client().get(sys.argv[1]).status_code
+t3 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000, "total_ms": (t3 - t0) * 1000,
+                  "status": status}))
+'''
+
+
+def probe(path, env):
+    out = subprocess.run([sys.executable, '-c', PROBE, path], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    result = {}
+    for phase in PHASES:
+        values = sorted(s[phase] for s in samples)
+        result[phase] = {'p50': round(percentile(values, 50), 2), 'p95': round(percentile(values, 95), 2)}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:///bench.db', help='SQLAlchemy URL the app is configured with')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/about', help='first request to serve')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown, 0.25 = 25%%')
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, LOCAL_SERVER='True', LOCAL_URL=args.db,
+               PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])))
+    probe(args.path, env)  # warm the filesystem and bytecode caches
+    samples = [probe(args.path, env) for _ in range(args.runs)]
+    if any(s['status'] >= 500 for s in samples):
+        print(f"First request to {args.path} failed with {samples[0]['status']}.", file=sys.stderr)
+        return 2
+    results = summarize(samples)
+
+    print(f"{args.runs} cold starts, first request {args.path}")
+    print(f"{'phase':<18} {'p50 ms':>9} {'p95 ms':>9}")
+    for phase in PHASES:
+        print(f"{phase:<18} {results[phase]['p50']:>9.2f} {results[phase]['p95']:>9.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = [f"{phase}: p50 {results[phase]['p50']}ms > baseline {baseline[phase]['p50']}ms "
+                    f"(+{args.tolerance:.0%})"
+                    for phase in PHASES
+                    if phase in baseline and results[phase]['p50'] > baseline[phase]['p50'] * (1 + args.tolerance)]
+        if problems:
+            print("\nRegressions against baseline:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
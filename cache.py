@@ -0,0 +1,274 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from threading import Lock
+
+from flask import Response, request, session, make_response
+
+from signals import post_saved, post_deleted, posts_imported, posts_rendered
+
+
+class MemoryBackend:
+    '''Per-process LRU with a max entry count and a default TTL.
+
+    Nothing is shared, invalidations included: only for a single worker
+    process (the dev server, tests).
+    '''
+
+    def __init__(self, max_entries=512, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemBackend:
+    '''Shared between workers on one host: one pickle file per key.
+    The directory is created on first write, not when the app is built.'''
+
+    def __init__(self, directory, max_entries=2048, ttl=300):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                self.delete_file(name)
+
+    def delete_file(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                entries.append((entry.stat().st_mtime, entry.name))
+            except FileNotFoundError:
+                pass
+        excess = len(entries) - self.max_entries
+        if excess > 0:
+            for _, name in sorted(entries)[:excess]:
+                self.delete_file(name)
+
+
+class RedisBackend:
+    '''Shared across hosts. Needs the optional `redis` package.'''
+
+    def __init__(self, url, ttl=300, prefix='blog:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("PAGE_CACHE_BACKEND=redis requires the 'redis' package") from e
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+def make_backend(config, prefix):
+    kind = config[f'{prefix}_BACKEND']
+    ttl = config[f'{prefix}_TTL']
+    if kind == 'memory':
+        return MemoryBackend(max_entries=config[f'{prefix}_MAX_ENTRIES'], ttl=ttl)
+    if kind == 'filesystem':
+        return FileSystemBackend(config[f'{prefix}_DIR'], max_entries=config[f'{prefix}_MAX_ENTRIES'], ttl=ttl)
+    if kind == 'redis':
+        return RedisBackend(config[f'{prefix}_REDIS_URL'], ttl=ttl)
+    if kind == 'null':
+        return None
+    raise ValueError(f"Unknown {prefix}_BACKEND: {kind!r}")
+
+
+class PageCache:
+    '''Whole-response cache for public pages, invalidated by post writes.
+
+    Every cached page is tagged ("posts" for listings, "post:<slug>" for a
+    single post). A tag maps to a version token stored in the backend, and
+    the token is part of each entry key, so bumping a tag on write makes
+    exactly the affected pages miss on their next request.
+
+    Invalidation only reaches the workers that share the backend, so the
+    default is "filesystem" (every worker on a host); use "redis" across
+    hosts and "memory" only with a single worker process.
+    '''
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'filesystem')
+        app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', 512)
+        app.config.setdefault('PAGE_CACHE_TTL', 300)
+        app.config.setdefault('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache'))
+        app.config.setdefault('PAGE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        self.backend = make_backend(app.config, 'PAGE_CACHE')
+        app.extensions['page_cache'] = self
+        post_saved.connect(self._on_saved, app)
+        post_deleted.connect(self._on_deleted, app)
+        posts_imported.connect(self._on_imported, app)
+        posts_rendered.connect(self._on_rendered, app)
+
+    def _version(self, tag):
+        key = f'tag:{tag}'
+        version = self.backend.get(key)
+        if version is None:
+            version = str(time.time_ns())
+            self.backend.set(key, version, ttl=0)
+        return version
+
+    def invalidate(self, *tags):
+        if self.backend is None:
+            return
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', str(time.time_ns()), ttl=0)
+
+    @staticmethod
+    def _cacheable():
+        # Logged-in users and pending flashes change the rendered layout
+        return request.method == 'GET' and 'user_id' not in session and '_flashes' not in session
+
+    def lookup(self, tags):
+        '''(key, response) for this request and its tags. response is the cached
+        page or None on a miss; key is None when the request must not be cached.'''
+        if self.backend is None or not self._cacheable():
+            return None, None
+        versions = ':'.join(self._version(tag) for tag in tags)
+        key = f'page:{request.full_path}:{versions}'
+        entry = self.backend.get(key)
+        return key, (self._respond(entry) if entry is not None else None)
+
+    def store(self, key, rv):
+        '''Cache a freshly rendered view result under `key`; returns the response to send.'''
+        rv = make_response(rv)
+        if key is None or rv.status_code != 200 or '_flashes' in session:
+            return rv
+        body = rv.get_data()
+        entry = {
+            'body': body,
+            'mimetype': rv.mimetype,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+        }
+        self.backend.set(key, entry)
+        return self._respond(entry)
+
+    def cached(self, tags):
+        '''Cache a view's 200 responses; `tags(**view_args)` lists its tags.'''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                key, hit = self.lookup(tags(**kwargs))
+                if hit is not None:
+                    return hit
+                return self.store(key, view(**kwargs))
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _respond(entry):
+        resp = Response(entry['body'], mimetype=entry['mimetype'])
+        resp.set_etag(entry['etag'])
+        resp.last_modified = entry['last_modified']
+        resp.cache_control.public = True
+        resp.cache_control.no_cache = True
+        resp.vary.add('Cookie')
+        return resp.make_conditional(request)
+
+    def _on_saved(self, app, post, old_slug=None, **extra):
+        self.invalidate('posts', f'post:{post.slug}', *([f'post:{old_slug}'] if old_slug else []))
+
+    def _on_deleted(self, app, slug, **extra):
+        self.invalidate('posts', f'post:{slug}')
+
+    def _on_imported(self, app, **extra):
+        self.invalidate('posts')
+
+    def _on_rendered(self, app, slugs, **extra):
+        self.invalidate('posts', *(f'post:{slug}' for slug in slugs))
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from flask import Response, current_app, request, url_for
+
+from cache import make_backend
+from models import db, Posts, User
+from signals import post_saved, post_deleted, posts_imported, posts_rendered
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+FORMATS = {
+    'atom': 'application/atom+xml',
+    'rss': 'application/rss+xml',
+}
+
+
+def _aware(value):
+    # published_at is stored as naive local time
+    return (value or datetime.now()).astimezone(timezone.utc).replace(microsecond=0)
+
+
+def atom_feed(title, entries):
+    ET.register_namespace('', ATOM_NS)
+    q = lambda tag: f'{{{ATOM_NS}}}{tag}'
+    feed = ET.Element(q('feed'))
+    ET.SubElement(feed, q('title')).text = title
+    ET.SubElement(feed, q('id')).text = url_for('blog.home', _external=True)
+    ET.SubElement(feed, q('link'), href=url_for('blog.home', _external=True))
+    ET.SubElement(feed, q('link'), rel='self', href=url_for('atom_feed', _external=True))
+    updated = max((e['published_at'] for e in entries), default=_aware(None))
+    ET.SubElement(feed, q('updated')).text = updated.isoformat()
+    for e in entries:
+        entry = ET.SubElement(feed, q('entry'))
+        ET.SubElement(entry, q('title')).text = e['title']
+        ET.SubElement(entry, q('id')).text = e['url']
+        ET.SubElement(entry, q('link'), href=e['url'])
+        ET.SubElement(entry, q('updated')).text = e['published_at'].isoformat()
+        author = ET.SubElement(entry, q('author'))
+        ET.SubElement(author, q('name')).text = e['author'] or title
+        ET.SubElement(entry, q('summary')).text = e['summary']
+    return ET.tostring(feed, encoding='utf-8', xml_declaration=True)
+
+
+def rss_feed(title, entries):
+    rss = ET.Element('rss', version='2.0')
+    channel = ET.SubElement(rss, 'channel')
+    ET.SubElement(channel, 'title').text = title
+    ET.SubElement(channel, 'link').text = url_for('blog.home', _external=True)
+    ET.SubElement(channel, 'description').text = title
+    updated = max((e['published_at'] for e in entries), default=_aware(None))
+    ET.SubElement(channel, 'lastBuildDate').text = format_datetime(updated)
+    for e in entries:
+        item = ET.SubElement(channel, 'item')
+        ET.SubElement(item, 'title').text = e['title']
+        ET.SubElement(item, 'link').text = e['url']
+        ET.SubElement(item, 'guid', isPermaLink='true').text = e['url']
+        ET.SubElement(item, 'pubDate').text = format_datetime(e['published_at'])
+        ET.SubElement(item, 'description').text = e['summary']
+    return ET.tostring(rss, encoding='utf-8', xml_declaration=True)
+
+
+BUILDERS = {'atom': atom_feed, 'rss': rss_feed}
+
+
+class Feeds:
+    '''Atom (/feed.xml) and RSS (/rss.xml) feeds of the latest posts.
+
+    Each body is built once and cached with a strong ETag and a
+    Last-Modified of its newest entry; post writes drop the cached bodies.
+    A poll with a matching validator gets a 304 without a database query.
+    Bodies are built from the primary: a cached body lives until the next
+    write, so one built from a lagging replica would stay stale that long.
+    '''
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEED_TITLE', app.name)
+        app.config.setdefault('FEED_ENTRIES', 20)
+        app.config.setdefault('FEED_MAX_AGE', 300)
+        app.config.setdefault('FEED_BACKEND', 'memory')
+        app.config.setdefault('FEED_TTL', 0)
+        app.config.setdefault('FEED_MAX_ENTRIES', 4)
+        app.config.setdefault('FEED_DIR', os.path.join(app.instance_path, 'feed_cache'))
+        app.config.setdefault('FEED_REDIS_URL', app.config.get('PAGE_CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+        self.backend = make_backend(app.config, 'FEED')
+        app.extensions['feeds'] = self
+        post_saved.connect(self._on_change, app)
+        post_deleted.connect(self._on_change, app)
+        posts_imported.connect(self._on_change, app)
+        posts_rendered.connect(self._on_change, app)
+        app.add_url_rule('/feed.xml', 'atom_feed', lambda: self.respond('atom'))
+        app.add_url_rule('/rss.xml', 'rss_feed', lambda: self.respond('rss'))
+
+    def statement(self):
+        '''The query behind both feeds: the newest FEED_ENTRIES posts with their authors.'''
+        return (db.select(Posts.title, Posts.slug, Posts.excerpt, Posts.published_at, User.name)
+                .join(User, User.id == Posts.user_id, isouter=True)
+                .order_by(Posts.published_at.desc(), Posts.sno.desc())
+                .limit(current_app.config['FEED_ENTRIES']))
+
+    def _entries(self, rows):
+        return [{'title': title,
+                 'url': url_for('blog.post_route', post_slug=slug, _external=True),
+                 'summary': excerpt or '',
+                 'published_at': _aware(published_at),
+                 'author': author}
+                for title, slug, excerpt, published_at, author in rows]
+
+    def build(self, kind, rows=None):
+        '''Build one feed body; `rows` are statement()'s results when the caller already ran it.'''
+        if rows is None:
+            rows = db.session.execute(self.statement(), bind_arguments={'bind': db.engine})
+        entries = self._entries(rows)
+        body = BUILDERS[kind](current_app.config['FEED_TITLE'], entries)
+        # A delete changes the body without adding a newer entry, so also count the last write
+        changed = self.backend.get('feed:changed') if self.backend is not None else None
+        stamps = [e['published_at'] for e in entries] + ([changed] if changed else [])
+        return {
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'last_modified': max(stamps, default=None),
+        }
+
+    def lookup(self, kind):
+        return self.backend.get(f'feed:{kind}') if self.backend is not None else None
+
+    def store(self, kind, entry):
+        if self.backend is not None:
+            self.backend.set(f'feed:{kind}', entry)
+
+    def response(self, kind, entry):
+        resp = Response(entry['body'], mimetype=FORMATS[kind])
+        resp.set_etag(entry['etag'])
+        if entry['last_modified'] is not None:
+            resp.last_modified = entry['last_modified']
+        resp.cache_control.public = True
+        resp.cache_control.max_age = current_app.config['FEED_MAX_AGE']
+        return resp.make_conditional(request)
+
+    def respond(self, kind):
+        entry = self.lookup(kind)
+        if entry is None:
+            entry = self.build(kind)
+            self.store(kind, entry)
+        return self.response(kind, entry)
+
+    def _on_change(self, app, **extra):
+        if self.backend is not None:
+            self.backend.set('feed:changed', _aware(None), ttl=0)
+            for kind in FORMATS:
+                self.backend.delete(f'feed:{kind}')
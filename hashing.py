@@ -0,0 +1,79 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from threading import BoundedSemaphore
+
+from instrumentation import timed
+
+BCRYPT_COST_RE = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class HasherBusy(Exception):
+    '''Raised instead of queueing when every hashing slot is taken, or when a
+    queued hash is not done within HASH_TIMEOUT.'''
+
+    retry_after = 5
+
+
+class PasswordHasher:
+    '''bcrypt on a bounded worker pool.
+
+    At most HASH_WORKERS hashes run at once and at most HASH_QUEUE_DEPTH more
+    may wait; anything beyond that fails fast with HasherBusy so a burst of
+    logins cannot tie up every web worker on CPU-bound hashing. bcrypt
+    releases the GIL, so threads give real parallelism here.
+    '''
+
+    def __init__(self, app=None, bcrypt=None):
+        self._executor = None
+        self._workers = None
+        self._slots = None
+        self.bcrypt = bcrypt
+        if app is not None:
+            self.init_app(app, bcrypt)
+
+    def init_app(self, app, bcrypt):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('HASH_WORKERS', os.cpu_count() or 2)
+        app.config.setdefault('HASH_QUEUE_DEPTH', app.config['HASH_WORKERS'] * 2)
+        app.config.setdefault('HASH_TIMEOUT', 10)
+        self.bcrypt = bcrypt
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.timeout = app.config['HASH_TIMEOUT']
+        workers = app.config['HASH_WORKERS']
+        # One pool per process: apps built again (tests, reloads) reuse it rather than leak threads
+        if self._executor is None or self._workers != workers:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+            self._workers = workers
+        self._slots = BoundedSemaphore(workers + app.config['HASH_QUEUE_DEPTH'])
+        app.extensions['password_hasher'] = self
+
+    def _run(self, fn, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        with timed('bcrypt'):
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                # The hash still finishes and frees its slot; only this caller gives up
+                raise HasherBusy() from None
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def verify(self, pw_hash, password):
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        '''True when a stored hash uses a different work factor than configured.'''
+        match = BCRYPT_COST_RE.match(pw_hash or '')
+        return match is None or int(match.group(1)) != self.rounds
@@ -0,0 +1,319 @@
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from models import db, ImageRefs, Posts, upsert_add
+
+# Pillow is optional (without it only the original is stored) and slow to
+# import, so only the worker processes that encode images load it
+HAVE_PILLOW = importlib.util.find_spec('PIL') is not None
+
+VARIANT_WIDTHS = (480, 960, 1600)
+VARIANT_FORMATS = (('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+                   ('webp', 'WEBP', {'quality': 80, 'method': 4}))
+CHUNK_SIZE = 64 * 1024
+# Stored uploads and their variants; anything else in the folder (theme images,
+# uploads from before content addressing) is never garbage collected
+STORED_RE = re.compile(r'^(?P<stem>[0-9a-f]{20})(?:-(?P<width>\d+))?\.(?P<ext>[a-z0-9]+)$')
+TMP_PREFIX = '.upload.'
+KNOWN_VARIANTS = 4096  # filenames whose variant widths each worker remembers
+
+
+def variant_name(filename, width, ext):
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}-{width}.{ext}"
+
+
+def stored_name(digest, original_name):
+    ext = original_name.rsplit('.', 1)[1].lower()
+    ext = 'jpg' if ext == 'jpeg' else ext
+    return f"{digest[:20]}.{ext}"
+
+
+def store_stream(stream, original_name, folder, max_bytes=None):
+    '''Copy `stream` into `folder` in CHUNK_SIZE pieces while hashing it, and
+    store it under its content-hashed name. Returns (name, newly_written).
+
+    An identical file already stored is reused; its mtime is refreshed so
+    `flask images gc` leaves it alone for another grace period.
+    '''
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=TMP_PREFIX, suffix='.tmp')
+    try:
+        digest, size = hashlib.sha256(), 0
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise RequestEntityTooLarge()
+                digest.update(chunk)
+                f.write(chunk)
+        name = stored_name(digest.hexdigest(), original_name)
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.utime(path)
+            return name, False
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600; the web server serves these
+        os.replace(tmp, path)
+        return name, True
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def make_variants(path):
+    '''Runs in a worker process: strip metadata from the original and write
+    resized JPEG and WebP variants next to it. Returns the names written.'''
+    from PIL import Image, ImageOps
+
+    folder, filename = os.path.split(path)
+    written = []
+    with Image.open(path) as img:
+        if getattr(img, 'is_animated', False):
+            return written
+        fmt = img.format
+        img = ImageOps.exif_transpose(img)
+
+        # Re-encode the original without EXIF/XMP; same pixels, same name
+        tmp = os.path.join(folder, f".{filename}.tmp")
+        clean = img.convert('RGB') if fmt == 'JPEG' and img.mode not in ('RGB', 'L') else img
+        clean.save(tmp, fmt, **({'quality': 90, 'optimize': True} if fmt == 'JPEG' else {}))
+        os.replace(tmp, path)
+
+        rgb = img.convert('RGB') if img.mode not in ('RGB', 'L') else img
+        for width in VARIANT_WIDTHS:
+            if width >= rgb.width:
+                break
+            height = round(rgb.height * width / rgb.width)
+            resized = rgb.resize((width, height), Image.LANCZOS)
+            for ext, fmt, options in VARIANT_FORMATS:
+                name = variant_name(filename, width, ext)
+                tmp = os.path.join(folder, f".{name}.tmp")
+                resized.save(tmp, fmt, **options)
+                os.replace(tmp, os.path.join(folder, name))
+                written.append(name)
+    return written
+
+
+class ImagePipeline:
+    '''Stores uploads under content-hashed names and builds responsive
+    variants in a process pool so requests never wait on image encoding.'''
+
+    def __init__(self, app=None):
+        self._pool = None
+        self._known = OrderedDict()  # filename -> tuple of variant widths found on disk, least recent first
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_WORKERS', 2)
+        app.config.setdefault('IMAGE_GC_GRACE', 24 * 3600)
+        app.extensions['image_pipeline'] = self
+        app.jinja_env.globals['responsive_image'] = self.responsive_image
+        app.cli.add_command(images_cli)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'],
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def save_upload(self, file_storage):
+        '''Save an upload and queue its variants. Returns the stored filename;
+        the caller records the reference with models.adjust_image_refs().'''
+        folder = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        filename, new = store_stream(file_storage.stream, file_storage.filename, folder,
+                                     current_app.config.get('MAX_CONTENT_LENGTH'))
+        if new:
+            self.process(os.path.join(folder, filename))
+        return filename
+
+    def process(self, path):
+        if not HAVE_PILLOW:
+            return None
+        logger = current_app.logger
+        future = self.pool.submit(make_variants, path)
+
+        def report(done):
+            if done.exception() is not None:
+                logger.error(f"Image processing failed for {path}: {done.exception()}")
+        future.add_done_callback(report)
+        return future
+
+    def _variants(self, filename):
+        widths = self._known.get(filename)
+        if widths:
+            self._known.move_to_end(filename)
+            return widths
+        folder = current_app.config['UPLOAD_FOLDER']
+        widths = tuple(w for w in VARIANT_WIDTHS
+                       if os.path.exists(os.path.join(folder, variant_name(filename, w, 'webp'))))
+        if widths:  # only remember hits; misses may still be in the pool
+            self._known[filename] = widths
+            while len(self._known) > KNOWN_VARIANTS:
+                self._known.popitem(last=False)
+        return widths
+
+    def responsive_image(self, filename, alt='', css_class='', sizes='(min-width: 768px) 33vw, 100vw'):
+        '''Jinja helper: <picture> with WebP and JPEG srcsets for a stored upload.'''
+        if not filename:
+            return Markup('')
+        src = url_for('static', filename='assets/img/' + filename)
+        img_attrs = f'class="{escape(css_class)}" alt="{escape(alt)}" loading="lazy"'
+        widths = self._variants(filename)
+        if not widths:
+            return Markup(f'<img src="{src}" {img_attrs} />')
+
+        def srcset(ext):
+            return ', '.join(
+                f"{url_for('static', filename='assets/img/' + variant_name(filename, w, ext))} {w}w"
+                for w in widths)
+        smallest = url_for('static', filename='assets/img/' + variant_name(filename, widths[0], 'jpg'))
+        return Markup(
+            f'<picture>'
+            f'<source type="image/webp" srcset="{srcset("webp")}" sizes="{sizes}" />'
+            f'<img src="{smallest}" srcset="{srcset("jpg")}" sizes="{sizes}" {img_attrs} />'
+            f'</picture>'
+        )
+
+
+def _claim(filename, cutoff):
+    '''Right before its files are unlinked: drop the count of `filename` if it
+    is still zero and older than `cutoff`. False when a post started using it
+    since gc read the counts, which then keeps the files.'''
+    before = datetime.fromtimestamp(cutoff)
+    deleted = db.session.execute(db.delete(ImageRefs).where(
+        ImageRefs.filename == filename, ImageRefs.refs <= 0, ImageRefs.updated_at < before)).rowcount
+    if not deleted and db.session.get(ImageRefs, filename) is not None:
+        return False
+    db.session.commit()
+    return True
+
+
+images_cli = AppGroup('images', help='Uploaded image commands.')
+
+
+@images_cli.command('variants')
+def variants_command():
+    '''Build missing variants for every image referenced by a post.'''
+    pipeline = current_app.extensions['image_pipeline']
+    if not HAVE_PILLOW:
+        raise click.ClickException("Pillow is not installed.")
+    folder = current_app.config['UPLOAD_FOLDER']
+    names = {name for (name,) in Posts.query.with_entities(Posts.img_file).filter(Posts.img_file.isnot(None))}
+    futures = [pipeline.process(os.path.join(folder, name)) for name in sorted(names)
+               if os.path.exists(os.path.join(folder, name))]
+    for future in futures:
+        future.result()
+    click.echo(f"Processed {len(futures)} image(s).")
+
+
+@images_cli.command('recount')
+def recount_command():
+    '''Recompute image reference counts from the posts table.'''
+    counts = dict(db.session.execute(
+        db.select(Posts.img_file, db.func.count()).where(Posts.img_file.isnot(None)).group_by(Posts.img_file)).all())
+    now = datetime.now()
+    stale = db.update(ImageRefs).values(refs=0, updated_at=now)
+    if counts:
+        stale = stale.where(ImageRefs.filename.notin_(list(counts)))
+    db.session.execute(stale)
+    rows = [{'filename': name, 'refs': refs, 'updated_at': now} for name, refs in counts.items()]
+    if rows:
+        upsert_add(ImageRefs.__table__, 'filename', rows, ())
+    db.session.commit()
+    click.echo(f"Counted references to {len(counts)} image(s).")
+
+
+@images_cli.command('gc')
+@click.option('--grace', type=int, help='Keep files touched within this many seconds (default IMAGE_GC_GRACE).')
+@click.option('--dry-run', is_flag=True, help='List what would be removed; delete nothing.')
+def gc_command(grace, dry_run):
+    '''Delete stored uploads (and their variants) that no post references.
+
+    A file goes once its reference count is zero and neither the file nor
+    its count changed within the grace period, which covers uploads whose
+    post is not committed yet. Both are checked again right before each
+    unlink. Safe to run from cron next to the web workers.
+    '''
+    folder = current_app.config['UPLOAD_FOLDER']
+    grace = current_app.config['IMAGE_GC_GRACE'] if grace is None else grace
+    cutoff = time.time() - grace
+    if not os.path.isdir(folder):
+        click.echo("Nothing to collect.")
+        return
+
+    stems, stale_tmp = {}, []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(TMP_PREFIX):
+                if entry.stat().st_mtime < cutoff:
+                    stale_tmp.append(entry.name)  # left by a crashed upload
+                continue
+            match = STORED_RE.match(entry.name)
+            if match:
+                group = stems.setdefault(match['stem'], {'original': None, 'files': [], 'mtime': 0})
+                group['files'].append(entry.name)
+                group['mtime'] = max(group['mtime'], entry.stat().st_mtime)
+                if match['width'] is None:
+                    group['original'] = entry.name
+
+    live = set(db.session.execute(db.select(ImageRefs.filename).where(
+        (ImageRefs.refs > 0) | (ImageRefs.updated_at >= datetime.fromtimestamp(cutoff)))).scalars())
+    candidates = {stem: group for stem, group in stems.items()
+                  if group['mtime'] < cutoff and group['original'] not in live}
+    # A drifted count must never cost a post its image: check the candidates against posts too
+    originals = [group['original'] for group in candidates.values() if group['original']]
+    used = set()
+    for start in range(0, len(originals), 500):
+        used.update(db.session.execute(db.select(Posts.img_file).where(
+            Posts.img_file.in_(originals[start:start + 500]))).scalars())
+    garbage = [group for group in candidates.values() if group['original'] not in used]
+
+    removed, collected = 0, 0
+    for group in garbage:
+        if not dry_run:
+            if group['original'] and not _claim(group['original'], cutoff):
+                continue
+            # An upload of the same content refreshes the mtime before its post commits
+            try:
+                if os.stat(os.path.join(folder, group['original'] or group['files'][0])).st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                pass
+        for name in group['files']:
+            if dry_run:
+                click.echo(f"would remove {name}")
+            else:
+                try:
+                    os.unlink(os.path.join(folder, name))
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        collected += 1
+    if not dry_run:
+        for name in stale_tmp:
+            try:
+                os.unlink(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+        # Counts for files that are already gone
+        db.session.execute(db.delete(ImageRefs).where(
+            ImageRefs.refs <= 0, ImageRefs.updated_at < datetime.fromtimestamp(cutoff)))
+        db.session.commit()
+    verb = "Would remove" if dry_run else "Removed"
+    click.echo(f"{verb} {removed} file(s) from {collected} unreferenced image(s).")
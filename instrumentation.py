@@ -0,0 +1,213 @@
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+slow_query_log = logging.getLogger('blog.slowquery')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Module-level switch so timed() costs one attribute check when metrics are off
+_active = None
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    '''Per-process metric store rendered in the Prometheus text format.'''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = Lock()
+        self.latency = {}                    # (route, method) -> Histogram
+        self.requests = defaultdict(int)     # (route, method, status) -> count
+        self.db_queries = defaultdict(int)   # route -> count
+        self.db_seconds = defaultdict(float) # route -> seconds
+        self.timers = defaultdict(float)     # name -> seconds (bcrypt, smtp, ...)
+        self.timer_calls = defaultdict(int)
+        self.slow_queries = 0
+
+    def observe_request(self, route, method, status, seconds, queries, db_seconds):
+        with self.lock:
+            hist = self.latency.get((route, method))
+            if hist is None:
+                hist = self.latency[(route, method)] = Histogram(self.buckets)
+            hist.observe(seconds)
+            self.requests[(route, method, status)] += 1
+            self.db_queries[route] += queries
+            self.db_seconds[route] += db_seconds
+
+    def observe_timer(self, name, seconds):
+        with self.lock:
+            self.timers[name] += seconds
+            self.timer_calls[name] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines += ['# HELP blog_request_duration_seconds Request latency by route.',
+                      '# TYPE blog_request_duration_seconds histogram']
+            for (route, method), hist in sorted(self.latency.items()):
+                labels = f'route="{route}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f'blog_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'blog_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f'blog_request_duration_seconds_sum{{{labels}}} {hist.total:.6f}')
+                lines.append(f'blog_request_duration_seconds_count{{{labels}}} {hist.count}')
+
+            lines += ['# HELP blog_requests_total Requests by route and status.',
+                      '# TYPE blog_requests_total counter']
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'blog_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+            lines += ['# HELP blog_db_queries_total SQL statements executed by route.',
+                      '# TYPE blog_db_queries_total counter']
+            for route, count in sorted(self.db_queries.items()):
+                lines.append(f'blog_db_queries_total{{route="{route}"}} {count}')
+            lines += ['# HELP blog_db_query_seconds_total Time spent in SQL by route.',
+                      '# TYPE blog_db_query_seconds_total counter']
+            for route, seconds in sorted(self.db_seconds.items()):
+                lines.append(f'blog_db_query_seconds_total{{route="{route}"}} {seconds:.6f}')
+
+            lines += ['# HELP blog_timer_seconds_total Time spent in instrumented blocks.',
+                      '# TYPE blog_timer_seconds_total counter']
+            for name, seconds in sorted(self.timers.items()):
+                lines.append(f'blog_timer_seconds_total{{name="{name}"}} {seconds:.6f}')
+            lines += ['# TYPE blog_timer_calls_total counter']
+            for name, calls in sorted(self.timer_calls.items()):
+                lines.append(f'blog_timer_calls_total{{name="{name}"}} {calls}')
+
+            lines += ['# HELP blog_slow_queries_total Queries slower than SLOW_QUERY_MS.',
+                      '# TYPE blog_slow_queries_total counter',
+                      f'blog_slow_queries_total {self.slow_queries}']
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed(name):
+    '''Time a block (bcrypt, SMTP, ...) into Server-Timing and /metrics.'''
+    if _active is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _active.record(name, time.perf_counter() - started)
+
+
+class Instrumentation:
+    '''SQL and timing instrumentation, enabled with METRICS_ENABLED.
+
+    When disabled nothing is registered: no engine listeners, no request
+    hooks and no /metrics route. Call init_app after db.init_app, whose
+    engines get the query listeners.
+    '''
+
+    def __init__(self, app=None):
+        self.metrics = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        global _active
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.extensions['instrumentation'] = self
+        if not app.config['METRICS_ENABLED']:
+            # A previous app in this process may have switched them on
+            self.metrics = None
+            if _active is self:
+                _active = None
+            return
+
+        self.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000.0
+        self.token = app.config['METRICS_TOKEN']
+        self.metrics = Metrics()
+        _active = self
+
+        # Only this app's engines (primary and replicas) pay for the query timer
+        with app.app_context():
+            engines = list(app.extensions['sqlalchemy'].engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def record(self, name, seconds):
+        self.metrics.observe_timer(name, seconds)
+        if has_request_context() and hasattr(g, '_timings'):
+            g._timings[name] += seconds
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if self.metrics is None:
+            return
+        if has_request_context() and hasattr(g, '_timings'):
+            g._sql_count += 1
+            g._timings['db'] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            with self.metrics.lock:
+                self.metrics.slow_queries += 1
+            route = request.endpoint if has_request_context() else None
+            slow_query_log.warning("%.1fms route=%s %s", elapsed * 1000, route, ' '.join(statement.split())[:1000])
+
+    def _before_render(self, app, template, context, **extra):
+        if hasattr(g, '_timings'):
+            g._render_started = time.perf_counter()
+
+    def _after_render(self, app, template, context, **extra):
+        started = g.pop('_render_started', None)
+        if started is not None:
+            g._timings['render'] += time.perf_counter() - started
+
+    def _start_request(self):
+        g._started = time.perf_counter()
+        g._sql_count = 0
+        g._timings = defaultdict(float)
+
+    def _finish_request(self, response):
+        if not hasattr(g, '_started'):
+            return response
+        total = time.perf_counter() - g._started
+        timings = g._timings
+        parts = [f'db;dur={timings.get("db", 0.0) * 1000:.2f};desc="{g._sql_count} queries"']
+        for name, seconds in timings.items():
+            if name != 'db':
+                parts.append(f'{name};dur={seconds * 1000:.2f}')
+        parts.append(f'total;dur={total * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+        self.metrics.observe_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                     total, g._sql_count, timings.get('db', 0.0))
+        return response
+
+    def metrics_view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            abort(403)
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,61 +1,161 @@
 import os
-import json
 import re
 from datetime import datetime
-from flask import Flask, render_template, request, session, redirect, flash, url_for
+import click
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, flash, url_for, g, jsonify
+from flask.cli import ScriptInfo, with_appcontext
 from flask_bcrypt import Bcrypt
-from werkzeug.utils import secure_filename
-from flask_migrate import Migrate
-from flask_mail import Mail, Message
-from models import db, Contacts, Posts, User
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Load configuration
-with open('config.json','r') as c:
-    params = json.load(c)["params"]
+from flask_mail import Mail
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.local import LocalProxy
+from sqlalchemy.orm import defer
+from models import db, Contacts, Posts, User, adjust_image_refs, adjust_post_count, post_list_options
+from pagination import paginate_posts, forget_counts
+from search import PostSearch
+from suggest import Suggest
+from cache import PageCache
+from outbox import enqueue, init_outbox
+from images import ImagePipeline
+from assets import HashedAssets
+from auth import init_identity, login_required, login_user, logout_user
+from hashing import PasswordHasher, HasherBusy
+from signals import post_saved, post_deleted
+from replicas import init_replicas, read_replica
+from instrumentation import Instrumentation
+from posts_cli import posts_cli
+from feeds import Feeds
+from sitemap import Sitemap
+from analytics import Analytics
+from related import Related
+from settings import load_config
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
-# Flask app setup
-app = Flask(__name__)
-
-app.secret_key = os.getenv('SECRET_KEY', params.get('secret_key', 'default-secret-key'))
-
-# Upload folder setup
-UPLOAD_FOLDER = "static/assets/img"
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Database Configuration
-local_server = os.getenv('LOCAL_SERVER', 'True').lower() == 'true'
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('LOCAL_URL') if local_server else os.getenv('PROD_URL')
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-bcrypt = Bcrypt(app)
-migrate = Migrate(app, db)
-
-# Mail configuration
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USE_SSL'] = False
-app.config['MAIL_USERNAME'] = os.getenv('GMAIL_USER')
-app.config['MAIL_PASSWORD'] = os.getenv('GMAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = app.config['MAIL_USERNAME']
-
-mail = Mail(app)
-
-# Helper function
+# Extensions are created unbound and attached to an app in create_app()
+instrumentation = Instrumentation()
+images = ImagePipeline()
+hashed_assets = HashedAssets()
+bcrypt = Bcrypt()
+hasher = PasswordHasher()
+mail = Mail()
+post_search = PostSearch()
+suggest = Suggest()
+page_cache = PageCache()
+feeds = Feeds()
+sitemap = Sitemap()
+analytics = Analytics()
+related = Related()
+
+blog = Blueprint('blog', __name__)
+
+# config.json params for the templates, from whichever app is handling the request
+params = LocalProxy(lambda: current_app.config['PARAMS'])
+
+
+class MigrateGroup(click.Group):
+    '''Lists Flask-Migrate's `db` subcommands but imports it only when one runs:
+    Alembic alone is a large share of every worker's import time.'''
+
+    def _db_group(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_group
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db)
+        return db_group
+
+    def list_commands(self, ctx):
+        return self._db_group(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._db_group(ctx).get_command(ctx, name)
+
+
+@click.group('db', cls=MigrateGroup)
+@click.option('-d', '--directory', default=None, help='Migration script directory (default is "migrations")')
+@click.option('-x', '--x-arg', multiple=True, help='Additional arguments consumed by custom env.py scripts')
+@with_appcontext
+def migrate_cli(directory, x_arg):
+    '''Perform database migrations.'''
+    # As flask_migrate.cli.db does; Migrate.get_config() reads these
+    g.directory = directory
+    g.x_arg = x_arg
+
+
+def create_schema():
+    '''Create missing tables and the search index on the primary database.'''
+    # Replica binds get their schema through replication
+    db.create_all(bind_key=None)
+    post_search.create_index()
+
+
+@click.command('create-db')
+@click.option('--directory', default='migrations', help='Migration scripts to stamp the new schema with.')
+@with_appcontext
+def create_db_command(directory):
+    '''Create missing tables from the models and stamp them as the latest migration.
+
+    For new databases; existing ones are upgraded with `flask db upgrade`.
+    '''
+    create_schema()
+    if os.path.isdir(directory):
+        from flask_migrate import Migrate, stamp
+        if 'migrate' not in current_app.extensions:
+            Migrate(current_app._get_current_object(), db)
+        stamp(directory=directory)
+    click.echo("Created missing tables.")
+
+
+def create_app(config=None):
+    '''Build the app. `config` (a dict) overrides values from the environment and config.json.
+
+    Nothing here connects to the database or writes to disk, so workers and
+    CLI commands start fast and start even while the database is down.
+    Create the schema explicitly with `flask db upgrade` or `flask create-db`.
+    '''
+    app = Flask(__name__)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+    app.secret_key = app.config['SECRET_KEY']
+
+    images.init_app(app)
+    hashed_assets.init_app(app)
+    init_replicas(app)
+    db.init_app(app)
+    instrumentation.init_app(app)
+    bcrypt.init_app(app)
+    hasher.init_app(app, bcrypt)
+    mail.init_app(app)
+    init_identity(app)
+    init_outbox(app)
+    post_search.init_app(app)
+    suggest.init_app(app)
+    page_cache.init_app(app)
+    feeds.init_app(app)
+    sitemap.init_app(app)
+    analytics.init_app(app)
+    related.init_app(app)
+
+    app.cli.add_command(migrate_cli)
+    app.cli.add_command(create_db_command)
+    # `flask posts import/export` for bulk migrations
+    app.cli.add_command(posts_cli)
+    app.register_blueprint(blog)
+    return app
+
+# Helper functions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
-# Ensure database tables are created
-with app.app_context():
-    db.create_all()
+def list_query(query):
+    return query.options(*post_list_options(current_app.config['POST_AUTHOR_LOADING']))
+
+@blog.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit = current_app.config['MAX_CONTENT_LENGTH'] or 0
+    flash(f"Upload is too large! The limit is {limit // (1024 * 1024)} MB.", "danger")
+    return redirect(url_for("blog.dashboard"))
 
 # Blog Configurations
 blog_name = os.getenv('BLOG_NAME', 'Default Blog')
@@ -63,81 +163,56 @@ about_txt = os.getenv('ABOUT_TXT', 'About me section')
 no_of_posts = int(os.getenv('NO_OF_POSTS', '2'))
 
 # Routes
-@app.route("/")
+@blog.route("/")
+@read_replica
+@page_cache.cached(tags=lambda: ['posts'])
 def home():
-    page = max(1, request.args.get('page', 1, type=int))
     per_page = int(params.get('no_of_posts', 2))
-    posts = Posts.query.order_by(Posts.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
-
-    prev_url = url_for("home", page=posts.prev_num) if posts.has_prev else None
-    next_url = url_for("home", page=posts.next_num) if posts.has_next else None
+    posts, prev_url, next_url, pagination = paginate_posts(
+        list_query(Posts.query), Posts.published_at, Posts.sno, per_page, "blog.home", count_key="posts:all")
 
-    return render_template('index.html', params=params, posts=posts.items, prev=prev_url, next=next_url)
+    return render_template('index.html', params=params, posts=posts, prev=prev_url, next=next_url, pagination=pagination)
 
-@app.route("/about",methods=['GET'])
+@blog.route("/about",methods=['GET'])
+@read_replica
 def about():
         return (render_template('about.html',params = params))
 
-@app.route("/post", methods=['GET', 'POST'])
+@blog.route("/post", methods=['GET', 'POST'])
+@login_required
 def post():
-    if 'user' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for("login"))
-
-    user_email = session.get('user')
-    user = User.query.filter_by(email=user_email).first()
-
-    if not user:
-        session.pop('user', None)
-        flash("User not found!", "danger")
-        return redirect(url_for("login"))
+    user = g.user
 
     # Pagination Setup
-    page = max(1, request.args.get('page', 1, type=int))
     per_page = 3
-    user_posts = Posts.query.filter_by(user_id=user.id).order_by(Posts.date.desc()).paginate(page=page,per_page=per_page,error_out=False)
-    prev_url = url_for("post", page=user_posts.prev_num) if user_posts.has_prev else None
-    next_url = url_for("post", page=user_posts.next_num) if user_posts.has_next else None
-    return render_template('post.html', posts=user_posts.items, user=user, prev=prev_url, next=next_url,params=params)
+    user_posts, prev_url, next_url, pagination = paginate_posts(
+        list_query(Posts.query.filter_by(user_id=user.id)), Posts.published_at, Posts.sno, per_page, "blog.post",
+        total=user.post_count)
+    return render_template('post.html', posts=user_posts, user=user, prev=prev_url, next=next_url, pagination=pagination, params=params)
 
-@app.route("/dashboard", methods=['GET','POST'])
+@blog.route("/dashboard", methods=['GET','POST'])
+@login_required
 def dashboard():
-    if 'user' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for("login"))
-
-    user_email = session.get('user')
-    user = User.query.filter_by(email=user_email).first()
+    user = g.user
 
-    if not user:
-        session.pop('user', None)
-        flash("User not found!", "danger")
-        return redirect(url_for("login"))
-
-    page = max(1, request.args.get('page', 1, type=int))
     per_page = 3
-    user_posts = Posts.query.filter_by(user_id=user.id).order_by(Posts.date.desc()).paginate(page=page,per_page=per_page,error_out=False)
+    user_posts, prev_url, next_url, pagination = paginate_posts(
+        list_query(Posts.query.filter_by(user_id=user.id)), Posts.published_at, Posts.sno, per_page, "blog.dashboard",
+        total=user.post_count)
 
-    return render_template('dashboard.html', params=params, posts=user_posts)
+    return render_template('dashboard.html', params=params, posts=user_posts, prev=prev_url, next=next_url, pagination=pagination)
 
-@app.route("/add",methods=['POST'])
+@blog.route("/add",methods=['POST'])
+@login_required
 def add_post():
-    if 'user' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for("login"))
-
-    user = User.query.filter_by(email=session.get('user')).first()
-
-    if not user:
-        flash("Invalid user session! Please log in again.", "danger")
-        session.pop('user', None)
-        return redirect(url_for("login"))
+    user = g.user
 
     if request.method == 'POST':
         title = request.form['title']
         slug = request.form['slug']
         content = request.form['content']
-        date = datetime.now().strftime("%d-%m-%Y %I:%M %p")
+        now = datetime.now()
+        date = now.strftime("%d-%m-%Y %I:%M %p")
         img_file = request.files.get('img_file')
 
         if not (title and slug and content):
@@ -149,103 +224,110 @@ def add_post():
             flash("Slug already exists! Please choose a different one.", "danger")
             return render_template("add.html", params=params)
 
-        filename = secure_filename(img_file.filename) if img_file and img_file.filename else None
-        if filename:
-            img_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        filename = None
+        if img_file and img_file.filename:
+            if not allowed_file(img_file.filename):
+                flash("Image must be a png, jpg, jpeg or gif file!", "danger")
+                return render_template("add.html", params=params)
+            filename = images.save_upload(img_file)
 
-        new_post = Posts(title=title, slug=slug, content=content, date=date, img_file=filename , user_id=user.id)
+        new_post = Posts(title=title, slug=slug, content=content, date=date, published_at=now, img_file=filename , user_id=user.id)
         db.session.add(new_post)
+        adjust_post_count(user.id, 1)
+        adjust_image_refs({filename: 1})
         db.session.commit()
+        forget_counts("posts:")
+        post_saved.send(current_app._get_current_object(), post=new_post, created=True, old_slug=None)
         flash("New post added!", "success")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("blog.dashboard"))
     return render_template("add.html", params=params)
 
-@app.route("/edit/<int:sno>", methods=['GET', 'POST'])
+@blog.route("/edit/<int:sno>", methods=['GET', 'POST'])
+@login_required
 def edit_post(sno):
-    if 'user' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for("login"))
-
-    user = User.query.filter_by(email=session['user']).first()
-    if not user:
-        flash("Invalid session! Please log in again.", "danger")
-        session.clear()
-        return redirect(url_for("login"))
+    user = g.user
 
     post = Posts.query.get_or_404(sno)
     if not post:
         flash("Post not found!", "danger")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("blog.dashboard"))
 
     if post.user_id != user.id:
         flash("You are not authorized to edit this post!", "danger")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("blog.dashboard"))
 
     if request.method == 'POST':
         title = request.form['title']
         slug = request.form['slug']
         content = request.form['content']
-        post.date = datetime.now().strftime("%d-%m-%Y %I:%M %p")
+        now = datetime.now()
+        post.date = now.strftime("%d-%m-%Y %I:%M %p")
+        post.published_at = now
         img_file = request.files.get('img_file')
 
         existing_slug = Posts.query.filter(Posts.slug == slug, Posts.sno != sno).first()
         if existing_slug:
             flash("Slug already exists! Please choose a different one.", "danger")
-            return redirect(url_for("edit_post", sno=sno))
+            return redirect(url_for("blog.edit_post", sno=sno))
+        old_slug = post.slug
         post.title = title
         post.slug = slug
         post.content = content
 
         if img_file and allowed_file(img_file.filename):
-            filename = secure_filename(img_file.filename)
-            img_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            post.img_file = filename
+            filename = images.save_upload(img_file)
+            if filename != post.img_file:
+                adjust_image_refs({filename: 1, post.img_file: -1})
+                post.img_file = filename
 
         db.session.commit()
+        post_saved.send(current_app._get_current_object(), post=post, created=False, old_slug=old_slug)
         flash("Post Updated Successfully", "success")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("blog.dashboard"))
     return render_template("edit.html", post=post, params=params, sno=sno)
 
-@app.route("/post/<string:post_slug>",methods = ['GET'])
+@blog.route("/post/<string:post_slug>",methods = ['GET'])
+@read_replica
+@analytics.counted
+@page_cache.cached(tags=lambda post_slug: [f'post:{post_slug}'])
 def post_route(post_slug):
-    post = Posts.query.filter_by(slug=post_slug).first()
+    post = Posts.query.options(defer(Posts.content)).filter_by(slug=post_slug).first()
     if post:
-        return render_template('post_slug.html', params=params, post=post)
+        return render_template('post_slug.html', params=params, post=post, related=related.for_post(post.sno))
     else:
         flash("Post not found!", "danger")
-        return redirect(url_for("home"))
+        return redirect(url_for("blog.home"))
 
-@app.route("/delete/<int:sno>", methods=['POST'])
+@blog.route("/delete/<int:sno>", methods=['POST'])
+@login_required
 def delete(sno):
-    if 'user' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for("login"))
-
-    user = User.query.filter_by(email=session['user']).first()
-    if not user:
-        flash("User not found!", "danger")
-        return redirect(url_for("login"))
+    user = g.user
 
     post = Posts.query.filter_by(sno=sno).first()
     if not post:
         flash("Post not found!", "warning")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("blog.dashboard"))
 
     if post.user_id != user.id:  # Ensure only author can delete
         flash("You are not authorized to delete this post!", "danger")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("blog.dashboard"))
 
     try:
+        deleted = dict(sno=post.sno, slug=post.slug, user_id=post.user_id, img_file=post.img_file)
         db.session.delete(post)
+        adjust_post_count(post.user_id, -1)
+        adjust_image_refs({post.img_file: -1})
         db.session.commit()
+        forget_counts("posts:")
+        post_deleted.send(current_app._get_current_object(), **deleted)
         flash("Post deleted successfully!", "danger")
     except Exception as e:
         db.session.rollback()
         flash(f"Error deleting post: {str(e)}", "danger")
 
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("blog.dashboard"))
 
-@app.route("/contact", methods=['GET', 'POST'])
+@blog.route("/contact", methods=['GET', 'POST'])
 def contact():
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
@@ -260,23 +342,22 @@ def contact():
 
         if not name or not email or not message:
             flash("Name, email, and message are required fields!", "danger")
-            return redirect(url_for("contact"))
+            return redirect(url_for("blog.contact"))
 
         if not re.match(email_regex, email):
             flash("Invalid email format!", "danger")
-            return redirect(url_for("contact"))
+            return redirect(url_for("blog.contact"))
 
         if phone and not re.match(phone_regex, phone):
             flash("Invalid phone number! Must be 10 digits.", "danger")
-            return redirect(url_for("contact"))
+            return redirect(url_for("blog.contact"))
 
         try:
             new_contact = Contacts(name=name, email=email, ph_no=phone, msg=message, date=date)
             db.session.add(new_contact)
-            db.session.commit()
 
-            # Send email to admin
-            admin_email = app.config['MAIL_USERNAME']
+            # Queue email to admin in the same transaction; the outbox worker sends it
+            admin_email = current_app.config['MAIL_USERNAME']
             subject = f"New Contact Form Submission from {name}"
             body = f"""
             Name: {name}
@@ -286,35 +367,37 @@ def contact():
             Date: {date}
             """
 
-            msg = Message(subject, sender=email, recipients=[admin_email])
-            msg.body = body
-            mail.send(msg)
+            if admin_email:
+                enqueue(subject, sender=email, recipients=[admin_email], body=body)
+            else:
+                # The message is still stored in contacts
+                current_app.logger.warning("MAIL_USERNAME is not set; contact mail from %s not queued", email)
+            db.session.commit()
 
             flash("Your message has been sent successfully!", "success")
-            return redirect(url_for("contact"))
+            return redirect(url_for("blog.contact"))
 
         except Exception as e:
             db.session.rollback()
             flash("Something went wrong! Please try again later.", "danger")
-            app.logger.error(f"Contact form submission error: {str(e)}")
+            current_app.logger.error(f"Contact form submission error: {str(e)}")
 
     return render_template('contact.html', params=params)
 
-@app.route('/logout')
+@blog.route('/logout')
 def logout():
-    if 'user' not in session:
+    if g.user is None:
         flash("You are not logged in.", "warning")
-        return redirect(url_for("home"))
+        return redirect(url_for("blog.home"))
 
-    session.pop('user', None)
-    session.clear()
+    logout_user()
     flash("You have been logged out.", "info")
-    return redirect(url_for("home"))
+    return redirect(url_for("blog.home"))
 
-@app.route('/register', methods=['POST', 'GET'])
+@blog.route('/register', methods=['POST', 'GET'])
 def register():
-    if 'user' in session:
-        return redirect(url_for("dashboard"))
+    if g.user is not None:
+        return redirect(url_for("blog.dashboard"))
 
     if request.method == 'POST':
         name, email, password = request.form['name'], request.form['email'], request.form['password']
@@ -322,63 +405,96 @@ def register():
         # Name validation: Only letters and spaces allowed
         if not re.match(r"^[A-Za-z\s]+$", name):
             flash("Name must contain only letters and spaces.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("blog.register"))
 
         # Email validation: Must be in a valid email format
         if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
             flash("Invalid email format.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("blog.register"))
 
         # Password validation: At least 8 characters, 1 number, 1 uppercase letter
         if len(password) < 8 or not re.search(r'\d', password) or not re.search(r'[A-Z]', password):
             flash("Password must be at least 8 characters long and include at least one number and one uppercase letter.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("blog.register"))
 
         # Check if the email is already registered
         if User.query.filter_by(email=email).first():
             flash("Email already registered.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("blog.register"))
 
         # Save user to the database with hashed password
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = hasher.hash(password)
+        except HasherBusy as e:
+            flash("We're handling a lot of requests right now, please try again in a moment.", "warning")
+            return render_template('register.html', params=params), 503, {'Retry-After': str(e.retry_after)}
         new_user = User(name=name, email=email, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
 
         flash('User registered successfully!', 'success')
-        return redirect(url_for("login"))
+        return redirect(url_for("blog.login"))
 
     return render_template('register.html',params=params)
 
-@app.route('/login',methods=['GET','POST'])
+@blog.route('/login',methods=['GET','POST'])
 def login():
-    if 'user' in session:
-        return redirect(url_for("dashboard"))
+    if g.user is not None:
+        return redirect(url_for("blog.dashboard"))
     if request.method == 'POST':
         email, password = request.form['email'], request.form['password']
         user = User.query.filter_by(email=email).first()
-        if user and bcrypt.check_password_hash(user.password, password):
-            session['user'] = user.email
+        try:
+            valid = user is not None and hasher.verify(user.password, password)
+        except HasherBusy as e:
+            flash("Too many login attempts right now, please try again in a moment.", "warning")
+            return render_template('login.html', params=params), 503, {'Retry-After': str(e.retry_after)}
+        if valid:
+            if hasher.needs_rehash(user.password):
+                # Upgrade the stored hash to the configured work factor
+                try:
+                    user.password = hasher.hash(password)
+                    db.session.commit()
+                except HasherBusy:
+                    pass
+            login_user(user)
             flash("Login successful!", "success")
-            return redirect(url_for("dashboard"))
+            return redirect(url_for("blog.dashboard"))
         flash("Invalid email or password!", "danger")
     return render_template('login.html', params=params)
 
-@app.route("/search",methods = ['GET','POST'])
+@blog.route("/search",methods = ['GET','POST'])
+@read_replica
 def search():
-    posts = Posts.query.all()
     if request.method == 'POST':
-        query = request.form.get('search')
-
+        query = request.form.get('search', '')
         if not query.strip():
             flash("Please enter a search term!", "warning")
-            return redirect(url_for("dashboard"))
-
-        results = Posts.query.filter(Posts.title.ilike(f"%{query}%")).all()
-        return render_template('dashboard.html', results=results, query=query, params=params, posts=posts)
+            return redirect(url_for("blog.dashboard"))
+    else:
+        query = request.args.get('q', '')
+        if not query.strip():
+            return render_template('dashboard.html', params=params, posts=[], query=query)
 
-    return render_template('dashboard.html',params=params,posts=posts)
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = 10
+    results, result_page = post_search.search(query, page=page, per_page=per_page,
+                                              options=post_list_options(current_app.config['POST_AUTHOR_LOADING']))
+    prev_url = url_for("blog.search", q=query, page=page - 1) if result_page.has_prev else None
+    next_url = url_for("blog.search", q=query, page=page + 1) if result_page.has_next else None
+    return render_template('dashboard.html', results=results, query=query, params=params, posts=results, prev=prev_url, next=next_url)
+
+@blog.route("/search/suggest", methods=['GET'])
+@read_replica
+def search_suggest():
+    '''Title/slug completions as JSON, from the in-memory prefix index (no query per keystroke).'''
+    query = request.args.get('q', '')
+    cap = current_app.config['SUGGEST_LIMIT']
+    limit = max(1, min(request.args.get('limit', cap, type=int), cap))
+    suggestions = [{'title': title, 'slug': slug, 'url': url_for('blog.post_route', post_slug=slug)}
+                   for _, title, slug in suggest.suggest(query, limit=limit)]
+    return jsonify(query=query, suggestions=suggestions)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
 
@@ -0,0 +1,65 @@
+"""Add stored excerpt to Posts and backfill it from content
+
+Revision ID: 3b8e6f21c4d7
+Revises: e41f0c7d9a25
+Create Date: 2026-10-18 10:41:05.902736
+
+"""
+import html
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3b8e6f21c4d7'
+down_revision = 'e41f0c7d9a25'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+EXCERPT_LENGTH = 100
+_TAG_RE = re.compile(r'<[^>]+>')
+
+posts = sa.table(
+    'posts',
+    sa.column('sno', sa.Integer),
+    sa.column('content', sa.Text),
+    sa.column('excerpt', sa.String),
+)
+
+
+def _excerpt(content):
+    # Same rules as models.make_excerpt at the time of this revision
+    text = html.unescape(_TAG_RE.sub(' ', content or ''))
+    return ' '.join(text.split())[:EXCERPT_LENGTH]
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('excerpt', sa.String(length=EXCERPT_LENGTH), nullable=True))
+
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_sno = 0
+        while True:
+            rows = conn.execute(
+                sa.select(posts.c.sno, posts.c.content)
+                .where(posts.c.sno > last_sno)
+                .order_by(posts.c.sno)
+                .limit(BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            conn.execute(
+                posts.update()
+                .where(posts.c.sno == sa.bindparam('b_sno'))
+                .values(excerpt=sa.bindparam('b_excerpt')),
+                [{'b_sno': sno, 'b_excerpt': _excerpt(content)} for sno, content in rows],
+            )
+            last_sno = rows[-1][0]
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('excerpt')
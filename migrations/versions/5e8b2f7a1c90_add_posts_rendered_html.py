@@ -0,0 +1,31 @@
+"""Add rendered HTML, table of contents and reading time to Posts
+
+Revision ID: 5e8b2f7a1c90
+Revises: 9d1a7c3e5f28
+Create Date: 2026-10-18 19:02:37.514210
+
+Existing rows are left NULL (post pages fall back to the raw content) until
+`flask posts render` fills them in batches with the app's rendering pipeline.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5e8b2f7a1c90'
+down_revision = '9d1a7c3e5f28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('toc_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('reading_time', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('reading_time')
+        batch_op.drop_column('toc_html')
+        batch_op.drop_column('content_html')
@@ -0,0 +1,77 @@
+"""Add indexed published_at DATETIME to Posts and backfill it from the date string
+
+Revision ID: 7c2d41b9e0a3
+Revises: a3f5e5e8782f
+Create Date: 2026-10-18 09:12:41.318205
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7c2d41b9e0a3'
+down_revision = 'a3f5e5e8782f'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+DATE_FORMAT = "%d-%m-%Y %I:%M %p"
+
+posts = sa.table(
+    'posts',
+    sa.column('sno', sa.Integer),
+    sa.column('date', sa.String),
+    sa.column('published_at', sa.DateTime),
+)
+
+
+def _parse(value):
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade():
+    # 1. Add the column as nullable so the ALTER is cheap and does not rewrite rows.
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('published_at', sa.DateTime(), nullable=True))
+
+    # 2. Backfill in short sno-range batches, committing each one, so no single
+    #    transaction holds row locks on the whole table.
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_sno = 0
+        while True:
+            rows = conn.execute(
+                sa.select(posts.c.sno, posts.c.date)
+                .where(posts.c.sno > last_sno, posts.c.published_at.is_(None))
+                .order_by(posts.c.sno)
+                .limit(BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            updates = [{'b_sno': sno, 'b_published_at': _parse(date) or datetime(1970, 1, 1)}
+                       for sno, date in rows]
+            conn.execute(
+                posts.update()
+                .where(posts.c.sno == sa.bindparam('b_sno'))
+                .values(published_at=sa.bindparam('b_published_at')),
+                updates,
+            )
+            last_sno = rows[-1][0]
+
+    # 3. Tighten the column and build the indexes once the data is in place.
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.alter_column('published_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_posts_published_at', ['published_at'], unique=False)
+        batch_op.create_index('ix_posts_user_id_published_at', ['user_id', 'published_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_posts_user_id_published_at')
+        batch_op.drop_index('ix_posts_published_at')
+        batch_op.drop_column('published_at')
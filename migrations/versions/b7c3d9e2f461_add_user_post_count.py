@@ -0,0 +1,32 @@
+"""Add denormalized post_count to User and backfill it
+
+Revision ID: b7c3d9e2f461
+Revises: 5e8b2f7a1c90
+Create Date: 2026-10-18 19:31:12.640875
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b7c3d9e2f461'
+down_revision = '5e8b2f7a1c90'
+branch_labels = None
+depends_on = None
+
+user = sa.table('user', sa.column('id', sa.Integer), sa.column('post_count', sa.Integer))
+posts = sa.table('posts', sa.column('sno', sa.Integer), sa.column('user_id', sa.Integer))
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # posts.user_id is already indexed (ix_posts_user_id_published_at), so this is one index scan per user
+    op.execute(user.update().values(post_count=(
+        sa.select(sa.func.count(posts.c.sno)).where(posts.c.user_id == user.c.id).scalar_subquery())))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('post_count')
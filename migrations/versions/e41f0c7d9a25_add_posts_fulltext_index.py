@@ -0,0 +1,32 @@
+"""Add full-text index over Posts title and content
+
+Revision ID: e41f0c7d9a25
+Revises: 7c2d41b9e0a3
+Create Date: 2026-10-18 10:03:27.540118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e41f0c7d9a25'
+down_revision = '7c2d41b9e0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        op.execute("CREATE FULLTEXT INDEX ft_posts_title_content ON posts(title, content)")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, tokenize='unicode61')")
+        op.execute("INSERT INTO posts_fts(rowid, title, content) SELECT sno, title, content FROM posts")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        op.drop_index('ft_posts_title_content', table_name='posts')
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS posts_fts")
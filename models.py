@@ -1,6 +1,21 @@
+import html
+import re
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, joinedload, selectinload, validates
+from rendering import render_post
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+EXCERPT_LENGTH = 100
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    '''Plain-text preview of a post body for list pages.'''
+    text = html.unescape(_TAG_RE.sub(' ', content or ''))
+    return ' '.join(text.split())[:length]
 
 class Contacts(db.Model):
     '''sno name email ph_no msg date'''
@@ -11,22 +26,223 @@ class Contacts(db.Model):
     msg = db.Column(db.Text, nullable=False)
     date = db.Column(db.String(12), nullable = True)
 
+class Outbox(db.Model):
+    '''id subject sender recipients body status attempts next_attempt_at last_error created_at'''
+    __table_args__ = (
+        db.Index('ix_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(100), nullable=False)
+    recipients = db.Column(db.Text, nullable=False) # comma separated
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending') # pending, sent or dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
 class Posts(db.Model):
-    '''sno title slug content date'''
+    '''sno title slug content content_html toc_html reading_time excerpt date published_at'''
+    __table_args__ = (
+        db.Index('ix_posts_published_at', 'published_at'),
+        db.Index('ix_posts_user_id_published_at', 'user_id', 'published_at'),
+    )
+
     sno = db.Column(db.Integer,primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
     slug = db.Column(db.String(50), unique=True, nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    date = db.Column(db.String(50), nullable=False)
+    content = db.Column(db.Text, nullable=False) # as written: Markdown or HTML
+    content_html = db.Column(db.Text, nullable=True) # sanitized, rendered when content is set
+    toc_html = db.Column(db.Text, nullable=True) # None for posts with fewer than two headings
+    reading_time = db.Column(db.Integer, nullable=True) # minutes
+    excerpt = db.Column(db.String(EXCERPT_LENGTH), nullable=True) # kept in sync with content
+    date = db.Column(db.String(50), nullable=False) # display string, sort on published_at
+    published_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
     img_file = db.Column(db.String(255), nullable=True)
 
     author = db.relationship('User', backref='posts', lazy=True)  # Define backref only once
 
+    @validates('content')
+    def _render(self, key, value):
+        # Rendering happens once per write, so views only emit stored HTML
+        self.content_html, self.toc_html, self.reading_time = render_post(value)
+        self.excerpt = make_excerpt(self.content_html)
+        return value
+
+
+def posts_version():
+    '''(row count, max sno, max published_at) of posts. Adds, deletes and
+    edits (which re-stamp published_at) all change it, so a per-process
+    index can tell that another worker wrote with one cheap query.'''
+    return tuple(db.session.execute(
+        db.select(db.func.count(Posts.sno), db.func.max(Posts.sno), db.func.max(Posts.published_at))).one())
+
+
+class PostsSync:
+    '''How far a per-process copy of the posts table (a search or suggest index)
+    has read, so it can catch up on other workers' writes by reading only the
+    posts added or re-stamped since, instead of the whole table.'''
+
+    def __init__(self):
+        self.version = None
+        self.max_sno = 0
+        self.last_seen = None
+
+    def start(self):
+        '''Stamp a full read. Taken before reading, so a write during it is read again later.'''
+        self.version = posts_version()
+        self.max_sno, self.last_seen = 0, None
+
+    def seen(self, sno, published_at):
+        self.max_sno = max(self.max_sno, sno)
+        if published_at is not None and (self.last_seen is None or published_at > self.last_seen):
+            self.last_seen = published_at
+
+    def changes(self, columns, known):
+        '''None when posts_version() is unchanged, else (rows, removed): rows of
+        (sno, published_at, *columns) for posts added or edited since the last
+        read, and the snos of `known()` that were deleted. Deletes are looked
+        for only when the row count says there were some, with one scan of the
+        snos at or above the lowest known one.'''
+        version = posts_version()
+        if version == self.version:
+            return None
+        changed = Posts.sno > self.max_sno
+        if self.last_seen is not None:
+            changed = db.or_(changed, Posts.published_at > self.last_seen)
+        rows = db.session.execute(db.select(Posts.sno, Posts.published_at, *columns).where(changed)).all()
+        added = sum(1 for row in rows if row[0] > self.max_sno)
+        removed = []
+        if self.version is not None and version[0] != self.version[0] + added:
+            indexed = set(known()) | {row[0] for row in rows}
+            if indexed:
+                live = set(db.session.execute(
+                    db.select(Posts.sno).where(Posts.sno >= min(indexed))).scalars())
+                removed = sorted(indexed - live)
+                missing = sorted(live - indexed)
+                if missing:
+                    rows += db.session.execute(
+                        db.select(Posts.sno, Posts.published_at, *columns).where(Posts.sno.in_(missing))).all()
+        for row in rows:
+            self.seen(row[0], row[1])
+        self.version = version
+        return rows, removed
+
+
+class PostViews(db.Model):
+    '''post_sno views updated_at; written in batches by analytics.Analytics'''
+    __table_args__ = (
+        db.Index('ix_post_views_views', 'views'),
+    )
+
+    post_sno = db.Column(db.Integer, db.ForeignKey('posts.sno', ondelete='CASCADE'), primary_key=True,
+                         autoincrement=False)
+    views = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+
+class RelatedPosts(db.Model):
+    '''post_sno rank related_sno score; top-k neighbours written by related.Related'''
+    __table_args__ = (
+        db.Index('ix_related_posts_related_sno', 'related_sno'),
+    )
+
+    post_sno = db.Column(db.Integer, db.ForeignKey('posts.sno', ondelete='CASCADE'), primary_key=True,
+                         autoincrement=False)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    related_sno = db.Column(db.Integer, db.ForeignKey('posts.sno', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class ImageRefs(db.Model):
+    '''filename refs updated_at; how many posts use each stored upload, see images.py'''
+    filename = db.Column(db.String(255), primary_key=True)
+    refs = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
 
 class User(db.Model):
-    '''id name email password'''
+    '''id name email password post_count'''
     id = db.Column(db.Integer,primary_key=True)
     name = db.Column(db.String(50),nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password = db.Column(db.String(255), nullable=False)
+    # Denormalized; see adjust_post_count() and `flask posts recount`
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+def adjust_post_count(user_id, delta):
+    '''Add `delta` to a user's post_count inside the caller's transaction.'''
+    db.session.execute(db.update(User).where(User.id == user_id)
+                       .values(post_count=User.post_count + delta)
+                       .execution_options(synchronize_session=False))
+
+
+def _upsert_add_each(table, key, rows, add):
+    '''upsert_add() for dialects without an upsert: an UPDATE per row, then an
+    INSERT in a savepoint when no row matched. A concurrent INSERT of the same
+    key fails that savepoint, and the row is applied by a second UPDATE.'''
+    for row in rows:
+        values = {name: table.c[name] + row[name] if name in add else row[name] for name in row if name != key}
+        update = table.update().where(table.c[key] == row[key]).values(**values)
+        if db.session.execute(update).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(**row))
+        except IntegrityError:
+            if not db.session.execute(update).rowcount:
+                raise
+
+
+def upsert_add(table, key, rows, add):
+    '''Insert `rows` into `table`; on a duplicate `key` add the `add` columns to
+    the stored values and overwrite the rest. One executemany on dialects with
+    an upsert, a statement or two per row on any other.'''
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        new = stmt.excluded
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        new = stmt.inserted
+    else:
+        return _upsert_add_each(table, key, rows, add)
+    values = {name: table.c[name] + new[name] if name in add else new[name] for name in rows[0] if name != key}
+    if dialect in ('mysql', 'mariadb'):
+        stmt = stmt.on_duplicate_key_update(**values)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c[key]], set_=values)
+    db.session.execute(stmt, rows)
+
+
+def adjust_image_refs(deltas):
+    '''Add {filename: delta} to the image reference counts inside the caller's transaction.'''
+    now = datetime.now()
+    rows = [{'filename': name, 'refs': delta, 'updated_at': now} for name, delta in deltas.items() if name and delta]
+    if rows:
+        upsert_add(ImageRefs.__table__, 'filename', rows, {'refs'})
+
+
+# Loader strategies for Posts.author on list pages, see post_list_options()
+AUTHOR_LOADERS = {
+    'joined': lambda: [joinedload(Posts.author)],
+    'selectin': lambda: [selectinload(Posts.author)],
+    'lazy': lambda: [],
+}
+
+def post_list_options(strategy='joined'):
+    '''Query options for listings: load post.author up front and skip the
+    body columns, which list pages replace with post.excerpt.'''
+    if strategy not in AUTHOR_LOADERS:
+        raise ValueError(f"Unknown author loading strategy: {strategy!r}")
+    return [defer(Posts.content), defer(Posts.content_html), defer(Posts.toc_html),
+            *AUTHOR_LOADERS[strategy]()]
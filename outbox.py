@@ -0,0 +1,192 @@
+import random
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_mail import Message
+
+from instrumentation import timed
+from models import db, Outbox
+
+
+def enqueue(subject, sender, recipients, body):
+    '''Queue a mail in the caller's transaction; the worker sends it later.'''
+    row = Outbox(subject=subject, sender=sender, recipients=','.join(recipients), body=body)
+    db.session.add(row)
+    return row
+
+
+def _backoff(attempts):
+    base = current_app.config['OUTBOX_BACKOFF_BASE']
+    delay = min(base * 2 ** (attempts - 1), current_app.config['OUTBOX_BACKOFF_MAX'])
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _mark_failed(row, error):
+    row.attempts += 1
+    row.last_error = str(error)[:2000]
+    if row.attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+        row.status = 'dead'
+        current_app.logger.error(f"Outbox mail {row.id} dead-lettered after {row.attempts} attempts: {error}")
+    else:
+        row.next_attempt_at = datetime.now() + _backoff(row.attempts)
+
+
+def due(limit):
+    '''(id, next_attempt_at) of up to `limit` pending mails that are due, oldest first.'''
+    return db.session.execute(
+        db.select(Outbox.id, Outbox.next_attempt_at)
+        .where(Outbox.status == 'pending', Outbox.next_attempt_at <= datetime.now())
+        .order_by(Outbox.id)
+        .limit(limit)).all()
+
+
+def claim(candidates):
+    '''Lease mails to this worker for OUTBOX_CLAIM_SECONDS; returns the ids it got.
+
+    Each claim is a compare-and-set on next_attempt_at, so of two workers that
+    read the same row only one claims it, on every database (SQLite has no
+    SKIP LOCKED). A worker that dies mid-batch leaves its rows pending, and
+    they are retried once the lease runs out.
+    '''
+    lease = datetime.now() + timedelta(seconds=current_app.config['OUTBOX_CLAIM_SECONDS'])
+    claimed = []
+    for row_id, next_attempt_at in candidates:
+        result = db.session.execute(
+            db.update(Outbox)
+            .where(Outbox.id == row_id, Outbox.status == 'pending', Outbox.next_attempt_at == next_attempt_at)
+            .values(next_attempt_at=lease)
+            .execution_options(synchronize_session=False))
+        if result.rowcount == 1:
+            claimed.append(row_id)
+    db.session.commit()
+    return claimed
+
+
+def send_batch(limit=None):
+    '''Send up to `limit` due mails over one SMTP connection. Returns the number handled.'''
+    limit = limit or current_app.config['OUTBOX_BATCH_SIZE']
+    claimed = claim(due(limit))
+    if not claimed:
+        return 0
+    rows = Outbox.query.filter(Outbox.id.in_(claimed)).order_by(Outbox.id).all()
+
+    mail = current_app.extensions['mail']
+    try:
+        with timed('smtp'), mail.connect() as conn:
+            for row in rows:
+                msg = Message(row.subject, sender=row.sender, recipients=row.recipients.split(','))
+                msg.body = row.body
+                try:
+                    conn.send(msg)
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except (smtplib.SMTPException, ValueError) as e:
+                    _mark_failed(row, e)
+                else:
+                    row.status = 'sent'
+                    row.last_error = None
+    except (OSError, smtplib.SMTPException) as e:
+        # Could not connect, or the connection dropped: retry whatever is unsent
+        for row in rows:
+            if row.status == 'pending':
+                _mark_failed(row, e)
+    db.session.commit()
+    return len(rows)
+
+
+def run_worker(app, stop_event=None):
+    '''Poll the outbox until `stop_event` is set.'''
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                handled = send_batch()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Outbox worker error: {str(e)}")
+                handled = 0
+        if not handled:
+            stop_event.wait(app.config['OUTBOX_POLL_INTERVAL'])
+
+
+class OutboxWorker:
+    '''Sends queued mail from background threads inside the web process.
+
+    The threads start with the first request, not in create_app(), so a
+    pre-forking server's master and CLI commands never run them.
+    '''
+
+    def __init__(self, app, threads=1):
+        self.app = app
+        self.count = threads
+        self.stop_event = threading.Event()
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self.threads:
+                self.threads = [threading.Thread(target=run_worker, args=(self.app, self.stop_event),
+                                                 name=f'outbox-worker-{i}', daemon=True)
+                                for i in range(self.count)]
+                for thread in self.threads:
+                    thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+def init_outbox(app):
+    app.config.setdefault('OUTBOX_WORKER', 'cli') # "thread" sends from inside the web process
+    app.config.setdefault('OUTBOX_THREADS', 1)
+    app.config.setdefault('OUTBOX_BATCH_SIZE', 50)
+    app.config.setdefault('OUTBOX_POLL_INTERVAL', 5)
+    app.config.setdefault('OUTBOX_MAX_ATTEMPTS', 8)
+    app.config.setdefault('OUTBOX_BACKOFF_BASE', 30)
+    app.config.setdefault('OUTBOX_BACKOFF_MAX', 3600)
+    app.config.setdefault('OUTBOX_CLAIM_SECONDS', 300)
+    app.cli.add_command(outbox_cli)
+    if not app.config.get('MAIL_USERNAME'):
+        app.logger.warning("MAIL_USERNAME (GMAIL_USER) is not set: contact messages are stored but not mailed")
+    if app.config['OUTBOX_WORKER'] == 'thread':
+        worker = app.extensions['outbox_worker'] = OutboxWorker(app, app.config['OUTBOX_THREADS'])
+
+        def start_worker():
+            if not worker.threads:
+                worker.start()
+        app.before_request(start_worker)
+
+
+outbox_cli = AppGroup('outbox', help='Queued mail commands.')
+
+
+@outbox_cli.command('send')
+def send_command():
+    '''Send one batch of due mail and exit.'''
+    click.echo(f"Handled {send_batch()} queued mail(s).")
+
+
+@outbox_cli.command('work')
+def work_command():
+    '''Keep sending queued mail until interrupted.'''
+    click.echo("Outbox worker started, press Ctrl+C to stop.")
+    try:
+        run_worker(current_app._get_current_object())
+    except KeyboardInterrupt:
+        pass
+
+
+@outbox_cli.command('retry-dead')
+def retry_dead_command():
+    '''Move dead-lettered mail back to the queue.'''
+    count = (Outbox.query.filter_by(status='dead')
+             .update({'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.now()}))
+    db.session.commit()
+    click.echo(f"Requeued {count} mail(s).")
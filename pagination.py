@@ -0,0 +1,153 @@
+import base64
+import binascii
+import json
+import time
+from datetime import datetime
+from threading import Lock
+
+from flask import request, url_for
+from sqlalchemy import DateTime, and_, or_
+
+# Approximate row counts for the opt-in numbered pager: key -> (expires_at, count)
+_count_cache = {}
+_count_lock = Lock()
+COUNT_TTL = 60
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(date, sno):
+    if isinstance(date, datetime):
+        date = date.isoformat()
+    raw = json.dumps([date, sno], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        date, sno = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(token) from e
+    if not isinstance(sno, int) or not isinstance(date, str):
+        raise InvalidCursor(token)
+    return date, sno
+
+
+def _cursor_value(date_col, value):
+    if isinstance(date_col.type, DateTime):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError as e:
+            raise InvalidCursor(value) from e
+    return value
+
+
+def cached_count(key, query, ttl=COUNT_TTL):
+    '''Return query.count(), reusing the last value for up to `ttl` seconds.'''
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    total = query.order_by(None).count()
+    with _count_lock:
+        _count_cache[key] = (now + ttl, total)
+    return total
+
+
+def forget_counts(prefix=''):
+    with _count_lock:
+        for key in [k for k in _count_cache if k.startswith(prefix)]:
+            del _count_cache[key]
+
+
+class KeysetPage:
+    '''One page of a (date DESC, sno DESC) keyset walk.'''
+
+    def __init__(self, items, has_prev, has_next, date_attr='published_at'):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.date_attr = date_attr
+
+    @property
+    def prev_cursor(self):
+        if not (self.has_prev and self.items):
+            return None
+        first = self.items[0]
+        return encode_cursor(getattr(first, self.date_attr), first.sno)
+
+    @property
+    def next_cursor(self):
+        if not (self.has_next and self.items):
+            return None
+        last = self.items[-1]
+        return encode_cursor(getattr(last, self.date_attr), last.sno)
+
+
+def keyset_query(query, date_col, sno_col, per_page, after=None, before=None):
+    '''Apply the seek filter, order and limit for one page to a Query or a select().'''
+    if before:
+        date, sno = decode_cursor(before)
+        date = _cursor_value(date_col, date)
+        return (query.filter(or_(date_col > date, and_(date_col == date, sno_col > sno)))
+                .order_by(date_col.asc(), sno_col.asc())
+                .limit(per_page + 1))
+
+    if after:
+        date, sno = decode_cursor(after)
+        date = _cursor_value(date_col, date)
+        query = query.filter(or_(date_col < date, and_(date_col == date, sno_col < sno)))
+    return query.order_by(date_col.desc(), sno_col.desc()).limit(per_page + 1)
+
+
+def keyset_page(rows, date_col, per_page, after=None, before=None):
+    '''Turn the rows fetched by keyset_query() into a KeysetPage.'''
+    if before:
+        has_prev = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], has_prev=has_prev, has_next=True, date_attr=date_col.key)
+    has_next = len(rows) > per_page
+    return KeysetPage(rows[:per_page], has_prev=after is not None, has_next=has_next, date_attr=date_col.key)
+
+
+def keyset_paginate(query, date_col, sno_col, per_page, after=None, before=None):
+    '''Seek pagination: newest first, no OFFSET and no COUNT(*).'''
+    rows = keyset_query(query, date_col, sno_col, per_page, after=after, before=before).all()
+    return keyset_page(rows, date_col, per_page, after=after, before=before)
+
+
+def cursor_urls(page, endpoint, **url_args):
+    '''(prev_url, next_url) for a KeysetPage.'''
+    prev_url = url_for(endpoint, before=page.prev_cursor, **url_args) if page.prev_cursor else None
+    next_url = url_for(endpoint, after=page.next_cursor, **url_args) if page.next_cursor else None
+    return prev_url, next_url
+
+
+def paginate_posts(query, date_col, sno_col, per_page, endpoint, count_key=None, total=None, **url_args):
+    '''Paginate a posts listing for `endpoint`.
+
+    Cursor mode (`?after=` / `?before=`) is the default. Passing `?page=N`
+    opts into numbered pages backed by an approximate cached count.
+    Returns (items, prev_url, next_url, pagination) where `pagination` is the
+    numbered pager or None in cursor mode. The pager's total is `total` when
+    the caller already knows it, else a cached count under `count_key`.
+    '''
+    if 'page' in request.args:
+        page = max(1, request.args.get('page', 1, type=int))
+        ordered = query.order_by(date_col.desc(), sno_col.desc())
+        pagination = ordered.paginate(page=page, per_page=per_page, error_out=False, count=False)
+        pagination.total = total if total is not None else cached_count(count_key, query)
+        prev_url = url_for(endpoint, page=pagination.prev_num, **url_args) if pagination.has_prev else None
+        next_url = url_for(endpoint, page=pagination.next_num, **url_args) if pagination.has_next else None
+        return pagination.items, prev_url, next_url, pagination
+
+    try:
+        page = keyset_paginate(query, date_col, sno_col, per_page,
+                               after=request.args.get('after'), before=request.args.get('before'))
+    except InvalidCursor:
+        page = keyset_paginate(query, date_col, sno_col, per_page)
+    prev_url, next_url = cursor_urls(page, endpoint, **url_args)
+    return page.items, prev_url, next_url, None
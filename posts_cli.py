@@ -0,0 +1,297 @@
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from images import store_stream
+from models import db, Posts, User, adjust_image_refs, adjust_post_count, make_excerpt
+from pagination import forget_counts
+from rendering import render_post
+from signals import posts_imported, posts_rendered
+
+DATE_FORMAT = "%d-%m-%Y %I:%M %p"
+SLUG_LENGTH = Posts.slug.type.length
+TITLE_LENGTH = Posts.title.type.length
+
+posts_cli = AppGroup('posts', help='Bulk post import and export.')
+
+
+def parse_front_matter(text):
+    '''Split a Markdown file into ({key: value}, body). Front matter is
+    `key: value` lines between two `---` lines.'''
+    lines = text.splitlines()
+    if not lines or lines[0].strip() != '---':
+        return {}, text
+    meta = {}
+    for i, line in enumerate(lines[1:], start=1):
+        if line.strip() == '---':
+            return meta, '\n'.join(lines[i + 1:]).lstrip('\n')
+        key, sep, value = line.partition(':')
+        if sep:
+            meta[key.strip().lower()] = value.strip().strip('"\'')
+    return {}, text
+
+
+def read_records(source):
+    '''Yield (record, base_dir) from a JSONL file or a directory of .md files.'''
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.endswith(('.md', '.markdown')):
+                continue
+            with open(os.path.join(source, name), encoding='utf-8') as f:
+                meta, body = parse_front_matter(f.read())
+            meta.setdefault('slug', os.path.splitext(name)[0])
+            meta['content'] = body
+            yield meta, source
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding='utf-8') as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield json.loads(line), base
+                    except ValueError as e:
+                        raise click.ClickException(f"{source}:{number}: invalid JSON ({e})")
+
+
+def parse_published(record):
+    value = record.get('published_at') or record.get('date')
+    if not value:
+        return datetime.now()
+    for parse in (datetime.fromisoformat, lambda v: datetime.strptime(v, DATE_FORMAT)):
+        try:
+            return parse(value).replace(tzinfo=None)
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date {value!r}")
+
+
+def copy_image(image, base, folder):
+    '''Store an image under its content-hashed name; returns (name, newly_written).
+    Names that already exist in the upload folder are kept as they are.'''
+    path = image if os.path.isabs(image) else os.path.join(base, image)
+    if not os.path.isfile(path):
+        if os.path.isfile(os.path.join(folder, os.path.basename(image))):
+            return os.path.basename(image), False
+        raise FileNotFoundError(path)
+    with open(path, 'rb') as f:
+        return store_stream(f, image, folder)
+
+
+def validate_batch(batch, seen):
+    '''Drop records with missing fields or duplicate slugs; one query per batch.'''
+    errors, valid = [], []
+    for record, base in batch:
+        slug = (record.get('slug') or '').strip()
+        if not (record.get('title') and slug and record.get('content')):
+            errors.append(f"{slug or '<no slug>'}: title, slug and content are required")
+        elif len(slug) > SLUG_LENGTH or len(record['title']) > TITLE_LENGTH:
+            errors.append(f"{slug}: slug or title too long")
+        elif slug in seen:
+            errors.append(f"{slug}: duplicate slug in import")
+        else:
+            seen.add(slug)
+            record['slug'] = slug
+            valid.append((record, base))
+    if valid:
+        taken = set(db.session.execute(
+            db.select(Posts.slug).where(Posts.slug.in_([r['slug'] for r, _ in valid]))).scalars())
+        errors += [f"{r['slug']}: slug already exists" for r, _ in valid if r['slug'] in taken]
+        valid = [(r, base) for r, base in valid if r['slug'] not in taken]
+    return valid, errors
+
+
+def build_rows(valid, authors, default_author, images_dir, copier):
+    '''Posts rows for a validated batch, copying images on the thread pool.'''
+    folder = current_app.config['UPLOAD_FOLDER']
+    futures = {}
+    for record, base in valid:
+        if record.get('image'):
+            futures[record['slug']] = copier.submit(copy_image, record['image'], images_dir or base, folder)
+
+    rows, errors, written = [], [], []
+    for record, base in valid:
+        slug = record['slug']
+        try:
+            published = parse_published(record)
+            email = record.get('author') or default_author
+            if email not in authors:
+                raise ValueError(f"unknown author {email!r}")
+            img_file = None
+            if slug in futures:
+                img_file, new = futures[slug].result()
+                if new:
+                    written.append(img_file)
+        except (ValueError, OSError) as e:
+            errors.append(f"{slug}: {e}")
+            continue
+        rendered = render_post(record['content'])
+        rows.append({
+            'user_id': authors[email],
+            'title': record['title'],
+            'slug': slug,
+            'content': record['content'],
+            'content_html': rendered.content_html,
+            'toc_html': rendered.toc_html,
+            'reading_time': rendered.reading_time,
+            'excerpt': make_excerpt(rendered.content_html),
+            'date': published.strftime(DATE_FORMAT),
+            'published_at': published,
+            'img_file': img_file,
+        })
+    return rows, errors, written
+
+
+@posts_cli.command('import')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--author', 'default_author', help='Email of the author for records without an "author" field.')
+@click.option('--images', 'images_dir', type=click.Path(exists=True, file_okay=False),
+              help='Resolve relative image paths here (default: next to the source).')
+@click.option('--batch', default=1000, show_default=True, help='Rows per INSERT transaction.')
+@click.option('--workers', default=8, show_default=True, help='Parallel image copies.')
+@click.option('--dry-run', is_flag=True, help='Validate only; write nothing.')
+def import_command(source, default_author, images_dir, batch, workers, dry_run):
+    '''Import posts from a JSONL file or a directory of Markdown files.
+
+    Each record needs title, slug and content, and may set published_at
+    (ISO 8601 or the blog's display format), image (a file path) and
+    author (a user's email). Markdown files keep these in front matter;
+    the slug defaults to the file name.
+    '''
+    authors = dict(db.session.execute(db.select(User.email, User.id)).all())
+    if default_author and default_author not in authors:
+        raise click.ClickException(f"No user with email {default_author!r}.")
+
+    pipeline = current_app.extensions['image_pipeline']
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    seen, imported, problems, snos = set(), 0, [], []
+
+    def flush(pending):
+        nonlocal imported
+        valid, errors = validate_batch(pending, seen)
+        problems.extend(errors)
+        if dry_run:
+            imported += len(valid)
+            return
+        rows, errors, written = build_rows(valid, authors, default_author, images_dir, copier)
+        problems.extend(errors)
+        if rows:
+            db.session.execute(db.insert(Posts), rows)
+            for user_id, count in Counter(r['user_id'] for r in rows).items():
+                adjust_post_count(user_id, count)
+            adjust_image_refs(Counter(r['img_file'] for r in rows))
+            snos.extend(db.session.execute(
+                db.select(Posts.sno).where(Posts.slug.in_([r['slug'] for r in rows]))).scalars())
+            db.session.commit()
+            imported += len(rows)
+        for name in written:
+            pipeline.process(os.path.join(folder, name))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') as copier:
+        pending = []
+        for item in read_records(source):
+            pending.append(item)
+            if len(pending) >= batch:
+                flush(pending)
+                pending = []
+        if pending:
+            flush(pending)
+
+    for problem in problems:
+        click.echo(f"skipped {problem}", err=True)
+    if dry_run:
+        click.echo(f"{imported} post(s) would be imported, {len(problems)} skipped.")
+        return
+    if imported:
+        forget_counts("posts:")
+        posts_imported.send(current_app._get_current_object(), snos=snos)
+    click.echo(f"Imported {imported} post(s), skipped {len(problems)}.")
+
+
+@posts_cli.command('render')
+@click.option('--all', 'render_all', is_flag=True, help='Re-render every post, not only unrendered ones.')
+@click.option('--batch', default=500, show_default=True, help='Posts per UPDATE transaction.')
+def render_command(render_all, batch):
+    '''Store rendered HTML, table of contents and reading time for existing posts.
+
+    Run once after `flask db upgrade`, and with --all after changing the
+    rendering pipeline (rendering.py or the Markdown package).
+    '''
+    stmt = db.select(Posts.sno, Posts.slug, Posts.content).order_by(Posts.sno).limit(batch)
+    if not render_all:
+        stmt = stmt.where(Posts.content_html.is_(None))
+    last_sno, snos, slugs = 0, [], []
+    while True:
+        rows = db.session.execute(stmt.where(Posts.sno > last_sno)).all()
+        if not rows:
+            break
+        updates = []
+        for sno, slug, content in rows:
+            rendered = render_post(content)
+            updates.append({'sno': sno, 'content_html': rendered.content_html, 'toc_html': rendered.toc_html,
+                            'reading_time': rendered.reading_time, 'excerpt': make_excerpt(rendered.content_html)})
+        db.session.execute(db.update(Posts), updates)
+        db.session.commit()
+        snos.extend(sno for sno, _, _ in rows)
+        slugs.extend(slug for _, slug, _ in rows)
+        last_sno = rows[-1].sno
+    if snos:
+        posts_rendered.send(current_app._get_current_object(), snos=snos, slugs=slugs)
+    click.echo(f"Rendered {len(snos)} post(s).")
+
+
+@posts_cli.command('recount')
+@click.option('--dry-run', is_flag=True, help='Report drift only; write nothing.')
+def recount_command(dry_run):
+    '''Repair User.post_count where it has drifted from the posts table.
+
+    The counters are kept in the same transaction as every post insert and
+    delete; this fixes rows changed outside the app (manual SQL, restores).
+    '''
+    actual = (db.select(db.func.count(Posts.sno)).where(Posts.user_id == User.id)
+              .correlate(User).scalar_subquery())
+    drifted = db.session.execute(
+        db.select(User.id, User.email, User.post_count, actual).where(User.post_count != actual)).all()
+    for _, email, stored, count in drifted:
+        click.echo(f"{email}: stored {stored}, actual {count}")
+    if drifted and not dry_run:
+        db.session.execute(db.update(User).where(User.id.in_([row.id for row in drifted]))
+                           .values(post_count=actual).execution_options(synchronize_session=False))
+        db.session.commit()
+    verb = "would be repaired" if dry_run else "repaired"
+    click.echo(f"{len(drifted)} counter(s) {verb}.")
+
+
+@posts_cli.command('export')
+@click.argument('output', default='-', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--batch', default=1000, show_default=True, help='Rows fetched per round trip.')
+def export_command(output, batch):
+    '''Write every post as JSONL (to stdout by default), in `import` format.
+
+    Rows are streamed from a server-side cursor, so memory use does not
+    grow with the size of the table.
+    '''
+    stmt = (db.select(Posts.title, Posts.slug, Posts.content, Posts.published_at, Posts.img_file, User.email)
+            .join(User, User.id == Posts.user_id, isouter=True)
+            .order_by(Posts.sno)
+            .execution_options(stream_results=True, yield_per=batch))
+    out = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+    count = 0
+    try:
+        for title, slug, content, published_at, img_file, email in db.session.execute(stmt):
+            record = {'title': title, 'slug': slug, 'content': content,
+                      'published_at': published_at.isoformat() if published_at else None,
+                      'image': img_file, 'author': email}
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    click.echo(f"Exported {count} post(s).", err=True)
@@ -0,0 +1,479 @@
+import copy
+import html
+import importlib.util
+import math
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from models import db, Posts, RelatedPosts
+from search import TITLE_WEIGHT, tokenize
+from signals import post_saved, post_deleted, posts_imported
+
+# NumPy and SciPy are optional and slow to import: only the build and the
+# background refresh load them; post pages just read related_posts
+HAVE_SCIPY = all(importlib.util.find_spec(name) is not None for name in ('numpy', 'scipy'))
+# POSIX only; without it refreshes from different processes are not serialised
+HAVE_FCNTL = importlib.util.find_spec('fcntl') is not None
+
+MODEL_NAME = 'tfidf.npz'
+CHANGES_NAME = 'tfidf-changes.npz'
+LOCK_NAME = 'tfidf.lock'
+MIN_DF = 2          # a term in one post cannot relate it to anything
+MAX_DF = 0.5        # terms in over half the posts are noise
+MIN_TOKEN_LENGTH = 3
+BLOCK_ROWS = 512    # posts per sparse similarity product during a full build
+COMPACT_ROWS = 1000     # changed rows kept beside the base model before it is rewritten,
+COMPACT_FRACTION = 0.1  # or this fraction of the base rows, whichever is larger
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def post_terms(title, content):
+    text = html.unescape(_TAG_RE.sub(' ', content or ''))
+    terms = [t for t in tokenize(text) if len(t) >= MIN_TOKEN_LENGTH and not t.isdigit()]
+    title_terms = [t for t in tokenize(title) if len(t) >= MIN_TOKEN_LENGTH and not t.isdigit()]
+    return Counter(terms + title_terms * TITLE_WEIGHT)
+
+
+def related_statement(sno):
+    '''(slug, title) of a post's neighbours, best first: one primary-key range scan.'''
+    return (db.select(Posts.slug, Posts.title)
+            .join(RelatedPosts, RelatedPosts.related_sno == Posts.sno)
+            .where(RelatedPosts.post_sno == sno)
+            .order_by(RelatedPosts.rank))
+
+
+class TfidfModel:
+    '''L2-normalised TF-IDF rows (scipy CSR), one per post, over a fixed vocabulary.
+
+    The vocabulary and IDF weights are fixed at the last full build, so an
+    incremental refresh only re-vectorises the posts that changed; words that
+    first appear later count once `flask related build` runs again.
+
+    `matrix` and `snos` are the base rows of the last build or compaction and
+    are never modified. Rows vectorised since then are appended to a small
+    `tail`, and the rows they replace or delete are masked as `dead`, so an
+    edit costs O(changes) until compacted() folds them back into the base.
+    '''
+
+    def __init__(self, terms, idf, matrix, snos, generation=None):
+        from scipy import sparse
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.matrix = matrix
+        self.snos = list(snos)
+        self.index = {sno: i for i, sno in enumerate(self.snos)}
+        self.generation = generation or uuid.uuid4().hex
+        self.tail = sparse.csr_matrix((0, len(terms)))
+        self.tail_snos = []
+        self.dead = frozenset()   # logical rows (base or tail) that no longer hold a post
+        self.moved = {}           # sno -> its tail row, or None once deleted
+
+    @classmethod
+    def build(cls, rows):
+        '''Fit on (sno, title, content) rows.'''
+        import numpy as np
+        snos, counts = [], []
+        for sno, title, content in rows:
+            snos.append(sno)
+            counts.append(post_terms(title, content))
+        df = Counter(term for c in counts for term in c)
+        n = len(counts)
+        terms = sorted(term for term, k in df.items() if MIN_DF <= k <= max(MIN_DF, MAX_DF * n))
+        idf = np.array([math.log((1 + n) / (1 + df[term])) + 1 for term in terms], dtype=np.float64)
+        model = cls(terms, idf, None, snos)
+        model.matrix = model.vectorize(counts)
+        return model
+
+    def vectorize(self, counts):
+        from scipy import sparse
+        import numpy as np
+        data, indices, indptr = [], [], [0]
+        for c in counts:
+            row = sorted((self.vocab[term], tf) for term, tf in c.items() if term in self.vocab)
+            weights = np.array([(1 + math.log(tf)) * self.idf[i] for i, tf in row], dtype=np.float64)
+            norm = np.linalg.norm(weights)
+            indices.extend(i for i, _ in row)
+            data.extend(weights / norm if norm else weights)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(counts), len(self.terms)), dtype=np.float64)
+
+    def row_of(self, sno):
+        '''The logical row holding `sno`, or None when the post is not in the model.'''
+        if sno in self.moved:
+            return self.moved[sno]
+        return self.index.get(sno)
+
+    def sno_array(self):
+        '''sno per logical row (base rows, then tail rows); -1 for dead rows.'''
+        import numpy as np
+        snos = np.array(self.snos + self.tail_snos, dtype=np.int64)
+        snos[list(self.dead)] = -1
+        return snos
+
+    def _take(self, rows):
+        from scipy import sparse
+        import numpy as np
+        rows = np.asarray(rows, dtype=np.int64)
+        in_tail = rows >= len(self.snos)
+        if not in_tail.any():
+            return self.matrix[rows]
+        stacked = sparse.vstack([self.matrix[rows[~in_tail]], self.tail[rows[in_tail] - len(self.snos)]],
+                                format='csr')
+        return stacked[np.argsort(np.concatenate([np.nonzero(~in_tail)[0], np.nonzero(in_tail)[0]]))]
+
+    def _against_all(self, block):
+        '''Similarities of `block` with every logical row, dead ones included.'''
+        from scipy import sparse
+        sims = block @ self.matrix.T
+        if self.tail_snos:
+            sims = sparse.hstack([sims, block @ self.tail.T])
+        return sims.tocsr()
+
+    def neighbours(self, rows, k):
+        '''For each row index, the top-k [(sno, score)] by cosine similarity, itself excluded.'''
+        import numpy as np
+        result = {}
+        snos = self.sno_array()
+        alive = snos >= 0
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            sims = self._against_all(self._take(block))
+            for offset, row in enumerate(block):
+                lo, hi = sims.indptr[offset], sims.indptr[offset + 1]
+                cols, vals = sims.indices[lo:hi], sims.data[lo:hi]
+                keep = (cols != row) & (vals > 0) & alive[cols]
+                cols, vals = cols[keep], vals[keep]
+                if len(vals) > k:
+                    # Keep every tie with the k-th score so the lowest sno wins them, as in a full sort
+                    kth = -np.partition(-vals, k - 1)[k - 1]
+                    top = vals >= kth
+                    cols, vals = cols[top], vals[top]
+                order = np.lexsort((snos[cols], -vals))[:k]
+                result[row] = [(int(snos[cols[i]]), float(vals[i])) for i in order]
+        return result
+
+    def best_scores(self, rows):
+        '''(logical rows, scores): every live row sharing a term with one of `rows`
+        and its highest similarity with any of them. The products stay sparse.'''
+        import numpy as np
+        cols, vals = [], []
+        for start in range(0, len(rows), BLOCK_ROWS):
+            best = self._against_all(self._take(rows[start:start + BLOCK_ROWS])).max(axis=0).tocoo()
+            cols.append(best.col)
+            vals.append(best.data)
+        cols, vals = np.concatenate(cols).astype(np.int64), np.concatenate(vals)
+        # One entry per row: its highest score over all blocks
+        order = np.lexsort((-vals, cols))
+        cols, vals = cols[order], vals[order]
+        first = np.ones(len(cols), dtype=bool)
+        first[1:] = cols[1:] != cols[:-1]
+        keep = first & (vals > 0)
+        if self.dead:
+            keep &= ~np.isin(cols, list(self.dead))
+        return cols[keep], vals[keep]
+
+    def with_rows(self, vectors):
+        '''A new model with rows replaced, added or removed: {sno: 1 x V csr row}; None removes
+        the post. Shares the base rows with this one, which is left unchanged.'''
+        from scipy import sparse
+        model = copy.copy(self)
+        model.moved = dict(self.moved)
+        model.tail_snos = list(self.tail_snos)
+        dead, parts = set(self.dead), [self.tail]
+        for sno, vector in vectors.items():
+            row = self.row_of(sno)
+            if row is not None:
+                dead.add(row)
+            if vector is None:
+                model.moved[sno] = None
+            else:
+                model.moved[sno] = len(self.snos) + len(model.tail_snos)
+                model.tail_snos.append(sno)
+                parts.append(vector)
+        model.dead = frozenset(dead)
+        model.tail = sparse.vstack(parts, format='csr')
+        return model
+
+    def needs_compaction(self):
+        return len(self.dead) + len(self.tail_snos) > max(COMPACT_ROWS, COMPACT_FRACTION * len(self.snos))
+
+    def compacted(self):
+        '''The same posts as new base rows, ordered by sno, with an empty tail.'''
+        from scipy import sparse
+        snos = self.sno_array()
+        live = sorted((int(sno), row) for row, sno in enumerate(snos) if sno >= 0)
+        matrix = self._take([row for _, row in live]) if live else sparse.csr_matrix((0, len(self.terms)))
+        return TfidfModel(self.terms, self.idf, matrix.tocsr(), [sno for sno, _ in live])
+
+    def save(self, path):
+        '''Write the base rows; rows changed since go to save_changes().'''
+        import numpy as np
+        _savez(path, terms=np.array(self.terms, dtype=str), idf=self.idf, snos=np.array(self.snos),
+               data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+               shape=np.array(self.matrix.shape), generation=np.array(self.generation))
+
+    def save_changes(self, path):
+        '''Write the tail and dead rows, stamped with the base they apply to.'''
+        import numpy as np
+        _savez(path, snos=np.array(self.tail_snos, dtype=np.int64), dead=np.array(sorted(self.dead), dtype=np.int64),
+               data=self.tail.data, indices=self.tail.indices, indptr=self.tail.indptr,
+               shape=np.array(self.tail.shape), generation=np.array(self.generation))
+
+    @classmethod
+    def load(cls, path, changes_path=None):
+        from scipy import sparse
+        import numpy as np
+        with np.load(path, allow_pickle=False) as f:
+            matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            model = cls(f['terms'].tolist(), f['idf'], matrix, f['snos'].tolist(), str(f['generation']))
+        if changes_path is None or not os.path.exists(changes_path):
+            return model
+        with np.load(changes_path, allow_pickle=False) as f:
+            if str(f['generation']) != model.generation:
+                return model  # left over from before the last compaction
+            model.tail = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            model.tail_snos = f['snos'].tolist()
+            model.dead = frozenset(f['dead'].tolist())
+        snos = model.snos + model.tail_snos
+        model.moved = {snos[row]: None for row in model.dead}
+        model.moved.update((sno, len(model.snos) + i) for i, sno in enumerate(model.tail_snos)
+                           if len(model.snos) + i not in model.dead)
+        return model
+
+
+def _savez(path, **arrays):
+    import numpy as np
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tfidf.', suffix='.npz')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+class Related:
+    '''"Read next" links: each post's RELATED_K most similar posts, in related_posts.
+
+    `flask related build` fits the TF-IDF model over every post, rewrites the
+    table and saves the model under RELATED_DIR. After that, add, edit,
+    delete and import refresh on a background thread: only the changed
+    posts are re-vectorised, only the lists they enter or leave are
+    rewritten, and only the changed rows are saved, next to the model.
+    Builds and refreshes hold a lock file in RELATED_DIR, so workers sharing
+    it apply theirs one at a time. post_route reads a post's list with one
+    indexed query.
+    '''
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._model = None
+        self._model_mtime = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RELATED_K', 5)
+        app.config.setdefault('RELATED_MAX_CANDIDATES', 1000)
+        app.config.setdefault('RELATED_DIR', os.path.join(app.instance_path, 'related'))
+        app.extensions['related'] = self
+        app.cli.add_command(related_cli)
+        post_saved.connect(self._on_saved, app)
+        post_deleted.connect(self._on_deleted, app)
+        posts_imported.connect(self._on_imported, app)
+
+    @staticmethod
+    def model_path(app=None, name=MODEL_NAME):
+        directory = (app or current_app).config['RELATED_DIR']
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def for_post(self, sno):
+        return db.session.execute(related_statement(sno)).all()
+
+    def _corpus(self, snos=None):
+        stmt = db.select(Posts.sno, Posts.title, Posts.content).order_by(Posts.sno)
+        if snos is not None:
+            stmt = stmt.where(Posts.sno.in_(snos))
+        return db.session.execute(stmt).all()
+
+    def _floors(self, snos):
+        '''{sno: (list length, lowest score)} for the lists of `snos` that have entries.'''
+        floors = {}
+        for start in range(0, len(snos), 500):
+            floors.update((sno, (count, low)) for sno, count, low in db.session.execute(
+                db.select(RelatedPosts.post_sno, db.func.count(), db.func.min(RelatedPosts.score))
+                .where(RelatedPosts.post_sno.in_(snos[start:start + 500]))
+                .group_by(RelatedPosts.post_sno)))
+        return floors
+
+    def _write(self, neighbours, post_snos):
+        '''Replace the lists of `post_snos` with `neighbours` ({sno: [(related_sno, score)]}).'''
+        post_snos = list(post_snos)
+        for start in range(0, len(post_snos), 500):
+            db.session.execute(db.delete(RelatedPosts).where(RelatedPosts.post_sno.in_(post_snos[start:start + 500])))
+        rows = [{'post_sno': sno, 'rank': rank, 'related_sno': related_sno, 'score': score}
+                for sno, items in neighbours.items() for rank, (related_sno, score) in enumerate(items)]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(db.insert(RelatedPosts), rows[start:start + 5000])
+        db.session.commit()
+
+    def _stamp(self):
+        # Every save replaces the file, so the inode changes even within one mtime tick
+        stamp = []
+        for path in (self.model_path(), self.model_path(name=CHANGES_NAME)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+            else:
+                stamp.append((st.st_ino, st.st_mtime_ns))
+        return tuple(stamp)
+
+    @contextmanager
+    def _locked(self):
+        '''Hold an exclusive lock on RELATED_DIR, so two processes never both
+        load the model, change it and save it over each other's changes.'''
+        with open(self.model_path(name=LOCK_NAME), 'a') as f:
+            if HAVE_FCNTL:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
+
+    def load_model(self):
+        '''The saved model, reloaded when another process has written a newer one.'''
+        path = self.model_path()
+        if not os.path.exists(path):
+            return None
+        stamp = self._stamp()
+        if self._model is None or stamp != self._model_mtime:
+            self._model = TfidfModel.load(path, self.model_path(name=CHANGES_NAME))
+            self._model_mtime = stamp
+        return self._model
+
+    def _save(self, model, base):
+        '''Write `model` (its base rows too when `base`), then make it the current one.'''
+        if base:
+            model.save(self.model_path())
+            try:
+                os.remove(self.model_path(name=CHANGES_NAME))
+            except FileNotFoundError:
+                pass
+        else:
+            model.save_changes(self.model_path(name=CHANGES_NAME))
+        self._model, self._model_mtime = model, self._stamp()
+
+    def build(self):
+        '''Fit on every post and rewrite the whole table. Returns the number of posts.'''
+        with self._locked():
+            model = TfidfModel.build(self._corpus())
+            rows = list(range(len(model.snos)))
+            neighbours = model.neighbours(rows, current_app.config['RELATED_K'])
+            db.session.execute(db.delete(RelatedPosts))
+            self._write({model.snos[row]: items for row, items in neighbours.items()}, [])
+            self._save(model, base=True)
+        return len(rows)
+
+    def refresh(self, snos):
+        '''Re-vectorise `snos` (added, edited or deleted) and rewrite every list
+        that changes as a result. Returns the snos whose lists were rewritten.
+
+        The current model is only replaced once the new one is saved, so a
+        failed refresh leaves memory and disk as they were.
+        '''
+        with self._locked():
+            return self._refresh(snos)
+
+    def _refresh(self, snos):
+        import numpy as np
+        current = self.load_model()
+        if current is None:
+            return set()
+        k = current_app.config['RELATED_K']
+        found = self._corpus(snos)
+        vectors = dict.fromkeys(snos)
+        if found:
+            rows = current.vectorize([post_terms(title, content) for _, title, content in found])
+            vectors.update((sno, rows[i]) for i, (sno, _, _) in enumerate(found))
+        model = current.with_rows(vectors)
+        compact = model.needs_compaction()
+        if compact:
+            model = model.compacted()
+        present = [sno for sno, vector in vectors.items() if vector is not None]
+
+        # Lists that contained a changed post, since its score moved or it is gone
+        affected = set(present) | set(db.session.execute(
+            db.select(RelatedPosts.post_sno).where(RelatedPosts.related_sno.in_(snos))).scalars())
+        if present:
+            # Lists a changed post may now enter: it reaches their k-th score, or they are short.
+            # Only the best-scoring RELATED_MAX_CANDIDATES are looked at; a list passed
+            # over here still gets the post at the next `flask related build`.
+            rows, scores = model.best_scores([model.row_of(sno) for sno in present])
+            limit = current_app.config['RELATED_MAX_CANDIDATES']
+            if len(scores) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                rows, scores = rows[top], scores[top]
+            candidates = [int(sno) for sno in model.sno_array()[rows]]
+            floors = self._floors(candidates)
+            for sno, score in zip(candidates, scores):
+                count, low = floors.get(sno, (0, 0.0))
+                if count < k or score >= low:
+                    affected.add(sno)
+
+        live = [sno for sno in affected if model.row_of(sno) is not None]
+        neighbours = model.neighbours([model.row_of(sno) for sno in live], k)
+        all_snos = model.sno_array()
+        self._save(model, base=compact)
+        self._write({int(all_snos[row]): items for row, items in neighbours.items()},
+                    affected | set(snos))
+        return affected
+
+    def _submit(self, app, snos):
+        if not HAVE_SCIPY or not os.path.exists(self.model_path(app)):
+            return  # nothing to refresh before the first `flask related build`
+        if self._executor is None:
+            # One thread, so refreshes in this process never interleave
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related')
+        self._executor.submit(self._refresh_logged, app, list(snos))
+
+    def _refresh_logged(self, app, snos):
+        with app.app_context():
+            try:
+                affected = self.refresh(snos)
+                slugs = db.session.execute(db.select(Posts.slug).where(Posts.sno.in_(affected))).scalars().all()
+                page_cache = app.extensions.get('page_cache')
+                if page_cache is not None and slugs:
+                    page_cache.invalidate(*(f'post:{slug}' for slug in slugs))
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Related posts refresh failed for posts {snos}: {str(e)}")
+
+    def _on_saved(self, app, post, **extra):
+        self._submit(app, [post.sno])
+
+    def _on_deleted(self, app, sno, **extra):
+        self._submit(app, [sno])
+
+    def _on_imported(self, app, snos, **extra):
+        self._submit(app, snos)
+
+
+related_cli = AppGroup('related', help='Related posts commands.')
+
+
+@related_cli.command('build')
+def build_command():
+    '''Recompute every post's related posts from scratch.'''
+    if not HAVE_SCIPY:
+        raise click.ClickException("Related posts need numpy and scipy installed.")
+    started = time.perf_counter()
+    count = current_app.extensions['related'].build()
+    click.echo(f"Related posts for {count} post(s) in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,166 @@
+import html
+import importlib.util
+import math
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+# Python-Markdown is optional: without it post bodies are treated as HTML, as
+# they always have been, and still go through the sanitizer
+HAVE_MARKDOWN = importlib.util.find_spec('markdown') is not None
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+WORDS_PER_MINUTE = 200
+TOC_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3}
+TOC_MIN_HEADINGS = 2
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'dd', 'del', 'div', 'dl', 'dt', 'em',
+    'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'kbd',
+    'li', 'ol', 'p', 'pre', 's', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td',
+    'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRS = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'code': {'class'},  # language-xxx from fenced code blocks
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'align', 'colspan', 'rowspan'},
+    'th': {'align', 'colspan', 'rowspan'},
+}
+URL_ATTRS = {'href', 'src'}
+URL_SCHEMES = {'', 'http', 'https', 'mailto'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Dropped together with everything inside them
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea'}
+
+_HTML_TAG_RE = re.compile(r'<[a-zA-Z/!]')
+_CONTROL_RE = re.compile(r'[\x00-\x20]+')
+_ANCHOR_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+Rendered = namedtuple('Rendered', 'content_html toc_html reading_time')
+
+
+def safe_url(value):
+    scheme = urlsplit(_CONTROL_RE.sub('', value)).scheme.lower()
+    return scheme in URL_SCHEMES
+
+
+class Sanitizer(HTMLParser):
+    '''Allowlist HTML sanitizer that also numbers headings for the TOC and counts words.'''
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open = []
+        self.headings = []  # (level, anchor, text)
+        self.words = 0
+        self._dropping = 0
+        self._heading = None  # (tag, index into out, text parts)
+        self._anchors = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+            return
+        if self._dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRS.get(tag, ())
+        kept = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRS and not safe_url(value):
+                continue
+            kept.append(f' {name}="{html.escape(value, quote=True)}"')
+        if tag in TOC_LEVELS and self._heading is None:
+            # The anchor comes from the heading text, so fill the tag in at the end tag
+            self._heading = (tag, len(self.out), [])
+            self.out.append(None)
+        else:
+            self.out.append(f'<{tag}{"".join(kept)}>')
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open and self.open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping = max(0, self._dropping - 1)
+            return
+        if self._dropping or tag not in self.open:
+            return
+        while self.open:
+            current = self.open.pop()
+            self._close(current)
+            if current == tag:
+                break
+
+    def _close(self, tag):
+        if self._heading is not None and self._heading[0] == tag:
+            _, index, parts = self._heading
+            text = ' '.join(''.join(parts).split())
+            anchor = self._anchor(text)
+            self.out[index] = f'<{tag} id="{anchor}">'
+            self.headings.append((TOC_LEVELS[tag], anchor, text))
+            self._heading = None
+        self.out.append(f'</{tag}>')
+
+    def _anchor(self, text):
+        base = _ANCHOR_RE.sub('-', text.lower()).strip('-') or 'section'
+        anchor, n = base, 1
+        while anchor in self._anchors:
+            n += 1
+            anchor = f'{base}-{n}'
+        self._anchors.add(anchor)
+        return anchor
+
+    def handle_data(self, data):
+        if self._dropping:
+            return
+        self.words += len(data.split())
+        if self._heading is not None:
+            self._heading[2].append(data)
+        self.out.append(html.escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self.open:
+            self._close(self.open.pop())
+
+    def html(self):
+        return ''.join(self.out)
+
+
+def to_html(text):
+    '''Markdown (raw HTML passes through) when available, else the body as HTML;
+    plain text without any tags becomes paragraphs.'''
+    if HAVE_MARKDOWN:
+        import markdown
+        return markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+    if _HTML_TAG_RE.search(text):
+        return text
+    paragraphs = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+    return '\n'.join(f'<p>{html.escape(p)}</p>' for p in paragraphs)
+
+
+def toc_html(headings):
+    if len(headings) < TOC_MIN_HEADINGS:
+        return None
+    top = min(level for level, _, _ in headings)
+    items = ''.join(f'<li class="toc-level-{level - top + 1}"><a href="#{anchor}">{html.escape(text)}</a></li>'
+                    for level, anchor, text in headings)
+    return f'<ul class="toc">{items}</ul>'
+
+
+def render_post(content):
+    '''Render a post body once, on write: (content_html, toc_html, reading_time).'''
+    sanitizer = Sanitizer()
+    sanitizer.feed(to_html(content or ''))
+    sanitizer.close()
+    reading_time = max(1, math.ceil(sanitizer.words / WORDS_PER_MINUTE))
+    return Rendered(sanitizer.html(), toc_html(sanitizer.headings), reading_time)
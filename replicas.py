@@ -0,0 +1,73 @@
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_PREFIX = 'replica_'
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_recycle', 'pool_pre_ping', 'pool_timeout')
+
+
+def engine_options(settings):
+    '''SQLAlchemy engine options from {name: value}, skipping unset values.'''
+    return {name: settings[name] for name in POOL_OPTIONS if settings.get(name) is not None}
+
+
+def replica_binds(urls, options):
+    '''SQLALCHEMY_BINDS entries for each replica URL, with the primary's pool options.'''
+    return {f'{REPLICA_PREFIX}{i}': {'url': url, **options} for i, url in enumerate(urls)}
+
+
+class RoutingSession(Session):
+    '''Sends reads to a replica inside @read_replica views, everything else to the primary.
+
+    Flushes always go to the primary, so an accidental write in a read-only
+    view still lands in the right place. One replica is picked per request so
+    a page is rendered from a single consistent snapshot.
+    '''
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('_read_replica'):
+            engine = self._replica()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica(self):
+        key = g.get('_replica_key')
+        if key is None:
+            keys = [k for k in self._db.engines if isinstance(k, str) and k.startswith(REPLICA_PREFIX)]
+            if not keys:
+                g._read_replica = False
+                return None
+            key = g._replica_key = random.choice(keys)
+        return self._db.engines[key]
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_write(session_, flush_context):
+    if has_request_context():
+        g._db_wrote = True
+
+
+def _stick_to_primary(response):
+    '''After a request that wrote, keep this client on the primary for REPLICA_STICKY_SECONDS.'''
+    if g.get('_db_wrote'):
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def read_replica(view):
+    '''Serve a read-only view from a replica unless this client wrote recently.'''
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._read_replica = session.get('primary_until', 0) < time.time()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_replicas(app):
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+    app.after_request(_stick_to_primary)
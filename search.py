@@ -0,0 +1,377 @@
+import math
+import re
+import time
+from collections import defaultdict
+from threading import Lock
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, text
+
+from models import db, Posts, PostsSync
+from signals import post_saved, post_deleted, posts_imported
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TITLE_WEIGHT = 3
+
+
+def tokenize(value):
+    return [t.lower() for t in TOKEN_RE.findall(value or '')]
+
+
+class SearchPage:
+    '''Post ids for one page of ranked results.'''
+
+    def __init__(self, snos, page, per_page, has_next):
+        self.snos = snos
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = page > 1
+
+
+def page_from_rows(snos, page, per_page):
+    return SearchPage(snos[:per_page], page, per_page, len(snos) > per_page)
+
+
+def run_statement(statement, page, per_page):
+    if statement is None:
+        return SearchPage([], page, per_page, False)
+    return page_from_rows(db.session.execute(*statement).scalars().all(), page, per_page)
+
+
+def in_rank_order(posts, snos):
+    order = {sno: i for i, sno in enumerate(snos)}
+    return sorted(posts, key=lambda p: order[p.sno])
+
+
+class SqliteFTS5Backend:
+    '''Standalone FTS5 table keyed by posts.sno, kept in sync on every write.
+
+    `flask create-db` and the migration create the table. Its DDL and writes
+    always go to the primary, also when a @read_replica view is the first to
+    touch it.
+    '''
+    name = 'fts5'
+
+    def __init__(self):
+        self._ready = False
+
+    @staticmethod
+    def available(engine):
+        if engine.dialect.name != 'sqlite':
+            return False
+        with engine.connect() as conn:
+            options = conn.exec_driver_sql("PRAGMA compile_options").scalars().all()
+        return 'ENABLE_FTS5' in options
+
+    @staticmethod
+    def _on_primary(sql, params=None):
+        return db.session.execute(text(sql), params, bind_arguments={'bind': db.engine})
+
+    def _ensure(self):
+        if self._ready:
+            return
+        exists = self._on_primary("SELECT 1 FROM sqlite_master WHERE type='table' AND name='posts_fts'").first()
+        if not exists:
+            self.rebuild()
+        self._ready = True
+
+    def rebuild(self, commit=True):
+        self._on_primary(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, tokenize='unicode61')")
+        self._on_primary("DELETE FROM posts_fts")
+        self._on_primary("INSERT INTO posts_fts(rowid, title, content) SELECT sno, title, content FROM posts")
+        if commit:
+            db.session.commit()
+        self._ready = True
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def statement(self, query, page, per_page):
+        '''(SQL, params) selecting one page of snos plus one look-ahead row; None for no terms.'''
+        terms = tokenize(query)
+        if not terms:
+            return None
+        # Quote every term so user input can never be parsed as FTS syntax
+        match = ' '.join('"%s"' % t.replace('"', '""') for t in terms)
+        return (text("SELECT rowid FROM posts_fts WHERE posts_fts MATCH :match "
+                     "ORDER BY bm25(posts_fts, :title_weight, 1.0) LIMIT :limit OFFSET :offset"),
+                {'match': match, 'title_weight': float(TITLE_WEIGHT),
+                 'limit': per_page + 1, 'offset': (page - 1) * per_page})
+
+    def search(self, query, page, per_page):
+        self._ensure()
+        return run_statement(self.statement(query, page, per_page), page, per_page)
+
+    def index(self, sno, title, content):
+        self._ensure()
+        self._on_primary("DELETE FROM posts_fts WHERE rowid = :sno", {'sno': sno})
+        self._on_primary("INSERT INTO posts_fts(rowid, title, content) VALUES (:sno, :title, :content)",
+                         {'sno': sno, 'title': title, 'content': content})
+        db.session.commit()
+
+    def remove(self, sno):
+        self._ensure()
+        self._on_primary("DELETE FROM posts_fts WHERE rowid = :sno", {'sno': sno})
+        db.session.commit()
+
+
+class MySQLFulltextBackend:
+    '''InnoDB FULLTEXT index on (title, content); MySQL maintains it on write.'''
+    name = 'mysql'
+
+    @staticmethod
+    def available(engine):
+        return engine.dialect.name in ('mysql', 'mariadb')
+
+    def rebuild(self, commit=True):
+        exists = db.session.execute(text(
+            "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+            "AND table_name = 'posts' AND index_name = 'ft_posts_title_content'")).first()
+        if not exists:
+            db.session.execute(text("CREATE FULLTEXT INDEX ft_posts_title_content ON posts(title, content)"))
+
+    ready = True
+
+    def statement(self, query, page, per_page):
+        if not tokenize(query):
+            return None
+        return (text("SELECT sno FROM posts WHERE MATCH(title, content) AGAINST (:q IN NATURAL LANGUAGE MODE) "
+                     "ORDER BY MATCH(title, content) AGAINST (:q IN NATURAL LANGUAGE MODE) DESC, sno DESC "
+                     "LIMIT :limit OFFSET :offset"),
+                {'q': query, 'limit': per_page + 1, 'offset': (page - 1) * per_page})
+
+    def search(self, query, page, per_page):
+        return run_statement(self.statement(query, page, per_page), page, per_page)
+
+    def index(self, sno, title, content):
+        pass
+
+    def remove(self, sno):
+        pass
+
+
+def _index_document(postings, doc_terms, sno, title, content):
+    weights = defaultdict(int)
+    for token in tokenize(title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(content):
+        weights[token] += 1
+    for token, weight in weights.items():
+        postings[token][sno] = weight
+    doc_terms[sno] = set(weights)
+
+
+class InvertedIndexBackend:
+    '''In-process fallback: token -> {sno: weighted term frequency}.
+
+    Built per worker by streaming (sno, title, content) in batches and kept
+    current from the write signals. Writes handled by other workers only
+    reach this process through posts_version(): checked at most every
+    SEARCH_CHECK_INTERVAL seconds, a changed stamp reads just the posts
+    added, edited or deleted since (models.PostsSync). A full build, on first
+    use or rebuild(), fills new tables and swaps them in, so searches keep
+    using the old index meanwhile.
+    '''
+    name = 'memory'
+    BATCH = 500
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._built = False
+        self._sync = PostsSync()
+        self._checked = 0.0
+        self._lock = Lock()        # guards the postings
+        self._sync_lock = Lock()   # one build or catch-up at a time
+
+    @staticmethod
+    def available(engine):
+        return True
+
+    def _add(self, sno, title, content):
+        _index_document(self._postings, self._doc_terms, sno, title, content)
+
+    def _discard(self, sno):
+        for token in self._doc_terms.pop(sno, ()):
+            docs = self._postings.get(token)
+            if docs is not None:
+                docs.pop(sno, None)
+                if not docs:
+                    del self._postings[token]
+
+    def _build(self):
+        sync = PostsSync()
+        sync.start()
+        postings, doc_terms = defaultdict(dict), {}
+        stmt = (select(Posts.sno, Posts.published_at, Posts.title, Posts.content)
+                .execution_options(yield_per=self.BATCH))
+        for sno, published_at, title, content in db.session.execute(stmt):
+            _index_document(postings, doc_terms, sno, title, content)
+            sync.seen(sno, published_at)
+        with self._lock:
+            self._postings, self._doc_terms = postings, doc_terms
+        self._sync = sync
+        self._built = True
+        self._checked = time.monotonic()
+
+    def _catch_up(self):
+        def known():
+            with self._lock:
+                return list(self._doc_terms)
+        changes = self._sync.changes((Posts.title, Posts.content), known)
+        if changes is None:
+            return
+        rows, removed = changes
+        with self._lock:
+            for sno in removed:
+                self._discard(sno)
+            for sno, _, title, content in rows:
+                self._discard(sno)
+                self._add(sno, title, content)
+
+    def _ensure(self):
+        if not self._built:
+            with self._sync_lock:
+                if not self._built:
+                    self._build()
+            return
+        now = time.monotonic()
+        if now - self._checked < current_app.config['SEARCH_CHECK_INTERVAL']:
+            return
+        # Another thread is catching up: serve the index as it is
+        if self._sync_lock.acquire(blocking=False):
+            try:
+                self._checked = now
+                self._catch_up()
+            finally:
+                self._sync_lock.release()
+
+    def rebuild(self, commit=True):
+        with self._sync_lock:
+            self._build()
+
+    def search(self, query, page, per_page):
+        self._ensure()
+        terms = set(tokenize(query))
+        with self._lock:
+            postings = [self._postings.get(t, {}) for t in terms]
+            if not postings or not all(postings):
+                return SearchPage([], page, per_page, False)
+            n_docs = len(self._doc_terms)
+            matched = set.intersection(*(set(p) for p in postings))
+            scores = {sno: 0.0 for sno in matched}
+            for docs in postings:
+                idf = math.log(1 + n_docs / len(docs))
+                for sno in matched:
+                    scores[sno] += docs[sno] * idf
+        ranked = sorted(scores, key=lambda sno: (-scores[sno], -sno))
+        start = (page - 1) * per_page
+        return SearchPage(ranked[start:start + per_page], page, per_page, len(ranked) > start + per_page)
+
+    def index(self, sno, title, content):
+        if not self._built:
+            return
+        with self._lock:
+            self._discard(sno)
+            self._add(sno, title, content)
+
+    def remove(self, sno):
+        with self._lock:
+            self._discard(sno)
+
+
+BACKENDS = {
+    'fts5': SqliteFTS5Backend,
+    'mysql': MySQLFulltextBackend,
+    'memory': InvertedIndexBackend,
+}
+
+
+class PostSearch:
+    '''Ranked full-text search over post titles and content.
+
+    SEARCH_BACKEND picks the engine: "auto" (default) uses SQLite FTS5 or
+    MySQL FULLTEXT when the database supports it, otherwise the in-process
+    inverted index.
+    '''
+
+    def __init__(self, app=None):
+        self._backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.config.setdefault('SEARCH_CHECK_INTERVAL', 5)
+        self._backend = None
+        app.extensions['post_search'] = self
+        app.cli.add_command(search_cli)
+        post_saved.connect(self._on_saved, app)
+        post_deleted.connect(self._on_deleted, app)
+        posts_imported.connect(self._on_imported, app)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            choice = current_app.config['SEARCH_BACKEND']
+            if choice == 'auto':
+                engine = db.engine
+                choice = next(name for name, cls in BACKENDS.items() if cls.available(engine))
+            self._backend = BACKENDS[choice]()
+        return self._backend
+
+    def create_index(self):
+        '''Create the database-side index of a new schema; the in-process one builds itself.'''
+        if not isinstance(self.backend, InvertedIndexBackend):
+            self.backend.rebuild()
+
+    def search(self, query, page=1, per_page=10, options=()):
+        '''Return (posts, SearchPage) for one page of results, best match first.'''
+        result = self.backend.search(query, page, per_page)
+        if not result.snos:
+            return [], result
+        posts = Posts.query.options(*options).filter(Posts.sno.in_(result.snos)).all()
+        return in_rank_order(posts, result.snos), result
+
+    def statement(self, query, page=1, per_page=10):
+        '''(SQL, params) for one page of ranked snos, for callers that run it on
+        their own connection (asgi.py). None when the backend is not SQL-based,
+        not yet chosen or not yet built, or when the query has no terms.'''
+        backend = self._backend
+        if backend is None or not getattr(backend, 'ready', False):
+            return None
+        return backend.statement(query, page, per_page)
+
+    def _on_saved(self, app, post, **extra):
+        try:
+            self.backend.index(post.sno, post.title, post.content)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Search index update failed for post {post.sno}: {str(e)}")
+
+    def _on_deleted(self, app, sno, **extra):
+        try:
+            self.backend.remove(sno)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Search index removal failed for post {sno}: {str(e)}")
+
+    def _on_imported(self, app, **extra):
+        # One bulk rebuild is far cheaper than indexing thousands of rows one by one
+        self.backend.rebuild()
+
+
+search_cli = AppGroup('search', help='Full-text search index commands.')
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    '''Rebuild the search index from the posts table.'''
+    engine = current_app.extensions['post_search']
+    engine.backend.rebuild()
+    click.echo(f"Rebuilt {engine.backend.name} search index.")
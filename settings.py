@@ -0,0 +1,147 @@
+import copy
+import json
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from replicas import engine_options, replica_binds
+
+CONFIG_PATH = 'config.json'
+
+
+@lru_cache(maxsize=None)
+def load_params(path=None):
+    '''The "params" block of config.json (BLOG_CONFIG overrides the path), read once per process.'''
+    with open(path or os.getenv('BLOG_CONFIG', CONFIG_PATH), 'r') as c:
+        return json.load(c)["params"]
+
+
+def setting(name, default=None, params=None):
+    '''An environment variable, else the lower-cased key in config.json params.'''
+    params = load_params() if params is None else params
+    return os.getenv(name, params.get(name.lower(), default))
+
+
+@lru_cache(maxsize=None)
+def _load_config():
+    # Load environment variables from .env file
+    load_dotenv()
+    params = load_params()
+    config = {'PARAMS': params}
+    config['SECRET_KEY'] = os.getenv('SECRET_KEY', params.get('secret_key', 'default-secret-key'))
+
+    # Per-request SQL/render timing, Server-Timing header and /metrics; off unless METRICS_ENABLED
+    config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+    config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', '200'))
+    config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+
+    # Uploads are stored under content-hashed names; resized/WebP variants are built in a process pool
+    config['UPLOAD_FOLDER'] = "static/assets/img"
+    config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', '2'))
+    # Request size cap, checked again while uploads stream to disk; `flask images gc`
+    # keeps unreferenced uploads for IMAGE_GC_GRACE seconds
+    config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))
+    config['IMAGE_GC_GRACE'] = int(os.getenv('IMAGE_GC_GRACE', str(24 * 3600)))
+
+    # Database Configuration
+    local_server = os.getenv('LOCAL_SERVER', 'True').lower() == 'true'
+    config['SQLALCHEMY_DATABASE_URI'] = os.getenv('LOCAL_URL') if local_server else os.getenv('PROD_URL')
+    config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Connection pool tuning (pool_size/max_overflow are only passed when set, SQLite memory DBs reject them)
+    pool_settings = {
+        'pool_size': setting('DB_POOL_SIZE', params=params),
+        'max_overflow': setting('DB_MAX_OVERFLOW', params=params),
+        'pool_timeout': setting('DB_POOL_TIMEOUT', params=params),
+        'pool_recycle': setting('DB_POOL_RECYCLE', 280, params=params),
+    }
+    pool_settings = {name: int(value) for name, value in pool_settings.items() if value is not None}
+    pool_settings['pool_pre_ping'] = str(setting('DB_POOL_PRE_PING', 'True', params=params)).lower() == 'true'
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(pool_settings)
+
+    # Read replicas (REPLICA_URLS, comma separated): @read_replica views read from one of
+    # them unless the client wrote within REPLICA_STICKY_SECONDS; writes use the primary
+    replica_urls = setting('REPLICA_URLS', '', params=params)
+    if isinstance(replica_urls, str):
+        replica_urls = [url.strip() for url in replica_urls.split(',') if url.strip()]
+    config['SQLALCHEMY_BINDS'] = replica_binds(replica_urls, config['SQLALCHEMY_ENGINE_OPTIONS'])
+    config['REPLICA_STICKY_SECONDS'] = int(setting('REPLICA_STICKY_SECONDS', 5, params=params))
+
+    # How list pages load Posts.author: joined, selectin or lazy (one query per row)
+    config['POST_AUTHOR_LOADING'] = os.getenv('POST_AUTHOR_LOADING', 'joined')
+
+    # Password hashing on a bounded pool; changing BCRYPT_LOG_ROUNDS rehashes on next login
+    config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+    config['HASH_WORKERS'] = int(os.getenv('HASH_WORKERS', str(os.cpu_count() or 2)))
+    config['HASH_QUEUE_DEPTH'] = int(os.getenv('HASH_QUEUE_DEPTH', str(config['HASH_WORKERS'] * 2)))
+
+    # Mail configuration (point MAIL_SERVER/MAIL_PORT at a local debugging SMTP server to test)
+    config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', '587'))
+    config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
+    config['MAIL_USE_SSL'] = False
+    config['MAIL_USERNAME'] = os.getenv('GMAIL_USER')
+    config['MAIL_PASSWORD'] = os.getenv('GMAIL_PASSWORD')
+    config['MAIL_DEFAULT_SENDER'] = config['MAIL_USERNAME']
+
+    # Per-request identity: session['user_id'] -> g.user, cached by id
+    config['IDENTITY_CACHE_TTL'] = int(os.getenv('IDENTITY_CACHE_TTL', '60'))
+
+    # Contact mail goes through the outbox table; OUTBOX_WORKER=thread sends from
+    # this process, otherwise run `flask outbox work` alongside the web workers.
+    config['OUTBOX_WORKER'] = os.getenv('OUTBOX_WORKER', 'cli')
+    config['OUTBOX_THREADS'] = int(os.getenv('OUTBOX_THREADS', '1'))
+    config['OUTBOX_CLAIM_SECONDS'] = int(os.getenv('OUTBOX_CLAIM_SECONDS', '300'))
+
+    # Full-text search (SEARCH_BACKEND: auto, fts5, mysql or memory)
+    config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND', 'auto')
+    # How often the in-process (memory) index checks whether another worker wrote
+    config['SEARCH_CHECK_INTERVAL'] = float(os.getenv('SEARCH_CHECK_INTERVAL', '5'))
+
+    # /search/suggest completions from an in-memory prefix index of titles and slugs,
+    # rebuilt when posts_version() shows another worker wrote (checked every SUGGEST_CHECK_INTERVAL s)
+    config['SUGGEST_LIMIT'] = int(os.getenv('SUGGEST_LIMIT', '8'))
+    config['SUGGEST_MAX_ENTRIES'] = int(os.getenv('SUGGEST_MAX_ENTRIES', '200000'))
+    config['SUGGEST_CHECK_INTERVAL'] = float(os.getenv('SUGGEST_CHECK_INTERVAL', '5'))
+
+    # Rendered-page cache for public routes (PAGE_CACHE_BACKEND: filesystem, redis, memory or null).
+    # Invalidations only reach workers sharing the backend: memory is for a single worker process
+    config['PAGE_CACHE_BACKEND'] = os.getenv('PAGE_CACHE_BACKEND', 'filesystem')
+    config['PAGE_CACHE_MAX_ENTRIES'] = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', '512'))
+    config['PAGE_CACHE_TTL'] = int(os.getenv('PAGE_CACHE_TTL', '300'))
+    if os.getenv('PAGE_CACHE_DIR'):
+        config['PAGE_CACHE_DIR'] = os.getenv('PAGE_CACHE_DIR')
+    if os.getenv('PAGE_CACHE_REDIS_URL'):
+        config['PAGE_CACHE_REDIS_URL'] = os.getenv('PAGE_CACHE_REDIS_URL')
+
+    # Atom and RSS feeds at /feed.xml and /rss.xml, cached until the next post write
+    config['FEED_TITLE'] = params.get('blog_name', 'Blog')
+    config['FEED_ENTRIES'] = int(os.getenv('FEED_ENTRIES', '20'))
+    config['FEED_BACKEND'] = os.getenv('FEED_BACKEND', config['PAGE_CACHE_BACKEND'])
+    if config['FEED_BACKEND'] == 'filesystem' and os.getenv('PAGE_CACHE_DIR'):
+        config['FEED_DIR'] = os.path.join(os.getenv('PAGE_CACHE_DIR'), 'feeds')
+
+    # Post view counts: buffered per worker, upserted into post_views every ANALYTICS_FLUSH_INTERVAL seconds
+    config['ANALYTICS_ENABLED'] = os.getenv('ANALYTICS_ENABLED', 'True').lower() == 'true'
+    config['ANALYTICS_FLUSH_INTERVAL'] = int(os.getenv('ANALYTICS_FLUSH_INTERVAL', '10'))
+    config['ANALYTICS_TOP_N'] = int(os.getenv('ANALYTICS_TOP_N', '5'))
+
+    # "Read next": RELATED_K TF-IDF neighbours per post, built by `flask related build`
+    config['RELATED_K'] = int(os.getenv('RELATED_K', '5'))
+    config['RELATED_MAX_CANDIDATES'] = int(os.getenv('RELATED_MAX_CANDIDATES', '1000'))
+    if os.getenv('RELATED_DIR'):
+        config['RELATED_DIR'] = os.getenv('RELATED_DIR')
+
+    # sitemap.xml plus sno-range shards on disk; a post write rebuilds only its shard
+    config['SITEMAP_SHARD_SIZE'] = int(os.getenv('SITEMAP_SHARD_SIZE', '10000'))
+    config['SITEMAP_BASE_URL'] = setting('SITEMAP_BASE_URL', params=params)
+    if os.getenv('SITEMAP_DIR'):
+        config['SITEMAP_DIR'] = os.getenv('SITEMAP_DIR')
+    return config
+
+
+def load_config():
+    '''App config from the environment, .env and config.json. Parsed once per
+    process; each call returns a fresh copy that callers may modify.'''
+    return copy.deepcopy(_load_config())
@@ -0,0 +1,13 @@
+from blinker import Namespace
+
+# Sent by the write routes *after* the transaction has committed.
+#   post_saved:   sender=app, post=<Posts>, created=bool, old_slug=str|None
+#   post_deleted: sender=app, sno=int, slug=str, user_id=int, img_file=str|None
+#   posts_imported: sender=app, snos=list[int]  (bulk insert by `flask posts import`)
+#   posts_rendered: sender=app, snos=list[int], slugs=list[str]  (`flask posts render`)
+_signals = Namespace()
+
+post_saved = _signals.signal('post-saved')
+post_deleted = _signals.signal('post-deleted')
+posts_imported = _signals.signal('posts-imported')
+posts_rendered = _signals.signal('posts-rendered')
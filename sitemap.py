@@ -0,0 +1,186 @@
+import os
+import re
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+import click
+from flask import abort, current_app, has_request_context, send_from_directory, url_for
+from flask.cli import AppGroup
+
+from models import db, Posts
+from signals import post_saved, post_deleted, posts_imported
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SHARD_RE = re.compile(r'^sitemap-(\d+)\.xml$')
+INDEX_NAME = 'sitemap.xml'
+
+
+def shard_name(shard):
+    return f'sitemap-{shard}.xml'
+
+
+def _write(directory, name, root):
+    '''Write an XML document atomically so readers never see half a file.'''
+    ET.register_namespace('', SITEMAP_NS)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{name}.')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(ET.tostring(root, encoding='utf-8', xml_declaration=True))
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, os.path.join(directory, name))
+
+
+class Sitemap:
+    '''sitemap.xml index plus child sitemaps of SITEMAP_SHARD_SIZE posts each.
+
+    Shard k holds the posts whose sno falls in [k*N + 1, (k+1)*N], so a write
+    only ever touches one shard: add, edit and delete rebuild that shard and
+    the small index. Files live in SITEMAP_DIR and are served from disk with
+    validators and a max-age. Writes from the CLI without SITEMAP_BASE_URL
+    delete the affected files instead, and the next request rebuilds them.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SITEMAP_DIR', os.path.join(app.instance_path, 'sitemaps'))
+        app.config.setdefault('SITEMAP_SHARD_SIZE', 10000)
+        app.config.setdefault('SITEMAP_MAX_AGE', 3600)
+        app.config.setdefault('SITEMAP_BASE_URL', None)
+        app.extensions['sitemap'] = self
+        app.cli.add_command(sitemap_cli)
+        post_saved.connect(self._on_saved, app)
+        post_deleted.connect(self._on_deleted, app)
+        posts_imported.connect(self._on_imported, app)
+        app.add_url_rule('/sitemap.xml', 'sitemap_index', self.index_view)
+        app.add_url_rule('/sitemap-<int:shard>.xml', 'sitemap_shard', self.shard_view)
+
+    @property
+    def directory(self):
+        path = current_app.config['SITEMAP_DIR']
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def shard_for(self, sno):
+        return (sno - 1) // current_app.config['SITEMAP_SHARD_SIZE']
+
+    def _url(self, endpoint, **values):
+        base = current_app.config['SITEMAP_BASE_URL']
+        if base:
+            return base.rstrip('/') + url_for(endpoint, **values)
+        return url_for(endpoint, _external=True, **values)
+
+    def build_shard(self, shard):
+        '''Rewrite one shard from an sno range scan; drop it if the range is empty.'''
+        size = current_app.config['SITEMAP_SHARD_SIZE']
+        rows = db.session.execute(
+            db.select(Posts.slug, Posts.published_at)
+            .where(Posts.sno > shard * size, Posts.sno <= (shard + 1) * size)
+            .order_by(Posts.sno)).all()
+        path = os.path.join(self.directory, shard_name(shard))
+        if not rows:
+            if os.path.exists(path):
+                os.remove(path)
+            return 0
+        urlset = ET.Element(f'{{{SITEMAP_NS}}}urlset')
+        for slug, published_at in rows:
+            url = ET.SubElement(urlset, f'{{{SITEMAP_NS}}}url')
+            ET.SubElement(url, f'{{{SITEMAP_NS}}}loc').text = self._url('blog.post_route', post_slug=slug)
+            if published_at is not None:
+                ET.SubElement(url, f'{{{SITEMAP_NS}}}lastmod').text = published_at.date().isoformat()
+        _write(self.directory, shard_name(shard), urlset)
+        return len(rows)
+
+    def build_index(self):
+        '''List the shards on disk; each lastmod is the shard file's mtime.'''
+        directory = self.directory
+        shards = sorted(int(m.group(1)) for m in map(SHARD_RE.match, os.listdir(directory)) if m)
+        index = ET.Element(f'{{{SITEMAP_NS}}}sitemapindex')
+        for shard in shards:
+            mtime = os.path.getmtime(os.path.join(directory, shard_name(shard)))
+            entry = ET.SubElement(index, f'{{{SITEMAP_NS}}}sitemap')
+            ET.SubElement(entry, f'{{{SITEMAP_NS}}}loc').text = self._url('sitemap_shard', shard=shard)
+            ET.SubElement(entry, f'{{{SITEMAP_NS}}}lastmod').text = (
+                datetime.fromtimestamp(mtime, timezone.utc).replace(microsecond=0).isoformat())
+        _write(directory, INDEX_NAME, index)
+        return len(shards)
+
+    def build_all(self):
+        directory = self.directory
+        for name in os.listdir(directory):
+            if SHARD_RE.match(name):
+                os.remove(os.path.join(directory, name))
+        max_sno = db.session.execute(db.select(db.func.max(Posts.sno))).scalar() or 0
+        urls = sum(self.build_shard(shard) for shard in range(self.shard_for(max_sno) + 1) if max_sno)
+        return self.build_index(), urls
+
+    def refresh(self, snos):
+        for shard in sorted({self.shard_for(sno) for sno in snos}):
+            self.build_shard(shard)
+        self.build_index()
+
+    def _serve(self, name):
+        response = send_from_directory(self.directory, name, mimetype='application/xml',
+                                       max_age=current_app.config['SITEMAP_MAX_AGE'])
+        response.cache_control.public = True
+        return response
+
+    def index_view(self):
+        if not os.path.exists(os.path.join(self.directory, INDEX_NAME)):
+            self.build_all()
+        return self._serve(INDEX_NAME)
+
+    def shard_view(self, shard):
+        if not os.path.exists(os.path.join(self.directory, shard_name(shard))):
+            if not self.build_shard(shard):
+                abort(404)
+        return self._serve(shard_name(shard))
+
+    def forget(self, snos):
+        '''Drop the shards holding `snos` and the index; the next request rebuilds them.'''
+        directory = self.directory
+        for name in [shard_name(shard) for shard in {self.shard_for(sno) for sno in snos}] + [INDEX_NAME]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _refresh_logged(self, app, snos):
+        try:
+            if has_request_context():
+                self.refresh(snos)
+            elif app.config['SITEMAP_BASE_URL']:
+                with app.test_request_context():
+                    self.refresh(snos)
+            else:
+                # A CLI write has no host to build <loc> URLs from
+                self.forget(snos)
+        except Exception as e:
+            app.logger.error(f"Sitemap refresh failed for posts {snos}: {str(e)}")
+
+    def _on_saved(self, app, post, **extra):
+        self._refresh_logged(app, [post.sno])
+
+    def _on_deleted(self, app, sno, **extra):
+        self._refresh_logged(app, [sno])
+
+    def _on_imported(self, app, snos, **extra):
+        self._refresh_logged(app, snos)
+
+
+sitemap_cli = AppGroup('sitemap', help='Sitemap commands.')
+
+
+@sitemap_cli.command('build')
+@click.option('--base-url', help='Site root for <loc> URLs (default: SITEMAP_BASE_URL).')
+def build_command(base_url):
+    '''Regenerate every shard and the index.'''
+    if base_url:
+        current_app.config['SITEMAP_BASE_URL'] = base_url
+    if not current_app.config['SITEMAP_BASE_URL']:
+        raise click.ClickException("Set SITEMAP_BASE_URL or pass --base-url.")
+    with current_app.test_request_context():
+        shards, urls = current_app.extensions['sitemap'].build_all()
+    click.echo(f"Wrote {urls} URL(s) in {shards} shard(s).")
@@ -0,0 +1,68 @@
+// Search-as-you-type for the dashboard search box: asks /search/suggest as the
+// user types (debounced, stale requests aborted) and lists matching posts.
+window.addEventListener('DOMContentLoaded', () => {
+    const input = document.querySelector('input[data-suggest-url]');
+    if (!input) {
+        return;
+    }
+    const list = document.createElement('div');
+    list.className = 'list-group position-absolute w-100 shadow-sm';
+    list.style.zIndex = 1000;
+    list.hidden = true;
+    input.parentElement.classList.add('position-relative');
+    input.insertAdjacentElement('afterend', list);
+
+    let timer = null;
+    let controller = null;
+
+    const close = () => {
+        list.hidden = true;
+        list.replaceChildren();
+    };
+
+    const show = (suggestions) => {
+        list.replaceChildren(...suggestions.map((item) => {
+            const link = document.createElement('a');
+            link.className = 'list-group-item list-group-item-action';
+            link.href = item.url;
+            link.textContent = item.title;
+            return link;
+        }));
+        list.hidden = suggestions.length === 0;
+    };
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            close();
+            return;
+        }
+        timer = setTimeout(() => {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            const url = `${input.dataset.suggestUrl}?q=${encodeURIComponent(query)}`;
+            fetch(url, {signal: controller.signal, headers: {'Accept': 'application/json'}})
+                .then((response) => response.ok ? response.json() : {suggestions: []})
+                .then((data) => show(data.suggestions))
+                .catch((error) => {
+                    if (error.name !== 'AbortError') {
+                        close();
+                    }
+                });
+        }, 150);
+    });
+
+    input.addEventListener('keydown', (event) => {
+        if (event.key === 'Escape') {
+            close();
+        }
+    });
+    document.addEventListener('click', (event) => {
+        if (!list.contains(event.target) && event.target !== input) {
+            close();
+        }
+    });
+});
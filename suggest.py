@@ -0,0 +1,232 @@
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Posts, PostsSync
+from search import tokenize
+from signals import post_saved, post_deleted
+
+MAX_WORD_STARTS = 8  # title keys per post: from the 1st word, the 2nd word, ...
+MAX_KEY_LENGTH = 64  # longer keys are cut; queries are compared on the same prefix
+BUCKET_CHARS = 2     # queries this short read a ranked bucket instead of every matching key
+
+
+def normalize(value):
+    return ' '.join(tokenize(value))
+
+
+def post_keys(title, slug):
+    '''[(key, word position)] for a post: title suffixes starting at each word, and the slug.'''
+    words = tokenize(title)
+    keys = [(' '.join(words[i:])[:MAX_KEY_LENGTH], i) for i in range(min(len(words), MAX_WORD_STARTS))]
+    slug_key = normalize(slug.replace('-', ' '))[:MAX_KEY_LENGTH]
+    if slug_key:
+        keys.append((slug_key, MAX_WORD_STARTS))
+    return keys
+
+
+def rank(sno, position):
+    '''Sort key of a match: first title word before later words and the slug, then newest.'''
+    return (position > 0, -sno)
+
+
+class Suggest:
+    '''Search-as-you-type over post titles and slugs, served from memory.
+
+    A sorted list of (key, sno, position) entries, searched with bisect for
+    the keys starting with the query, which are all ranked. Queries of up to
+    BUCKET_CHARS characters match too many keys for that, so each of those
+    prefixes also keeps its posts in rank order. The index is built on first
+    use from one streamed query, kept current from the write signals and
+    holds at most SUGGEST_MAX_ENTRIES entries: past that the oldest posts
+    drop out. Writes handled by other workers, imports included, are seen
+    through posts_version(), checked at most every SUGGEST_CHECK_INTERVAL
+    seconds: a changed stamp reads just the posts added, edited or deleted
+    since (models.PostsSync), and lookups keep using the index meanwhile.
+    '''
+    BATCH = 1000
+    MERGE_ROWS = 100  # changed posts past which one sort beats an insort per key
+
+    def __init__(self, app=None):
+        self._entries = []
+        self._buckets = defaultdict(list)  # short prefix -> sorted [(rank, sno)]
+        self._keys = {}   # sno -> its entries, to remove them again
+        self._posts = {}  # sno -> (title, slug)
+        self._built = False
+        self._sync = PostsSync()
+        self._checked = 0.0
+        self._lock = Lock()        # guards the index
+        self._sync_lock = Lock()   # one build or catch-up at a time
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SUGGEST_LIMIT', 8)
+        app.config.setdefault('SUGGEST_MAX_ENTRIES', 200_000)
+        app.config.setdefault('SUGGEST_CHECK_INTERVAL', 5)
+        self._built = False
+        app.extensions['suggest'] = self
+        post_saved.connect(self._on_saved, app)
+        post_deleted.connect(self._on_deleted, app)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _bucket_items(entry):
+        key, sno, position = entry
+        return [(key[:n], (rank(sno, position), sno)) for n in range(1, min(len(key), BUCKET_CHARS) + 1)]
+
+    def _add(self, sno, title, slug):
+        entries = [(key, sno, position) for key, position in post_keys(title, slug)]
+        for entry in entries:
+            insort(self._entries, entry)
+            for prefix, item in self._bucket_items(entry):
+                insort(self._buckets[prefix], item)
+        self._keys[sno] = entries
+        self._posts[sno] = (title, slug)
+
+    @staticmethod
+    def _remove(items, item):
+        i = bisect_left(items, item)
+        if i < len(items) and items[i] == item:
+            del items[i]
+
+    def _discard(self, sno):
+        for entry in self._keys.pop(sno, ()):
+            self._remove(self._entries, entry)
+            for prefix, item in self._bucket_items(entry):
+                self._remove(self._buckets[prefix], item)
+        self._posts.pop(sno, None)
+
+    def _evict(self, cap):
+        while len(self._entries) > cap and self._keys:
+            self._discard(min(self._keys))
+
+    def _fill(self, posts, cap):
+        '''New index structures for `posts`, (sno, entries, (title, slug)) newest
+        first, up to `cap` entries, so the newest posts are the ones kept.'''
+        entries, buckets, keys, titles = [], defaultdict(list), {}, {}
+        for sno, post_entries, post in posts:
+            if len(entries) + len(post_entries) > cap:
+                break
+            entries.extend(post_entries)
+            for entry in post_entries:
+                for prefix, item in self._bucket_items(entry):
+                    buckets[prefix].append(item)
+            keys[sno] = post_entries
+            titles[sno] = post
+        entries.sort()
+        for items in buckets.values():
+            items.sort()
+        return entries, buckets, keys, titles
+
+    def _build(self):
+        sync = PostsSync()
+        sync.start()
+
+        def posts():
+            stmt = (select(Posts.sno, Posts.published_at, Posts.title, Posts.slug).order_by(Posts.sno.desc())
+                    .execution_options(yield_per=self.BATCH))
+            for sno, published_at, title, slug in db.session.execute(stmt):
+                sync.seen(sno, published_at)
+                yield sno, [(key, sno, position) for key, position in post_keys(title, slug)], (title, slug)
+        index = self._fill(posts(), current_app.config['SUGGEST_MAX_ENTRIES'])
+        with self._lock:
+            self._entries, self._buckets, self._keys, self._posts = index
+        self._sync = sync
+        self._built = True
+        self._checked = time.monotonic()
+
+    def _merge(self, rows, removed, cap):
+        posts = {sno: (entries, self._posts[sno]) for sno, entries in self._keys.items()}
+        for sno in removed:
+            posts.pop(sno, None)
+        for sno, _, title, slug in rows:
+            posts[sno] = ([(key, sno, position) for key, position in post_keys(title, slug)], (title, slug))
+        self._entries, self._buckets, self._keys, self._posts = self._fill(
+            ((sno, *posts[sno]) for sno in sorted(posts, reverse=True)), cap)
+
+    def _catch_up(self):
+        def known():
+            with self._lock:
+                return list(self._keys)
+        changes = self._sync.changes((Posts.title, Posts.slug), known)
+        if changes is None:
+            return
+        rows, removed = changes
+        cap = current_app.config['SUGGEST_MAX_ENTRIES']
+        with self._lock:
+            if len(rows) + len(removed) > self.MERGE_ROWS:
+                self._merge(rows, removed, cap)
+                return
+            for sno in removed:
+                self._discard(sno)
+            for sno, _, title, slug in rows:
+                self._discard(sno)
+                self._add(sno, title, slug)
+            self._evict(cap)
+
+    def _ensure(self):
+        if not self._built:
+            with self._sync_lock:
+                if not self._built:
+                    self._build()
+            return
+        now = time.monotonic()
+        if now - self._checked < current_app.config['SUGGEST_CHECK_INTERVAL']:
+            return
+        # Another thread is catching up: serve the index as it is
+        if self._sync_lock.acquire(blocking=False):
+            try:
+                self._checked = now
+                self._catch_up()
+            finally:
+                self._sync_lock.release()
+
+    def rebuild(self):
+        with self._sync_lock:
+            self._build()
+
+    def suggest(self, query, limit=None):
+        '''[(sno, title, slug)] for titles with a word, or slugs, starting with `query`:
+        matches on the first title word first, then newest first.'''
+        limit = limit or current_app.config['SUGGEST_LIMIT']
+        prefix = normalize(query)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        self._ensure()
+        with self._lock:
+            if len(prefix) <= BUCKET_CHARS:
+                ranked = []
+                for _, sno in self._buckets.get(prefix, ()):
+                    if sno not in ranked:
+                        ranked.append(sno)
+                        if len(ranked) == limit:
+                            break
+            else:
+                best = {}
+                entries = self._entries
+                for i in range(bisect_left(entries, (prefix,)), len(entries)):
+                    key, sno, position = entries[i]
+                    if not key.startswith(prefix):
+                        break
+                    best[sno] = min(rank(sno, position), best.get(sno, (True, 0)))
+                ranked = sorted(best, key=best.get)[:limit]
+            return [(sno, *self._posts[sno]) for sno in ranked]
+
+    def _on_saved(self, app, post, **extra):
+        if not self._built:
+            return
+        with self._lock:
+            self._discard(post.sno)
+            self._add(post.sno, post.title, post.slug)
+            self._evict(app.config['SUGGEST_MAX_ENTRIES'])
+
+    def _on_deleted(self, app, sno, **extra):
+        with self._lock:
+            self._discard(sno)
@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# settings.py reads config.json once per process, so point it at a test copy before importing the app
+_config_dir = tempfile.mkdtemp(prefix='blog-tests-')
+with open(os.path.join(_config_dir, 'config.json'), 'w') as f:
+    json.dump({'params': {'blog_name': 'Test blog', 'no_of_posts': 2, 'secret_key': 'test'}}, f)
+os.environ['BLOG_CONFIG'] = os.path.join(_config_dir, 'config.json')
+os.environ['LOCAL_SERVER'] = 'True'
+os.environ['LOCAL_URL'] = 'sqlite://'
+
+from main import create_app, create_schema  # noqa: E402
+from models import db, Posts, User  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    '''Build an app on a fresh SQLite file with every on-disk store under tmp_path.'''
+    def make(**config):
+        settings = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'blog.db'}",
+            'SQLALCHEMY_BINDS': {},
+            'PARAMS': {'blog_name': 'Test blog', 'no_of_posts': 2},
+            'ANALYTICS_ENABLED': False,
+            'PAGE_CACHE_BACKEND': 'null',
+            'FEED_BACKEND': 'null',
+            'BCRYPT_LOG_ROUNDS': 4,
+            'UPLOAD_FOLDER': str(tmp_path / 'img'),
+            'PAGE_CACHE_DIR': str(tmp_path / 'page_cache'),
+            'FEED_DIR': str(tmp_path / 'feed_cache'),
+            'SITEMAP_DIR': str(tmp_path / 'sitemaps'),
+            'RELATED_DIR': str(tmp_path / 'related'),
+        }
+        settings.update(config)
+        app = create_app(settings)
+        with app.app_context():
+            create_schema()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(name='Author', email='author@example.com'):
+        with app.app_context():
+            user = User(name=name, email=email, password='x')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def make_posts(app):
+    '''Insert `count` posts for a user, newest last; returns their slugs.'''
+    def make(user_id, count, prefix='post'):
+        start = datetime(2026, 1, 1)
+        slugs = []
+        with app.app_context():
+            for i in range(count):
+                slug = f'{prefix}-{user_id}-{i}'
+                db.session.add(Posts(title=f'Post {i}', slug=slug, content=f'Body of post {i}.', date='01-01-2026',
+                                     published_at=start + timedelta(minutes=i), img_file='x.jpg', user_id=user_id))
+                slugs.append(slug)
+            db.session.execute(db.update(User).where(User.id == user_id).values(post_count=User.post_count + count))
+            db.session.commit()
+        return slugs
+    return make
+
+
+def log_in(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+
+@contextmanager
+def count_queries(app, bind_key=None):
+    '''Collect the SQL statements one of the app's engines (the primary by default) runs inside the block.'''
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engines[bind_key]
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
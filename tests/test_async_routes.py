@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+import pytest
+from flask import request
+
+from async_routes import AsyncReadApp
+from main import analytics, feeds, page_cache
+from models import db, Posts
+
+
+def get(asgi_app, path, query_string=b''):
+    '''(status, headers, body) for one GET through the ASGI app.'''
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        try:
+            await asgi_app({'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string, 'headers': [],
+                            'http_version': '1.1', 'server': ('localhost', 80)}, receive, send)
+        finally:
+            for engine in [asgi_app.primary, *asgi_app.replicas]:
+                await engine.dispose()
+    asyncio.run(run())
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(PAGE_CACHE_BACKEND='filesystem', FEED_BACKEND='filesystem')
+
+
+@pytest.fixture
+def cache_threads(monkeypatch):
+    '''Names of the threads that called a page or feed cache backend.'''
+    names = []
+    for store in (page_cache, feeds):
+        for method in ('get', 'set'):
+            original = getattr(store.backend, method)
+
+            def wrapper(*args, _original=original, **kwargs):
+                names.append(threading.current_thread().name)
+                return _original(*args, **kwargs)
+            monkeypatch.setattr(store.backend, method, wrapper)
+    return names
+
+
+@pytest.mark.parametrize('path', ['/', '/post/post-1-0', '/feed.xml'])
+def test_blocking_cache_backends_run_off_the_event_loop(app, make_user, make_posts, cache_threads, path):
+    make_posts(make_user(), 2)
+
+    for _ in range(2):  # a miss that stores, then a hit
+        status, headers, body = get(AsyncReadApp(app), path)
+        assert status == 200
+
+    assert cache_threads
+    assert threading.main_thread().name not in cache_threads
+
+
+@pytest.fixture
+def before_request_calls(app):
+    calls = []
+    app.before_request(lambda: calls.append(request.path))
+    return calls
+
+
+def test_unrendered_post_is_served_async_and_counted_once(app, make_user, make_posts, monkeypatch,
+                                                          before_request_calls):
+    make_posts(make_user(), 1)
+    with app.app_context():
+        db.session.execute(db.update(Posts).values(content_html=None))
+        db.session.commit()
+    recorded = []
+    monkeypatch.setattr(analytics, 'record', recorded.append)
+
+    status, headers, body = get(AsyncReadApp(app), '/post/post-1-0')
+
+    assert status == 200
+    assert b'Body of post 0.' in body
+    assert recorded == ['post-1-0']
+    assert before_request_calls == ['/post/post-1-0']
+
+
+def test_numbered_pager_runs_before_request_once(app, make_user, make_posts, before_request_calls):
+    make_posts(make_user(), 3)
+
+    status, headers, body = get(AsyncReadApp(app), '/', b'page=2')
+
+    assert status == 200
+    assert before_request_calls == ['/']
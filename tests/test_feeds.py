@@ -0,0 +1,76 @@
+import shutil
+
+import pytest
+
+from conftest import count_queries, log_in
+from models import db, Posts, User
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(FEED_BACKEND='memory')
+
+
+@pytest.mark.parametrize('path', ['/feed.xml', '/rss.xml'])
+def test_matching_etag_gets_304_without_a_query(app, make_user, make_posts, path):
+    make_posts(make_user(), 2)
+    client = app.test_client()
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.headers['ETag'] and first.headers['Last-Modified']
+
+    with count_queries(app) as statements:
+        again = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 304
+    assert again.data == b''
+    assert statements == []
+
+
+def test_last_modified_gets_304(app, make_user, make_posts):
+    make_posts(make_user(), 2)
+    client = app.test_client()
+    first = client.get('/feed.xml')
+
+    again = client.get('/feed.xml', headers={'If-Modified-Since': first.headers['Last-Modified']})
+
+    assert again.status_code == 304
+
+
+def test_deleting_a_post_changes_the_feed(app, make_user, make_posts):
+    user_id = make_user()
+    make_posts(user_id, 2)
+    client = app.test_client()
+    first = client.get('/feed.xml')
+    log_in(client, user_id)
+    with app.app_context():
+        sno = db.session.execute(db.select(Posts.sno).order_by(Posts.sno.desc())).scalars().first()
+    client.post(f'/delete/{sno}')
+
+    again = client.get('/feed.xml', headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
+    assert b'Post 1' not in again.data
+
+
+def test_feed_is_built_from_the_primary_not_a_lagging_replica(make_app, tmp_path):
+    app = make_app(FEED_BACKEND='memory',
+                   SQLALCHEMY_BINDS={'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"})
+    with app.app_context():
+        user = User(name='Author', email='author@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    # The replica stops here, before the post below is written
+    shutil.copy(tmp_path / 'blog.db', tmp_path / 'replica.db')
+    with app.app_context():
+        db.session.add(Posts(title='Fresh post', slug='fresh', content='New.', date='x', img_file='x.jpg',
+                             user_id=user_id))
+        db.session.commit()
+
+    with count_queries(app, 'replica_0') as on_replica:
+        body = app.test_client().get('/feed.xml').data
+
+    assert b'Fresh post' in body
+    assert on_replica == []
@@ -0,0 +1,40 @@
+import threading
+
+import main
+
+
+def test_slow_hash_returns_503_with_retry_after(make_app, make_user, monkeypatch):
+    app = make_app(HASH_TIMEOUT=0.05)
+    make_user(name='Reader', email='reader@example.com')
+    release = threading.Event()
+    monkeypatch.setattr(main.bcrypt, 'check_password_hash', lambda pw_hash, password: release.wait(5))
+    try:
+        response = app.test_client().post('/login', data={'email': 'reader@example.com', 'password': 'Secret123'})
+    finally:
+        release.set()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_full_queue_returns_503_with_retry_after(make_app, monkeypatch):
+    app = make_app(HASH_WORKERS=1, HASH_QUEUE_DEPTH=0)
+    monkeypatch.setattr(main.hasher._slots, 'acquire', lambda blocking=True: False)
+
+    response = app.test_client().post('/register', data={
+        'name': 'Reader', 'email': 'reader@example.com', 'password': 'Secret123'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_building_apps_again_reuses_the_hashing_threads(make_app):
+    def bcrypt_threads():
+        return [t for t in threading.enumerate() if t.name.startswith('bcrypt')]
+
+    for _ in range(3):
+        make_app(HASH_WORKERS=2)
+        for _ in range(4):
+            main.hasher.hash('Secret123')
+
+    assert len(bcrypt_threads()) <= 2
@@ -0,0 +1,21 @@
+from conftest import log_in
+
+
+def test_static_files_do_not_vary_on_cookie(app, make_user):
+    client = app.test_client()
+    log_in(client, make_user(name='Reader', email='reader@example.com'))
+
+    response = client.get('/static/js/suggest.js')
+
+    assert response.status_code == 200
+    assert 'Cookie' not in response.vary
+    response.close()
+
+
+def test_pages_still_see_the_logged_in_user(app, make_user):
+    client = app.test_client()
+    log_in(client, make_user(name='Reader', email='reader@example.com'))
+
+    response = client.get('/dashboard')
+
+    assert response.status_code == 200  # login_required would redirect
@@ -0,0 +1,118 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import images
+from models import db, ImageRefs, Posts
+
+OLD = time.time() - 3 * 24 * 3600
+
+
+@pytest.fixture
+def folder(app):
+    path = app.config['UPLOAD_FOLDER']
+    os.makedirs(path)
+    return path
+
+
+def store(folder, stem, mtime=OLD, widths=(480,)):
+    '''Write a stored upload and its variants with the given mtime; returns the original's name.'''
+    names = [f'{stem}.jpg'] + [images.variant_name(f'{stem}.jpg', w, ext) for w in widths for ext in ('jpg', 'webp')]
+    for name in names:
+        path = os.path.join(folder, name)
+        with open(path, 'wb') as f:
+            f.write(b'jpeg')
+        os.utime(path, (mtime, mtime))
+    return names[0]
+
+
+def count(app, filename, refs, updated_at=datetime.fromtimestamp(OLD)):
+    with app.app_context():
+        db.session.add(ImageRefs(filename=filename, refs=refs, updated_at=updated_at))
+        db.session.commit()
+
+
+def gc(app, *args):
+    result = app.test_cli_runner().invoke(args=['images', 'gc', *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_unreferenced_images_past_the_grace_period_are_removed(app, folder):
+    name = store(folder, 'a' * 20)
+    count(app, name, 0)
+
+    assert 'Removed 3 file(s) from 1 unreferenced image(s).' in gc(app)
+
+    assert os.listdir(folder) == []
+    with app.app_context():
+        assert db.session.get(ImageRefs, name) is None
+
+
+def test_grace_period_covers_the_file_and_its_count(app, folder):
+    new_file = store(folder, 'a' * 20, mtime=time.time())
+    new_count = store(folder, 'b' * 20)
+    count(app, new_count, 0, updated_at=datetime.now() - timedelta(minutes=5))
+
+    assert 'Removed 0 file(s)' in gc(app)
+
+    assert {new_file, new_count} <= set(os.listdir(folder))
+
+
+def test_referenced_images_are_kept(app, folder, make_user):
+    counted = store(folder, 'a' * 20)
+    count(app, counted, 1)
+    drifted = store(folder, 'b' * 20)
+    count(app, drifted, 0)  # the count is wrong, but a post still uses the file
+    with app.app_context():
+        db.session.add(Posts(title='T', slug='t', content='Body', date='x', img_file=drifted, user_id=make_user()))
+        db.session.commit()
+
+    assert 'Removed 0 file(s)' in gc(app)
+
+    assert len(os.listdir(folder)) == 6
+
+
+def test_an_image_referenced_during_gc_is_kept(app, folder, monkeypatch):
+    name = store(folder, 'a' * 20)
+    count(app, name, 0)
+    claim = images._claim
+
+    def referenced_meanwhile(filename, cutoff):
+        # A post commits between gc reading the counts and unlinking
+        db.session.execute(db.update(ImageRefs).values(refs=1, updated_at=datetime.now()))
+        db.session.commit()
+        return claim(filename, cutoff)
+    monkeypatch.setattr(images, '_claim', referenced_meanwhile)
+
+    assert 'Removed 0 file(s) from 0 unreferenced image(s).' in gc(app)
+
+    assert name in os.listdir(folder)
+
+
+def test_dry_run_lists_files_and_deletes_nothing(app, folder):
+    name = store(folder, 'a' * 20)
+    count(app, name, 0)
+
+    output = gc(app, '--dry-run')
+
+    assert f'would remove {name}' in output
+    assert 'Would remove 3 file(s) from 1 unreferenced image(s).' in output
+    assert len(os.listdir(folder)) == 3
+    with app.app_context():
+        assert db.session.get(ImageRefs, name) is not None
+
+
+def test_variant_lookups_are_capped(app, folder, monkeypatch):
+    monkeypatch.setattr(images, 'KNOWN_VARIANTS', 2)
+    pipeline = images.ImagePipeline()
+    names = [store(folder, stem * 20) for stem in 'abc']
+    with app.app_context():
+        pipeline._variants(names[0])
+        pipeline._variants(names[1])
+        pipeline._variants(names[0])  # now the most recently used
+        assert pipeline._variants(names[2]) == (480,)
+
+    assert list(pipeline._known) == [names[0], names[2]]
@@ -0,0 +1,63 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import main
+from models import db
+
+
+def test_disabled_by_default(app):
+    client = app.test_client()
+
+    assert 'Server-Timing' not in client.get('/').headers
+    assert client.get('/metrics').status_code == 404
+
+
+def test_server_timing_counts_the_request_queries(make_app, make_user, make_posts):
+    app = make_app(METRICS_ENABLED=True)
+    make_posts(make_user(name='Author', email='author@example.com'), 2)
+
+    timing = app.test_client().get('/').headers['Server-Timing']
+
+    assert timing.startswith('db;dur=')
+    assert 'desc="1 queries"' in timing
+    assert 'render;dur=' in timing
+    assert 'total;dur=' in timing
+
+
+def test_metrics_endpoint_reports_requests_by_route(make_app):
+    app = make_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    client.get('/')
+    client.get('/')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'blog_requests_total{route="blog.home",method="GET",status="200"} 2' in body
+    assert 'blog_request_duration_seconds_count{route="blog.home",method="GET"} 2' in body
+    assert 'blog_db_queries_total{route="blog.home"} 2' in body
+
+
+def test_metrics_token_is_required_when_set(make_app):
+    client = make_app(METRICS_ENABLED=True, METRICS_TOKEN='s3cret').test_client()
+
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+
+
+def test_a_later_app_without_metrics_turns_them_off(make_app):
+    make_app(METRICS_ENABLED=True)
+    app = make_app()
+
+    assert main.instrumentation.metrics is None
+    assert 'Server-Timing' not in app.test_client().get('/').headers
+
+
+def query_listened(app):
+    with app.app_context():
+        return event.contains(db.engine, 'before_cursor_execute', main.instrumentation._before_cursor_execute)
+
+
+def test_query_listeners_only_on_engines_of_apps_with_metrics(make_app):
+    assert not query_listened(make_app())
+    assert query_listened(make_app(METRICS_ENABLED=True))
+    assert not event.contains(Engine, 'before_cursor_execute', main.instrumentation._before_cursor_execute)
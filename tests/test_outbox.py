@@ -0,0 +1,86 @@
+import threading
+
+from flask_mail import email_dispatched
+
+import outbox
+from models import db, Contacts, Outbox
+
+
+def outbox_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('outbox-worker-')]
+
+
+def queue(app, count):
+    with app.app_context():
+        for i in range(count):
+            outbox.enqueue(f'Mail {i}', 'blog@example.com', ['reader@example.com'], 'Hello')
+        db.session.commit()
+
+
+def test_thread_worker_starts_on_first_request_not_in_create_app(make_app):
+    before = len(outbox_threads())
+    app = make_app(OUTBOX_WORKER='thread', OUTBOX_THREADS=2, OUTBOX_POLL_INTERVAL=0.05)
+    try:
+        assert len(outbox_threads()) == before
+        app.test_client().get('/about')
+        assert len(outbox_threads()) == before + 2
+        app.test_client().get('/about')
+        assert len(outbox_threads()) == before + 2
+    finally:
+        app.extensions['outbox_worker'].stop(timeout=5)
+
+
+def test_a_row_read_by_two_workers_is_sent_once(app):
+    queue(app, 3)
+    sent = []
+
+    def record(message, app):
+        sent.append(message.subject)
+    email_dispatched.connect(record)
+    try:
+        with app.app_context():
+            # Both workers read the same due rows before either claims them
+            seen_by_a = outbox.due(10)
+            seen_by_b = outbox.due(10)
+            assert outbox.claim(seen_by_b) == [row_id for row_id, _ in seen_by_b]
+            assert outbox.claim(seen_by_a) == []
+            assert outbox.send_batch() == 0  # leased to worker b, not due again yet
+    finally:
+        email_dispatched.disconnect(record)
+    assert sent == []
+
+
+def test_send_batch_sends_each_due_mail(app):
+    queue(app, 2)
+    with app.app_context(), app.extensions['mail'].record_messages() as messages:
+        assert outbox.send_batch() == 2
+        assert outbox.send_batch() == 0
+        assert sorted(m.subject for m in messages) == ['Mail 0', 'Mail 1']
+        assert {row.status for row in Outbox.query} == {'sent'}
+
+
+def contact(client):
+    return client.post('/contact', data={'name': 'Reader', 'email': 'reader@example.com',
+                                         'phone': '', 'message': 'Hello there'})
+
+
+def test_contact_queues_mail_to_the_admin(make_app):
+    app = make_app(MAIL_USERNAME='admin@example.com')
+
+    contact(app.test_client())
+
+    with app.app_context():
+        assert Contacts.query.count() == 1
+        assert [row.recipients for row in Outbox.query] == ['admin@example.com']
+
+
+def test_contact_without_a_mail_account_keeps_the_message(make_app, caplog):
+    app = make_app(MAIL_USERNAME=None)
+
+    response = contact(app.test_client())
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert Contacts.query.count() == 1
+        assert Outbox.query.count() == 0
+    assert 'not queued' in caplog.text
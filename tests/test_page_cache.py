@@ -0,0 +1,53 @@
+import settings
+from cache import PageCache, make_backend
+from conftest import count_queries
+from models import db, Posts
+
+
+def other_worker(app):
+    '''A second worker's PageCache: its own backend object over the same configuration.'''
+    cache = PageCache()
+    cache.backend = make_backend(app.config, 'PAGE_CACHE')
+    return cache
+
+
+def test_default_backend_is_shared_between_workers(monkeypatch):
+    monkeypatch.delenv('PAGE_CACHE_BACKEND', raising=False)
+    settings._load_config.cache_clear()
+    try:
+        assert settings.load_config()['PAGE_CACHE_BACKEND'] == 'filesystem'
+    finally:
+        settings._load_config.cache_clear()
+
+
+def test_invalidation_reaches_other_workers(make_app, make_user, make_posts, tmp_path):
+    app = make_app(PAGE_CACHE_BACKEND='filesystem')
+    make_posts(make_user(), 2)
+    client = app.test_client()
+    client.get('/')
+    with count_queries(app) as statements:
+        assert client.get('/').status_code == 200
+    assert statements == []  # served from the cache
+
+    # A write handled by another worker bumps the tag in the shared directory
+    other_worker(app).invalidate('posts')
+    with count_queries(app) as statements:
+        client.get('/')
+    assert len(statements) == 1
+
+
+def test_post_page_misses_after_edit_elsewhere(make_app, make_user, make_posts):
+    app = make_app(PAGE_CACHE_BACKEND='filesystem')
+    slug = make_posts(make_user(), 1)[0]
+    client = app.test_client()
+    assert b'Post 0' in client.get(f'/post/{slug}').data
+    with app.app_context():
+        db.session.execute(db.update(Posts).where(Posts.slug == slug).values(title='Renamed'))
+        db.session.commit()
+    other_worker(app).invalidate(f'post:{slug}')
+    assert b'Renamed' in client.get(f'/post/{slug}').data
+
+
+def test_building_the_app_creates_no_cache_directory(make_app, tmp_path):
+    make_app(PAGE_CACHE_BACKEND='filesystem')
+    assert not (tmp_path / 'page_cache').exists()
@@ -0,0 +1,79 @@
+import base64
+import html
+import re
+from datetime import datetime
+
+import pytest
+
+from models import db, Posts
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def page(client, url):
+    '''(slugs, prev_url, next_url) of one home page.'''
+    body = client.get(url).get_data(as_text=True)
+    slugs = list(dict.fromkeys(re.findall(r'href="/post/([^"]+)" class="text-decoration-none', body)))
+    prev_url = re.search(r'href="([^"]+)" class="btn btn-primary">&larr;', body)
+    next_url = re.search(r'href="([^"]+)" class="btn btn-primary">Next', body)
+    return (slugs, prev_url and html.unescape(prev_url.group(1)), next_url and html.unescape(next_url.group(1)))
+
+
+@pytest.fixture
+def same_time_posts(app, make_user):
+    '''Five posts published at the same instant: only sno orders them.'''
+    user_id = make_user()
+    with app.app_context():
+        posts = [Posts(title=f'Post {i}', slug=f'same-{i}', content='Body.', date='x', img_file='x.jpg',
+                       published_at=datetime(2026, 1, 1, 12), user_id=user_id) for i in range(5)]
+        db.session.add_all(posts)
+        db.session.commit()
+    return [f'same-{i}' for i in reversed(range(5))]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(datetime(2026, 1, 1, 12, 30), 7)) == ('2026-01-01T12:30:00', 7)
+
+
+@pytest.mark.parametrize('token', ['', 'not-a-cursor', '!!!', base64.urlsafe_b64encode(b'["x", "7"]').decode(),
+                                   base64.urlsafe_b64encode(b'{"a": 1}').decode()])
+def test_garbage_cursors_are_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+
+def test_next_pages_break_timestamp_ties_by_sno(app, same_time_posts):
+    client = app.test_client()
+    seen, url = [], '/'
+    while url:
+        slugs, _, url = page(client, url)
+        seen += slugs
+
+    assert seen == same_time_posts
+
+
+def test_prev_walks_back_to_the_same_pages(app, same_time_posts):
+    client = app.test_client()
+    forward, url = [], '/'
+    while url:
+        slugs, prev_url, next_url = page(client, url)
+        forward.append(slugs)
+        url = next_url
+
+    backward, url = [], prev_url
+    while url:
+        slugs, url, _ = page(client, url)
+        backward.append(slugs)
+
+    assert backward == forward[-2::-1]
+
+
+@pytest.mark.parametrize('query', ['after=garbage', 'before=garbage',
+                                   'after=' + encode_cursor('not-a-date', 3),
+                                   'after=' + base64.urlsafe_b64encode(b'[1, 2]').decode()])
+def test_tampered_cursors_fall_back_to_the_first_page(app, same_time_posts, query):
+    client = app.test_client()
+
+    response = client.get(f'/?{query}')
+
+    assert response.status_code == 200
+    assert page(client, f'/?{query}')[0] == same_time_posts[:2]
@@ -0,0 +1,80 @@
+import io
+import json
+
+from conftest import log_in
+from models import db, Posts, User
+
+
+def post_count(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).post_count
+
+
+def test_adding_and_deleting_posts_keeps_the_count(app, make_user, make_posts):
+    user_id = make_user()
+    make_posts(user_id, 2)
+    client = app.test_client()
+    log_in(client, user_id)
+
+    client.post('/add', data={'title': 'New', 'slug': 'new', 'content': 'Body',
+                              'img_file': (io.BytesIO(b''), '')}, content_type='multipart/form-data')
+    assert post_count(app, user_id) == 3
+
+    # A rejected add (duplicate slug) does not count
+    client.post('/add', data={'title': 'Again', 'slug': 'new', 'content': 'Body'})
+    assert post_count(app, user_id) == 3
+
+    with app.app_context():
+        sno = db.session.execute(db.select(Posts.sno).filter_by(slug='new')).scalar()
+    client.post(f'/delete/{sno}')
+    assert post_count(app, user_id) == 2
+
+
+def test_deleting_another_authors_post_keeps_both_counts(app, make_user, make_posts):
+    author, other = make_user(), make_user(name='Other', email='other@example.com')
+    make_posts(author, 1)
+    client = app.test_client()
+    log_in(client, other)
+    with app.app_context():
+        sno = db.session.execute(db.select(Posts.sno)).scalar()
+
+    client.post(f'/delete/{sno}')
+
+    assert (post_count(app, author), post_count(app, other)) == (1, 0)
+
+
+def test_import_counts_posts_per_author(app, make_user, tmp_path):
+    first, second = make_user(), make_user(name='Other', email='other@example.com')
+    source = tmp_path / 'posts.jsonl'
+    source.write_text(''.join(json.dumps(r) + '\n' for r in [
+        {'title': 'A', 'slug': 'a', 'content': 'Body'},
+        {'title': 'B', 'slug': 'b', 'content': 'Body'},
+        {'title': 'C', 'slug': 'c', 'content': 'Body', 'author': 'other@example.com'},
+    ]), encoding='utf-8')
+
+    result = app.test_cli_runner().invoke(args=['posts', 'import', str(source), '--author', 'author@example.com'])
+
+    assert result.exit_code == 0, result.output
+    assert (post_count(app, first), post_count(app, second)) == (2, 1)
+
+
+def test_recount_repairs_drifted_counters(app, make_user, make_posts):
+    drifted, correct = make_user(), make_user(name='Other', email='other@example.com')
+    make_posts(drifted, 3)
+    make_posts(correct, 1)
+    with app.app_context():
+        # Rows changed outside the app
+        db.session.execute(db.delete(Posts).where(Posts.slug == f'post-{drifted}-0'))
+        db.session.commit()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['posts', 'recount', '--dry-run'])
+    assert 'author@example.com: stored 3, actual 2' in result.output
+    assert '1 counter(s) would be repaired.' in result.output
+    assert post_count(app, drifted) == 3
+
+    result = runner.invoke(args=['posts', 'recount'])
+    assert '1 counter(s) repaired.' in result.output
+    assert (post_count(app, drifted), post_count(app, correct)) == (2, 1)
+
+    assert '0 counter(s) repaired.' in runner.invoke(args=['posts', 'recount']).output
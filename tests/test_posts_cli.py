@@ -0,0 +1,75 @@
+import json
+
+from models import db, ImageRefs, Posts, User
+
+
+def write_jsonl(path, records):
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records), encoding='utf-8')
+    return str(path)
+
+
+def test_import_jsonl_skips_bad_records(app, make_user, tmp_path):
+    user_id = make_user(email='author@example.com')
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'img' / 'cover.jpg').write_bytes(b'jpeg')
+    source = write_jsonl(tmp_path / 'posts.jsonl', [
+        {'title': 'First', 'slug': 'first', 'content': '# Hello', 'published_at': '2026-01-02T10:00:00',
+         'image': 'cover.jpg'},
+        {'title': 'Second', 'slug': 'second', 'content': 'Body', 'published_at': '03-01-2026 09:30 AM'},
+        {'title': 'Again', 'slug': 'first', 'content': 'Body'},
+        {'title': 'Empty', 'slug': 'empty'},
+        {'title': 'Stranger', 'slug': 'stranger', 'content': 'Body', 'author': 'nobody@example.com'},
+    ])
+
+    result = app.test_cli_runner().invoke(args=['posts', 'import', source, '--author', 'author@example.com'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 post(s), skipped 3.' in result.output
+    with app.app_context():
+        posts = {p.slug: p for p in Posts.query}
+        assert set(posts) == {'first', 'second'}
+        assert posts['first'].content_html.startswith('<h1')
+        assert posts['second'].published_at.hour == 9
+        assert db.session.get(User, user_id).post_count == 2
+        assert db.session.get(ImageRefs, 'cover.jpg').refs == 1
+
+
+def test_import_markdown_directory(app, make_user, tmp_path):
+    make_user(email='author@example.com')
+    source = tmp_path / 'posts'
+    source.mkdir()
+    (source / 'from-name.md').write_text('---\ntitle: "Front matter"\nauthor: author@example.com\n---\n\nBody\n',
+                                         encoding='utf-8')
+
+    result = app.test_cli_runner().invoke(args=['posts', 'import', str(source)])
+
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        post = Posts.query.one()
+        assert (post.slug, post.title, post.content) == ('from-name', 'Front matter', 'Body')
+
+
+def test_import_dry_run_writes_nothing(app, make_user, tmp_path):
+    make_user(email='author@example.com')
+    source = write_jsonl(tmp_path / 'posts.jsonl', [{'title': 'First', 'slug': 'first', 'content': 'Body'}])
+
+    result = app.test_cli_runner().invoke(
+        args=['posts', 'import', source, '--author', 'author@example.com', '--dry-run'])
+
+    assert '1 post(s) would be imported, 0 skipped.' in result.output
+    with app.app_context():
+        assert Posts.query.count() == 0
+
+
+def test_export_writes_import_records(app, make_user, make_posts, tmp_path):
+    make_posts(make_user(email='author@example.com'), 3)
+    output = tmp_path / 'export.jsonl'
+
+    result = app.test_cli_runner().invoke(args=['posts', 'export', str(output), '--batch', '2'])
+
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [r['title'] for r in records] == ['Post 0', 'Post 1', 'Post 2']
+    assert records[0]['author'] == 'author@example.com'
+    assert records[0]['published_at'] == '2026-01-01T00:00:00'
+    assert set(records[0]) == {'title', 'slug', 'content', 'published_at', 'image', 'author'}
@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import count_queries, log_in
+
+# Queries per request, the same at every page size: authors are eager-loaded
+# and the dashboard takes its total from user.post_count. A post page reads
+# the post and its "read next" list.
+EXPECTED = {'/': 1, '/post/{slug}': 2, '/dashboard': 1}
+
+
+@pytest.fixture(params=[2, 6])
+def page_size(request):
+    return request.param
+
+
+@pytest.fixture
+def app(make_app, page_size):
+    return make_app(PARAMS={'blog_name': 'Test blog', 'no_of_posts': page_size})
+
+
+@pytest.mark.parametrize('path', list(EXPECTED))
+def test_query_count_is_fixed_per_page(app, make_user, make_posts, page_size, path):
+    authors = [make_user(name=f'Author {i}', email=f'author{i}@example.com') for i in range(3)]
+    slugs = [slug for user_id in authors for slug in make_posts(user_id, page_size)]
+    client = app.test_client()
+    log_in(client, authors[0])
+    url = path.format(slug=slugs[0])
+    client.get(url)  # the first request fills the identity cache
+
+    with count_queries(app) as statements:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert len(statements) == EXPECTED[path], statements
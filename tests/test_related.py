@@ -0,0 +1,187 @@
+import fcntl
+import os
+import random
+import threading
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('scipy')
+
+import related  # noqa: E402
+from conftest import count_queries  # noqa: E402
+from main import related as extension  # noqa: E402
+from models import db, Posts, RelatedPosts  # noqa: E402
+
+WORDS = ('python flask database index cache query latency worker template render search cursor '
+         'mountain river forest ocean desert valley island harbor meadow canyon').split()
+
+
+@pytest.fixture
+def add_posts(app, make_user):
+    user_id = make_user()
+    rng = random.Random(7)
+
+    def add(count):
+        with app.app_context():
+            posts = [Posts(title=' '.join(rng.sample(WORDS, 2)), slug=f'p-{rng.random()}',
+                           content=' '.join(rng.choices(WORDS, k=12)), date='01-01-2026',
+                           published_at=datetime(2026, 1, 1), img_file='x.jpg', user_id=user_id)
+                     for _ in range(count)]
+            db.session.add_all(posts)
+            db.session.commit()
+            return [post.sno for post in posts]
+    return add
+
+
+def stored_lists():
+    lists = {}
+    for sno, related_sno in db.session.execute(
+            db.select(RelatedPosts.post_sno, RelatedPosts.related_sno).order_by(RelatedPosts.post_sno, RelatedPosts.rank)):
+        lists.setdefault(sno, []).append(related_sno)
+    return lists
+
+
+def expected_lists(model, k):
+    '''Every post's list recomputed from scratch on the same vectors.'''
+    full = model.compacted()
+    return {full.snos[row]: [sno for sno, _ in items]
+            for row, items in full.neighbours(list(range(len(full.snos))), k).items() if items}
+
+
+def test_refresh_matches_a_full_recompute(app, add_posts):
+    snos = add_posts(40)
+    with app.app_context():
+        extension.build()
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Posts).where(Posts.sno == snos[3]).values(content='river ocean harbor ' * 4))
+            conn.execute(db.delete(Posts).where(Posts.sno == snos[5]))
+        new = add_posts(3)
+        extension.refresh([snos[3], snos[5]] + new)
+        # Edit a post whose row is already in the tail
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Posts).where(Posts.sno == new[0]).values(content='python flask cache ' * 4))
+        extension.refresh([new[0]])
+
+        expected = expected_lists(extension.load_model(), app.config['RELATED_K'])
+        assert len(expected) == 42
+        assert stored_lists() == expected
+
+
+def test_refresh_saves_only_the_changed_rows(app, add_posts):
+    add_posts(30)
+    with app.app_context():
+        extension.build()
+        base = extension.model_path()
+        before = os.stat(base).st_mtime_ns
+        new = add_posts(2)
+
+        extension.refresh(new)
+
+        assert os.stat(base).st_mtime_ns == before
+        assert os.path.exists(extension.model_path(name=related.CHANGES_NAME))
+        extension._model = None  # as another worker would load it
+        loaded = extension.load_model()
+        assert [loaded.row_of(sno) is not None for sno in new] == [True, True]
+        assert len(loaded.tail_snos) == 2
+
+
+def test_enough_changes_rewrite_the_base_model(app, add_posts, monkeypatch):
+    monkeypatch.setattr(related, 'COMPACT_ROWS', 2)
+    add_posts(10)
+    with app.app_context():
+        extension.build()
+        extension.refresh(add_posts(3))
+
+        model = extension.load_model()
+        assert model.tail_snos == []
+        assert not os.path.exists(extension.model_path(name=related.CHANGES_NAME))
+
+
+def test_a_failed_save_keeps_the_current_model(app, add_posts, monkeypatch):
+    add_posts(20)
+    with app.app_context():
+        extension.build()
+        current = extension.load_model()
+        before = stored_lists()
+
+        def fail(self, path):
+            raise OSError('disk full')
+        monkeypatch.setattr(related.TfidfModel, 'save_changes', fail)
+        with pytest.raises(OSError):
+            extension.refresh(add_posts(1))
+
+        assert extension.load_model() is current
+        assert current.tail_snos == []
+        assert stored_lists() == before
+
+
+def test_refresh_reads_list_floors_only_for_candidates(app, add_posts):
+    add_posts(20)
+    with app.app_context():
+        extension.build()
+    new = add_posts(1)
+    with app.app_context(), count_queries(app) as statements:
+        extension.refresh(new)
+
+    grouped = [s for s in statements if 'GROUP BY' in s]
+    assert grouped and all('IN (' in s for s in grouped)
+
+
+def test_best_scores_match_the_dense_products(app, add_posts):
+    snos = add_posts(30)
+    with app.app_context():
+        extension.build()
+        extension.refresh([snos[0], snos[1]])  # two dead base rows and a tail
+        model = extension.load_model()
+        changed = [model.row_of(sno) for sno in snos[:4]]
+
+        rows, scores = model.best_scores(changed)
+
+        dense = model._against_all(model._take(changed)).toarray().max(axis=0)
+        dense[list(model.dead)] = 0.0
+        assert dict(zip(rows.tolist(), scores.tolist())) == {
+            row: score for row, score in enumerate(dense.tolist()) if score > 0}
+
+
+def test_refresh_reads_floors_for_at_most_max_candidates(app, add_posts):
+    app.config['RELATED_MAX_CANDIDATES'] = 3
+    add_posts(30)
+    with app.app_context():
+        extension.build()
+    new = add_posts(1)
+    with app.app_context(), count_queries(app) as statements:
+        extension.refresh(new)
+
+    grouped = [s for s in statements if 'GROUP BY' in s]
+    assert len(grouped) == 1 and grouped[0].count('?') <= 3
+
+
+def test_refresh_waits_for_another_process_and_keeps_its_changes(app, add_posts):
+    add_posts(20)
+    other = related.Related()  # a second worker, with its own copy of the model
+    with app.app_context():
+        extension.build()
+        other.load_model()
+    first, second = add_posts(1), add_posts(1)
+
+    def refresh(worker, snos):
+        with app.app_context():
+            worker.refresh(snos)
+
+    with app.app_context():
+        lock = open(extension.model_path(name=related.LOCK_NAME), 'a')
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    thread = threading.Thread(target=refresh, args=(extension, first))
+    thread.start()
+    thread.join(0.3)
+    assert thread.is_alive()  # blocked on the lock
+    lock.close()
+    thread.join()
+
+    refresh(other, second)
+
+    with app.app_context():
+        extension._model = None
+        model = extension.load_model()
+        assert model.row_of(first[0]) is not None and model.row_of(second[0]) is not None
@@ -0,0 +1,73 @@
+import pytest
+
+from rendering import WORDS_PER_MINUTE, Sanitizer, render_post, safe_url
+
+
+def sanitize(value):
+    sanitizer = Sanitizer()
+    sanitizer.feed(value)
+    sanitizer.close()
+    return sanitizer
+
+
+def test_script_and_style_are_dropped_with_their_content():
+    out = sanitize('<p>a<script>alert(1)</script>b<style>p { color: red }</style>c</p>').html()
+
+    assert out == '<p>abc</p>'
+
+
+def test_event_handler_attributes_are_removed():
+    out = sanitize('<p onclick="x()"><img src="a.png" onerror="x()" alt="a"></p>').html()
+
+    assert out == '<p><img src="a.png" alt="a"></p>'
+
+
+@pytest.mark.parametrize('url', [
+    'javascript:alert(1)',
+    'JavaScript:alert(1)',
+    ' java\tscript:alert(1)',
+    'jav&#x61;script:alert(1)',
+    '&#106;avascript:alert(1)',
+    'data:text/html;base64,PHNjcmlwdD4=',
+])
+def test_unsafe_schemes_are_dropped_from_links_and_images(url):
+    out = sanitize(f'<a href="{url}">x</a><img src="{url}">').html()
+
+    assert out == '<a>x</a><img>'
+
+
+@pytest.mark.parametrize('url', ['https://example.com/', '/post/a', '#intro', 'mailto:a@example.com'])
+def test_safe_urls_are_kept(url):
+    assert safe_url(url)
+    assert f'href="{url}"' in sanitize(f'<a href="{url}">x</a>').html()
+
+
+def test_unclosed_tags_are_closed():
+    assert sanitize('<p><strong>bold <em>both').html() == '<p><strong>bold <em>both</em></strong></p>'
+
+
+def test_stray_end_tags_are_ignored():
+    assert sanitize('</div><p>a</b></p>').html() == '<p>a</p>'
+
+
+def test_headings_get_unique_ids_and_a_toc():
+    rendered = render_post('<h2>Intro</h2><p>a</p><h3>Set up!</h3><h2>Intro</h2>')
+
+    assert '<h2 id="intro">Intro</h2>' in rendered.content_html
+    assert '<h3 id="set-up">Set up!</h3>' in rendered.content_html
+    assert '<h2 id="intro-2">Intro</h2>' in rendered.content_html
+    assert rendered.toc_html == (
+        '<ul class="toc"><li class="toc-level-1"><a href="#intro">Intro</a></li>'
+        '<li class="toc-level-2"><a href="#set-up">Set up!</a></li>'
+        '<li class="toc-level-1"><a href="#intro-2">Intro</a></li></ul>')
+
+
+def test_a_single_heading_gets_no_toc():
+    assert render_post('<h2>Only</h2><p>a</p>').toc_html is None
+
+
+def test_reading_time_counts_visible_words():
+    words = ' '.join(['word'] * (WORDS_PER_MINUTE * 2 + 1))
+
+    assert render_post(f'<p>{words}</p><script>{words}</script>').reading_time == 3
+    assert render_post('').reading_time == 1
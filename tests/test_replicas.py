@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import text
+
+from conftest import count_queries
+from main import post_search
+from models import db
+
+WRITES = ('CREATE', 'INSERT', 'DELETE', 'UPDATE')
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    # Both URLs name one file, so a replica always has the primary's data; the
+    # engines are separate, so each test can see where a statement went.
+    url = f"sqlite:///{tmp_path / 'blog.db'}"
+    return make_app(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_BINDS={'replica_0': url}, SEARCH_BACKEND='fts5')
+
+
+def writes(statements):
+    return [s for s in statements if s.lstrip().upper().startswith(WRITES)]
+
+
+def test_create_schema_builds_the_search_table(app):
+    with app.app_context():
+        assert db.session.execute(text("SELECT name FROM sqlite_master WHERE name='posts_fts'")).scalar()
+
+
+def test_read_views_use_the_replica(app, make_user, make_posts):
+    make_posts(make_user(), 2)
+    client = app.test_client()
+
+    with count_queries(app) as primary, count_queries(app, 'replica_0') as replica:
+        assert client.get('/').status_code == 200
+
+    assert primary == []
+    assert replica
+
+
+def test_clients_stick_to_the_primary_after_a_write(app):
+    client = app.test_client()
+    client.post('/register', data={'name': 'Reader', 'email': 'reader@example.com', 'password': 'Secret123'})
+
+    with count_queries(app) as primary, count_queries(app, 'replica_0') as replica:
+        client.get('/')
+
+    assert primary
+    assert replica == []
+    with app.test_client() as other:
+        with count_queries(app, 'replica_0') as replica:
+            other.get('/')
+        assert replica
+
+
+def test_search_index_is_built_on_the_primary_from_a_read_view(app, make_user, make_posts):
+    make_posts(make_user(), 2)
+    with app.app_context():
+        # A database created before create-db built the search table
+        db.session.execute(text("DROP TABLE posts_fts"))
+        db.session.commit()
+    post_search._backend = None
+
+    with count_queries(app) as primary, count_queries(app, 'replica_0') as replica:
+        response = app.test_client().get('/search?q=Body')
+
+    assert response.status_code == 200
+    assert writes(replica) == []
+    assert any('CREATE VIRTUAL TABLE' in s for s in writes(primary))
+    assert any('MATCH' in s for s in replica)
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from conftest import count_queries
+from models import db, Posts
+from search import InvertedIndexBackend
+
+
+def snos(backend, query):
+    return backend.search(query, page=1, per_page=10).snos
+
+
+def test_memory_index_sees_writes_from_other_workers(make_app, make_user, make_posts):
+    app = make_app(SEARCH_BACKEND='memory', SEARCH_CHECK_INTERVAL=0)
+    user_id = make_user()
+    make_posts(user_id, 3)
+    # Two workers, each with its own in-process index over the same database
+    worker_a, worker_b = InvertedIndexBackend(), InvertedIndexBackend()
+    with app.app_context():
+        assert len(snos(worker_b, 'body')) == 3
+
+        post = Posts(title='Zebra crossings', slug='zebra', content='Stripes.', date='x', img_file='x.jpg',
+                     user_id=user_id)
+        db.session.add(post)
+        db.session.commit()
+        worker_a.index(post.sno, post.title, post.content)
+        assert snos(worker_b, 'zebra') == [post.sno]
+
+        db.session.delete(post)
+        db.session.commit()
+        worker_a.remove(post.sno)
+        assert snos(worker_b, 'zebra') == []
+
+
+def test_memory_index_checks_at_most_once_per_interval(make_app, make_user, make_posts):
+    app = make_app(SEARCH_BACKEND='memory', SEARCH_CHECK_INTERVAL=3600)
+    user_id = make_user()
+    make_posts(user_id, 1)
+    backend = InvertedIndexBackend()
+    with app.app_context():
+        assert snos(backend, 'zebra') == []
+        db.session.add(Posts(title='Zebra', slug='zebra', content='Stripes.', date='x', img_file='x.jpg',
+                             user_id=user_id))
+        db.session.commit()
+        assert snos(backend, 'zebra') == []
+        backend.rebuild()
+        assert len(snos(backend, 'zebra')) == 1
+
+
+def full_scans(statements):
+    return [s for s in statements if 'FROM posts' in s and 'WHERE' not in s and 'count(' not in s]
+
+
+def test_memory_index_reads_only_changed_posts(make_app, make_user, make_posts):
+    app = make_app(SEARCH_BACKEND='memory', SEARCH_CHECK_INTERVAL=0)
+    user_id = make_user()
+    make_posts(user_id, 5)
+    worker = InvertedIndexBackend()
+    with app.app_context():
+        snos(worker, 'body')
+        post = db.session.execute(db.select(Posts).order_by(Posts.sno)).scalars().first()
+        post.title, post.published_at = 'Zebra crossings', datetime(2027, 1, 1)
+        db.session.commit()
+        worker.index(post.sno, post.title, post.content)  # this worker's own write
+
+        with count_queries(app) as statements:
+            assert snos(worker, 'zebra') == [post.sno]
+        assert full_scans(statements) == []
+
+        # Another worker deletes a post
+        gone = db.session.execute(db.select(Posts.sno).order_by(Posts.sno.desc())).scalar()
+        db.session.execute(db.delete(Posts).where(Posts.sno == gone))
+        db.session.commit()
+        with count_queries(app) as statements:
+            assert gone not in snos(worker, 'body')
+        assert full_scans(statements) == []
@@ -0,0 +1,85 @@
+import os
+import threading
+
+import pytest
+
+import settings
+from main import create_app
+
+
+@pytest.fixture
+def fresh_settings(monkeypatch):
+    '''Re-read the environment on the next load_config() call, and again after the test.'''
+    settings._load_config.cache_clear()
+    yield monkeypatch
+    settings._load_config.cache_clear()
+
+
+def test_load_config_returns_independent_copies():
+    first = settings.load_config()
+    first['SECRET_KEY'] = 'changed'
+    first['PARAMS']['blog_name'] = 'changed'
+    first['SQLALCHEMY_BINDS']['replica_9'] = 'sqlite://'
+
+    second = settings.load_config()
+    assert second['SECRET_KEY'] != 'changed'
+    assert second['PARAMS']['blog_name'] != 'changed'
+    assert 'replica_9' not in second['SQLALCHEMY_BINDS']
+
+
+def test_replica_urls_become_binds_with_the_pool_options(fresh_settings):
+    fresh_settings.setenv('REPLICA_URLS', 'sqlite:///a.db, sqlite:///b.db,')
+    fresh_settings.setenv('DB_POOL_RECYCLE', '60')
+
+    config = settings.load_config()
+
+    assert config['SQLALCHEMY_BINDS'] == {
+        'replica_0': {'url': 'sqlite:///a.db', 'pool_recycle': 60, 'pool_pre_ping': True},
+        'replica_1': {'url': 'sqlite:///b.db', 'pool_recycle': 60, 'pool_pre_ping': True},
+    }
+
+
+def test_numeric_settings_are_parsed(fresh_settings):
+    fresh_settings.setenv('SEARCH_CHECK_INTERVAL', '0.5')
+    fresh_settings.setenv('SITEMAP_SHARD_SIZE', '500')
+
+    config = settings.load_config()
+
+    assert config['SEARCH_CHECK_INTERVAL'] == 0.5
+    assert config['SITEMAP_SHARD_SIZE'] == 500
+
+
+def test_invalid_numbers_fail_at_startup(fresh_settings):
+    fresh_settings.setenv('OUTBOX_THREADS', 'two')
+
+    with pytest.raises(ValueError):
+        settings.load_config()
+
+
+def test_create_app_has_no_side_effects(tmp_path):
+    threads = set(threading.enumerate())
+    unreachable = f"sqlite:///{tmp_path / 'missing' / 'blog.db'}"
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': unreachable,
+        'SQLALCHEMY_BINDS': {},
+        'UPLOAD_FOLDER': str(tmp_path / 'img'),
+        'PAGE_CACHE_DIR': str(tmp_path / 'page_cache'),
+        'FEED_DIR': str(tmp_path / 'feed_cache'),
+        'SITEMAP_DIR': str(tmp_path / 'sitemaps'),
+        'RELATED_DIR': str(tmp_path / 'related'),
+        'OUTBOX_WORKER': 'thread',
+    })
+
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == unreachable
+    assert os.listdir(tmp_path) == []
+    assert set(threading.enumerate()) == threads
+
+
+def test_create_app_overrides_do_not_leak_into_the_next_app(make_app):
+    make_app(PARAMS={'blog_name': 'First', 'no_of_posts': 2}, SEARCH_BACKEND='memory')
+    second = create_app()
+
+    assert second.config['PARAMS'] == settings.load_params()
+    assert second.config['SEARCH_BACKEND'] == 'auto'
@@ -0,0 +1,74 @@
+import os
+import re
+
+import pytest
+
+from conftest import log_in
+from models import db, Posts
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(SITEMAP_SHARD_SIZE=2)
+
+
+def locs(body):
+    return re.findall(rb'<loc>([^<]+)</loc>', body)
+
+
+def test_index_lists_one_shard_per_sno_range(app, make_user, make_posts):
+    make_posts(make_user(), 5)
+    client = app.test_client()
+
+    index = client.get('/sitemap.xml')
+
+    assert index.status_code == 200
+    assert locs(index.data) == [f'http://localhost/sitemap-{k}.xml'.encode() for k in range(3)]
+    assert locs(client.get('/sitemap-1.xml').data) == [b'http://localhost/post/post-1-2', b'http://localhost/post/post-1-3']
+    assert client.get('/sitemap-9.xml').status_code == 404
+
+
+def test_a_delete_rewrites_only_its_shard(app, make_user, make_posts):
+    user_id = make_user()
+    make_posts(user_id, 5)
+    client = app.test_client()
+    client.get('/sitemap.xml')
+    first = os.path.join(app.config['SITEMAP_DIR'], 'sitemap-0.xml')
+    before = os.stat(first).st_mtime_ns
+
+    log_in(client, user_id)
+    with app.app_context():
+        sno = db.session.execute(db.select(Posts.sno).where(Posts.slug == 'post-1-4')).scalar()
+    client.post(f'/delete/{sno}')
+
+    assert os.stat(first).st_mtime_ns == before
+    assert not os.path.exists(os.path.join(app.config['SITEMAP_DIR'], 'sitemap-2.xml'))
+    assert len(locs(client.get('/sitemap.xml').data)) == 2
+
+
+def write_import(tmp_path):
+    source = tmp_path / 'posts.jsonl'
+    source.write_text('{"title": "Imported", "slug": "imported", "content": "Body"}\n', encoding='utf-8')
+    return str(source)
+
+
+def test_cli_import_refreshes_with_the_base_url(make_app, make_user, tmp_path):
+    app = make_app(SITEMAP_SHARD_SIZE=2, SITEMAP_BASE_URL='https://blog.example.com')
+    make_user(email='author@example.com')
+
+    app.test_cli_runner().invoke(args=['posts', 'import', write_import(tmp_path), '--author', 'author@example.com'])
+
+    with open(os.path.join(app.config['SITEMAP_DIR'], 'sitemap-0.xml'), 'rb') as f:
+        assert locs(f.read()) == [b'https://blog.example.com/post/imported']
+
+
+def test_cli_import_without_a_base_url_drops_the_stale_files(app, make_user, make_posts, tmp_path):
+    make_posts(make_user(email='author@example.com'), 1)
+    client = app.test_client()
+    client.get('/sitemap.xml')
+
+    app.test_cli_runner().invoke(args=['posts', 'import', write_import(tmp_path), '--author', 'author@example.com'])
+
+    assert not os.path.exists(os.path.join(app.config['SITEMAP_DIR'], 'sitemap.xml'))
+    assert locs(client.get('/sitemap-0.xml').data) == [b'http://localhost/post/post-1-0',
+                                                      b'http://localhost/post/imported']
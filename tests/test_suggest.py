@@ -0,0 +1,124 @@
+import pytest
+
+from conftest import count_queries, log_in
+from models import db, Posts
+from suggest import Suggest
+
+
+@pytest.fixture
+def add_post(app, make_user):
+    user_id = make_user()
+
+    def add(title, slug):
+        with app.app_context():
+            post = Posts(title=title, slug=slug, content='Body.', date='x', img_file='x.jpg', user_id=user_id)
+            db.session.add(post)
+            db.session.commit()
+            return post.sno
+    return add
+
+
+def titles(index, query, limit=3):
+    return [title for _, title, _ in index.suggest(query, limit=limit)]
+
+
+@pytest.mark.parametrize('query', ['al', 'alph'])
+def test_newest_matches_win_over_all_keys(app, make_user, query):
+    user_id = make_user()
+    with app.app_context():
+        # 300 matching keys, newest sorting last: a scan cut short before ranking misses them
+        db.session.add_all(Posts(title=f'Alpha {i:04d}', slug=f'alpha-{i:04d}', content='Body.', date='x',
+                                 img_file='x.jpg', user_id=user_id) for i in range(300))
+        db.session.commit()
+        assert titles(Suggest(), query) == ['Alpha 0299', 'Alpha 0298', 'Alpha 0297']
+
+
+def test_first_word_matches_rank_before_later_words(app, add_post):
+    add_post('Old tips', 'old-tips')
+    add_post('More tips', 'more-tips')
+    add_post('Tips for tests', 'tips-for-tests')
+    with app.app_context():
+        assert titles(Suggest(), 'ti') == ['Tips for tests', 'More tips', 'Old tips']
+        assert titles(Suggest(), 'tip') == ['Tips for tests', 'More tips', 'Old tips']
+
+
+def test_index_sees_writes_from_other_workers(make_app, add_post):
+    app = make_app(SUGGEST_CHECK_INTERVAL=0)
+    add_post('Zebra crossings', 'zebra')
+    worker = Suggest()
+    with app.app_context():
+        assert titles(worker, 'zeb') == ['Zebra crossings']
+        sno = add_post('Zebu herds', 'zebu')
+        assert titles(worker, 'zeb') == ['Zebu herds', 'Zebra crossings']
+
+        db.session.execute(db.delete(Posts).where(Posts.sno == sno))
+        db.session.commit()
+        assert titles(worker, 'zeb') == ['Zebra crossings']
+
+
+def test_index_checks_at_most_once_per_interval(make_app, add_post):
+    app = make_app(SUGGEST_CHECK_INTERVAL=3600)
+    worker = Suggest()
+    with app.app_context():
+        assert titles(worker, 'zeb') == []
+        add_post('Zebra crossings', 'zebra')
+        assert titles(worker, 'zeb') == []
+
+
+def test_suggest_route_reads_from_a_replica(make_app, tmp_path, add_post):
+    url = f"sqlite:///{tmp_path / 'blog.db'}"
+    app = make_app(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_BINDS={'replica_0': url})
+    add_post('Zebra crossings', 'zebra')
+
+    with count_queries(app) as primary, count_queries(app, 'replica_0') as replica:
+        response = app.test_client().get('/search/suggest?q=zeb')
+
+    assert response.json['suggestions'][0]['title'] == 'Zebra crossings'
+    assert primary == []
+    assert replica
+
+
+def full_scans(statements):
+    return [s for s in statements if 'FROM posts' in s and 'WHERE' not in s and 'count(' not in s]
+
+
+def test_index_reads_only_changed_posts(make_app, add_post, monkeypatch):
+    app = make_app(SUGGEST_CHECK_INTERVAL=0)
+    for i in range(5):
+        add_post(f'Post {i}', f'post-{i}')
+    worker = Suggest()
+    with app.app_context():
+        assert titles(worker, 'zeb') == []
+        # Written by another worker: a new post, and a delete
+        add_post('Zebra crossings', 'zebra')
+        gone = add_post('Zebu herds', 'zebu')
+        db.session.execute(db.delete(Posts).where(Posts.sno == gone))
+        db.session.commit()
+
+        with count_queries(app) as statements:
+            assert titles(worker, 'zeb') == ['Zebra crossings']
+        assert full_scans(statements) == []
+
+        # Past MERGE_ROWS the changes are merged with one sort
+        monkeypatch.setattr(Suggest, 'MERGE_ROWS', 0)
+        add_post('Zeal', 'zeal')
+        with count_queries(app) as statements:
+            assert titles(worker, 'ze') == ['Zeal', 'Zebra crossings']
+        assert full_scans(statements) == []
+        assert titles(worker, 'post 4') == ['Post 4']
+
+
+def test_own_writes_need_no_rebuild(make_app, add_post):
+    app = make_app(SUGGEST_CHECK_INTERVAL=0)
+    add_post('Zebra crossings', 'zebra')
+    client = app.test_client()
+    assert client.get('/search/suggest?q=zeb').json['suggestions']
+    with app.app_context():
+        log_in(client, db.session.execute(db.select(Posts.user_id)).scalar())
+
+    client.post('/add', data={'title': 'Zebu herds', 'slug': 'zebu', 'content': 'Body'})
+
+    with count_queries(app) as statements:
+        suggestions = client.get('/search/suggest?q=zeb').json['suggestions']
+    assert [s['title'] for s in suggestions] == ['Zebu herds', 'Zebra crossings']
+    assert full_scans(statements) == []
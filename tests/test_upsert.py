@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+import models
+from models import db, ImageRefs, PostViews, upsert_add
+
+
+def stored(table):
+    return {row[0]: row[1] for row in db.session.execute(db.select(*list(table.c)[:2])).all()}
+
+
+@pytest.mark.parametrize('upsert', [upsert_add, models._upsert_add_each], ids=['dialect', 'generic'])
+def test_upsert_adds_to_existing_rows_and_inserts_new_ones(app, upsert):
+    table = ImageRefs.__table__
+    now = datetime(2026, 1, 1)
+    with app.app_context():
+        upsert(table, 'filename', [{'filename': 'a.jpg', 'refs': 1, 'updated_at': now}], {'refs'})
+        upsert(table, 'filename', [{'filename': 'a.jpg', 'refs': 2, 'updated_at': now},
+                                   {'filename': 'b.jpg', 'refs': 1, 'updated_at': now}], {'refs'})
+        db.session.commit()
+
+        assert stored(table) == {'a.jpg': 3, 'b.jpg': 1}
+
+
+def test_generic_upsert_handles_a_concurrent_insert(app, monkeypatch):
+    table = PostViews.__table__
+    with app.app_context():
+        db.session.execute(table.insert().values(post_sno=1, views=5))
+        real_execute = db.session.execute
+        calls = []
+
+        def execute(statement, *args, **kwargs):
+            # The first UPDATE misses, as if another worker inserted the row just after it
+            calls.append(statement)
+            if len(calls) == 1:
+                return type('Result', (), {'rowcount': 0})()
+            return real_execute(statement, *args, **kwargs)
+        monkeypatch.setattr(db.session, 'execute', execute)
+        models._upsert_add_each(table, 'post_sno', [{'post_sno': 1, 'views': 2}], {'views'})
+        monkeypatch.undo()
+        db.session.commit()
+
+        assert stored(table) == {1: 7}
@@ -0,0 +1,4 @@
+'''WSGI entry point for servers: `gunicorn wsgi:app`.'''
+from main import create_app
+
+app = create_app()